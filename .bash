@@ -1,6 +1,4 @@
 python -m pip install -r requirements.txt
-flask db init 
-flask db migrate
 flask db upgrade
 python app.py
 
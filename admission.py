@@ -0,0 +1,128 @@
+"""Admission control in front of the routes.
+
+Two checks run before a request reaches its view:
+
+- Each client (by remote address) has a token bucket refilled at
+  ADMISSION_RATE requests per second and holding up to ADMISSION_BURST.
+  A client that runs dry gets 429 Too Many Requests, with Retry-After
+  saying when its next token is due, so one noisy client cannot crowd
+  out the rest.
+- At most ADMISSION_MAX_CONCURRENCY requests are served at once. Up to
+  ADMISSION_QUEUE_SIZE more may wait for a slot, each for at most
+  ADMISSION_QUEUE_TIMEOUT_SECONDS; beyond that requests get 503 Service
+  Unavailable straight away instead of queueing without bound.
+
+Rejections are counted in todo_admission_rejected_total by reason. The
+metrics endpoint, the static assets and the long-lived change feed streams
+are exempt. In the ASGI mode only the requests passed through to Flask are
+subject to admission control.
+"""
+import math
+import time
+from collections import OrderedDict
+from threading import Condition, Lock
+
+from flask import g, jsonify, request
+
+EXEMPT_ENDPOINTS = {'metrics', 'assets', 'list_events', 'static'}
+
+
+class Admission:
+    """Flask extension rate limiting clients and bounding concurrency."""
+
+    def __init__(self, app=None):
+        self.lock = Lock()
+        self.condition = Condition()
+        # client -> (tokens, last refill time), least recently seen first
+        self.buckets = OrderedDict()
+        self.active = 0
+        self.waiting = 0
+        self.rejected = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ADMISSION_ENABLED', False)
+        app.config.setdefault('ADMISSION_RATE', 50)
+        app.config.setdefault('ADMISSION_BURST', 100)
+        app.config.setdefault('ADMISSION_MAX_CLIENTS', 10000)
+        app.config.setdefault('ADMISSION_MAX_CONCURRENCY', 64)
+        app.config.setdefault('ADMISSION_QUEUE_SIZE', 128)
+        app.config.setdefault('ADMISSION_QUEUE_TIMEOUT_SECONDS', 1.0)
+        app.extensions['admission'] = self
+        self.config = app.config
+        metrics = app.extensions.get('metrics')
+        if metrics is not None:
+            self.rejected = metrics.counter(
+                'todo_admission_rejected_total', 'Requests turned away by admission control.',
+                ('reason',))
+            metrics.gauge('todo_admission_waiting', 'Requests waiting for a concurrency slot.',
+                          callback=lambda: self.waiting)
+        app.before_request(self.admit)
+        app.teardown_request(self.release)
+
+    def take_token(self, client):
+        """Take one token from the client's bucket; return seconds to wait if it is empty."""
+        rate = self.config['ADMISSION_RATE']
+        burst = self.config['ADMISSION_BURST']
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.pop(client, (burst, now))
+            tokens = min(burst, tokens + (now - last) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self.buckets[client] = (tokens, now)
+            while len(self.buckets) > self.config['ADMISSION_MAX_CLIENTS']:
+                self.buckets.popitem(last=False)
+        return wait
+
+    def acquire(self):
+        """Take a concurrency slot, waiting in the bounded queue if need be.
+
+        Returns None once a slot is held, or the reason it was refused.
+        """
+        limit = self.config['ADMISSION_MAX_CONCURRENCY']
+        with self.condition:
+            if self.active < limit:
+                self.active += 1
+                return None
+            if self.waiting >= self.config['ADMISSION_QUEUE_SIZE']:
+                return 'overloaded'
+            self.waiting += 1
+            try:
+                if not self.condition.wait_for(lambda: self.active < limit,
+                                               self.config['ADMISSION_QUEUE_TIMEOUT_SECONDS']):
+                    return 'queue_timeout'
+                self.active += 1
+                return None
+            finally:
+                self.waiting -= 1
+
+    def reject(self, status, reason, retry_after):
+        if self.rejected is not None:
+            self.rejected.inc(reason)
+        response = jsonify({'error': reason})
+        response.status_code = status
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def admit(self):
+        if not self.config['ADMISSION_ENABLED'] or request.endpoint in EXEMPT_ENDPOINTS:
+            return None
+        wait = self.take_token(request.remote_addr)
+        if wait:
+            return self.reject(429, 'rate_limited', wait)
+        refused = self.acquire()
+        if refused:
+            return self.reject(503, refused, self.config['ADMISSION_QUEUE_TIMEOUT_SECONDS'])
+        g._admission_slot = True
+        return None
+
+    def release(self, exc):
+        if g.pop('_admission_slot', False):
+            with self.condition:
+                self.active -= 1
+                self.condition.notify()
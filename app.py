@@ -1,14 +1,168 @@
-from flask import Flask, jsonify, render_template, request, redirect, url_for, abort
+from flask import (Flask, Response, current_app, jsonify, render_template, request, redirect, url_for,
+                   abort, g, stream_with_context)
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from flask_migrate import Migrate, upgrade
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import delete, event, inspect, insert, null, select, union_all, update
+from werkzeug.local import LocalProxy
+from metrics import Metrics
+from assets import Assets
+from compression import Compress
+from events import ChangeFeed
+from reaper import Reaper
+from groupcommit import GroupCommit
+from admission import Admission
+from responsecache import ResponseCache, cached
+from querybudget import QueryBudget, budget
+from jsonprovider import columnar, json_provider
+from replica import Replica, RoutingSession, reads_replica
+import search
+import counters
+from collections import OrderedDict, namedtuple
+from threading import Lock
+import os
 import sys
+import time
+import click
+import functools
+import importlib.util
+import itertools
+import uuid
 
-app = Flask(__name__)
-# Using SQLite in-memory database instead of PostgreSQL
-app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///:memory:"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+migrate = Migrate(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'),
+                  render_as_batch=True, include_object=search.include_object)
+
+# The extensions of the app handling the current request; create_app() makes
+# a fresh set for every app.
+metrics = LocalProxy(lambda: current_app.extensions['metrics'])
+admission = LocalProxy(lambda: current_app.extensions['admission'])
+assets = LocalProxy(lambda: current_app.extensions['assets'])
+compress = LocalProxy(lambda: current_app.extensions['compress'])
+changes = LocalProxy(lambda: current_app.extensions['events'])
+group_commit = LocalProxy(lambda: current_app.extensions['group_commit'])
+reaper = LocalProxy(lambda: current_app.extensions['reaper'])
+response_cache = LocalProxy(lambda: current_app.extensions['response_cache'])
+
+# Views, registered on each app by create_app()
+routes = []
+
+
+def route(rule, **options):
+    """Like app.route, for the views that create_app() registers on every app."""
+    def decorator(view):
+        routes.append((rule, view, options))
+        return view
+    return decorator
+
+
+def create_app(config=None):
+    """Build an app, with settings from the environment overridden by `config`.
+
+    Building the app is cheap: nothing connects to the database until the
+    first request (or CLI command) needs it, when ensure_schema() creates or
+    upgrades the schema. Pre-forked workers are ready as soon as they fork,
+    and tests can build as many isolated apps as they like.
+    """
+    app = Flask(__name__)
+    # Storage mode, chosen with the TODO_STORAGE environment variable:
+    #   memory - SQLite in-memory database, private to this process (default)
+    #   file   - shared SQLite file in WAL mode, for running several workers
+    app.config['TODO_STORAGE'] = os.environ.get('TODO_STORAGE', 'memory')
+    app.config['TODO_SQLITE_PATH'] = os.environ.get(
+        'TODO_SQLITE_PATH', os.path.join(app.instance_path, 'todo.db'))
+    # Page cache per connection in KiB, and how long a writer waits for the lock
+    app.config['TODO_SQLITE_CACHE_KIB'] = int(os.environ.get('TODO_SQLITE_CACHE_KIB', 16384))
+    app.config['TODO_SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('TODO_SQLITE_BUSY_TIMEOUT_MS', 5000))
+    app.config['TODO_DB_POOL_SIZE'] = int(os.environ.get('TODO_DB_POOL_SIZE', 5))
+    app.config['TODO_DB_MAX_OVERFLOW'] = int(os.environ.get('TODO_DB_MAX_OVERFLOW', 10))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Upper bound on the number of descriptions accepted by one batch create
+    app.config['TODO_MAX_BATCH_SIZE'] = 5000
+    # Page size bounds for the JSON read API
+    app.config['TODO_API_DEFAULT_LIMIT'] = 50
+    app.config['TODO_API_MAX_LIMIT'] = 500
+    # Rows per chunk when streaming an export and when inserting an import
+    app.config['TODO_EXPORT_CHUNK_SIZE'] = 1000
+    app.config['TODO_IMPORT_CHUNK_SIZE'] = 1000
+    # Batch the single-todo writes through one committing thread (see groupcommit.py)
+    app.config['GROUP_COMMIT_ENABLED'] = os.environ.get('TODO_GROUP_COMMIT', '0') == '1'
+    # Per-client rate limits and a concurrency cap in front of the routes (see admission.py)
+    app.config['ADMISSION_ENABLED'] = os.environ.get('TODO_ADMISSION', '0') == '1'
+    # Cache rendered pages and JSON reads under per-list versions (see responsecache.py);
+    # on by default unless several workers share a file database
+    if 'TODO_RESPONSE_CACHE' in os.environ:
+        app.config['RESPONSE_CACHE_ENABLED'] = os.environ['TODO_RESPONSE_CACHE'] == '1'
+    # Serve the pages and the read API from a read-only engine (see replica.py):
+    # TODO_READ_REPLICA=1 opens a read-only pool on the file database, or
+    # TODO_REPLICA_DATABASE_URI names a replica
+    app.config['TODO_READ_REPLICA'] = os.environ.get('TODO_READ_REPLICA', '0') == '1'
+    if 'TODO_REPLICA_DATABASE_URI' in os.environ:
+        app.config['REPLICA_DATABASE_URI'] = os.environ['TODO_REPLICA_DATABASE_URI']
+    # Change feed streams served on threads at once (see events.py); set by gunicorn.conf.py
+    if 'TODO_MAX_STREAMS' in os.environ:
+        app.config['EVENTS_MAX_STREAMS'] = int(os.environ['TODO_MAX_STREAMS'])
+    # How many clients' starter list state each process keeps cached
+    app.config['TODO_STARTER_CACHE_SIZE'] = 10000
+    # JSON encoder: auto (orjson if installed), orjson or stdlib (see jsonprovider.py)
+    app.config['TODO_JSON_BACKEND'] = os.environ.get('TODO_JSON_BACKEND', 'auto')
+    app.config.update(config or {})
+    app.json = json_provider(app)
+
+    if 'SQLALCHEMY_DATABASE_URI' not in app.config:
+        if app.config['TODO_STORAGE'] == 'file':
+            os.makedirs(os.path.dirname(os.path.abspath(app.config['TODO_SQLITE_PATH'])), exist_ok=True)
+            app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.abspath(app.config['TODO_SQLITE_PATH'])
+            engine_options = {
+                'pool_size': app.config['TODO_DB_POOL_SIZE'],
+                'max_overflow': app.config['TODO_DB_MAX_OVERFLOW'],
+                'pool_timeout': app.config['TODO_SQLITE_BUSY_TIMEOUT_MS'] / 1000,
+                # Let sqlite3's own lock wait line up with busy_timeout
+                'connect_args': {'timeout': app.config['TODO_SQLITE_BUSY_TIMEOUT_MS'] / 1000},
+            }
+            app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options)
+            if app.config['TODO_READ_REPLICA']:
+                app.config.setdefault('REPLICA_DATABASE_URI', 'sqlite:///file:' + os.path.abspath(
+                    app.config['TODO_SQLITE_PATH']) + '?mode=ro&uri=true')
+                app.config.setdefault('REPLICA_ENGINE_OPTIONS', engine_options)
+        else:
+            # Using SQLite in-memory database instead of PostgreSQL
+            app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///:memory:"
+
+    db.init_app(app)
+    migrate.init_app(app, db)
+    app_metrics = Metrics(app)
+    Admission(app)
+    Assets(app)
+    Compress(app)
+    app_changes = ChangeFeed(app)
+    ResponseCache(app)
+    GroupCommit(app, db)
+    app_reaper = Reaper(app, db, TodoList, Todo, ListDeletion)
+    app_metrics.gauge('todo_event_subscribers', 'Open change feed streams.',
+                      callback=app_changes.subscriber_count)
+    if app.config['TODO_STORAGE'] == 'file':
+        with app.app_context():
+            # Creating the engine does not connect yet
+            event.listen(db.engine, 'connect', sqlite_pragma_listener(app.config))
+
+    app.before_request(ensure_schema)
+    # Registered after ensure_schema so the one-off schema setup is not
+    # charged to the first request
+    QueryBudget(app)
+    # Also after ensure_schema, which has to run on the primary
+    app_replica = Replica(app)
+    if app_replica.engine is not None and app_replica.engine.dialect.name == 'sqlite':
+        event.listen(app_replica.engine, 'connect', sqlite_pragma_listener(app.config, read_only=True))
+    app.after_request(save_starter_cookie)
+    for rule, view, options in routes:
+        app.add_url_rule(rule, view_func=view, **options)
+    app.cli.command('reap')(with_schema(app_reaper.reap_command))
+    app.cli.command('repair-counts')(with_schema(repair_counts_command))
+    # Not with_schema: the gunicorn master must not open the database before forking
+    app.cli.command('serve')(serve_command)
+    return app
 
 
 class TodoList(db.Model):
@@ -17,6 +171,11 @@ class TodoList(db.Model):
     # Columns
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(), nullable=False)
+    # Set when the list is deleted; its todos are then reaped in the background
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    # Kept up to date by triggers on the todo table, see counters.py
+    todo_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    completed_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     todos = db.relationship('Todo', backref='todolist',
                             lazy=True, cascade='all, delete', passive_deletes=True)
 
@@ -35,32 +194,305 @@ class Todo(db.Model):
     todolist_id = db.Column(db.Integer, db.ForeignKey(
         "todolist.id", ondelete="CASCADE"), nullable=False)
 
+    # Every list route filters on todolist_id and orders by id; the partial
+    # index keeps "open items of a list" lookups small on mostly-done lists.
+    __table_args__ = (
+        db.Index('ix_todo_todolist_id_id', 'todolist_id', 'id'),
+        db.Index('ix_todo_todolist_id_incomplete', 'todolist_id', 'id',
+                 sqlite_where=db.text('completed = 0'),
+                 postgresql_where=db.text('NOT completed')),
+    )
+
     # Object Representation
     def __repr__(self):
         return f"\n<Todo id:{self.id}, description:{self.description} completed:{self.completed}>"
 
-# Create tables for in-memory database (migrations not needed for in-memory)
-with app.app_context():
-    db.create_all()
+# Keep the todo_fts full-text index in step with Todo.description
+search.install(Todo.__table__)
+# And the per-list counts in step with the todos
+counters.install(Todo.__table__)
+
+
+class ListDeletion(db.Model):
+    # A list the reaper has finished deleting, so that its deletion progress
+    # still answers once the list row itself is gone
+    __tablename__ = 'list_deletion'
+    # Columns
+    list_id = db.Column(db.Integer, primary_key=True)
+    deleted_at = db.Column(db.DateTime, nullable=False)
+    reaped_at = db.Column(db.DateTime, nullable=False)
+
+    # Object Representation
+    def __repr__(self):
+        return f"\n<ListDeletion list_id:{self.list_id} reaped_at:{self.reaped_at}>"
+
+
+class StarterListState(db.Model):
+    # What one client has done to the built-in "welcome" list
+    __tablename__ = 'starter_list_state'
+    # Columns
+    client_id = db.Column(db.String(32), primary_key=True)
+    list_deleted = db.Column(db.Boolean, default=False, nullable=False)
+    # Comma-separated ids of the deleted starter tasks
+    deleted_tasks = db.Column(db.String(), default='', nullable=False)
+    # Bumped on every change; the client's cookie carries the latest value
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+    # Object Representation
+    def __repr__(self):
+        return f"\n<StarterListState client_id:{self.client_id} list_deleted:{self.list_deleted} deleted_tasks:{self.deleted_tasks}>"
+
+
+def sqlite_pragma_listener(config, read_only=False):
+    """Build a connect listener that tunes every new pooled SQLite connection.
+
+    WAL lets readers run alongside the single writer, synchronous=NORMAL is
+    durable under WAL without an fsync per commit, and busy_timeout makes
+    writers queue for the lock instead of failing straight away. A read-only
+    connection cannot change the journal mode, and relies on the writers
+    having set it.
+    """
+    pragmas = [] if read_only else ['PRAGMA journal_mode=WAL', 'PRAGMA synchronous=NORMAL']
+    pragmas += [
+        f"PRAGMA cache_size=-{config['TODO_SQLITE_CACHE_KIB']}",
+        f"PRAGMA busy_timeout={config['TODO_SQLITE_BUSY_TIMEOUT_MS']}",
+        'PRAGMA foreign_keys=ON',
+    ]
+
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return set_sqlite_pragmas
+
+
+schema_lock = Lock()
+
+
+def ensure_schema(app=None):
+    """Set up the database schema the first time an app needs it.
+
+    Runs before the first request and first CLI command. A new file database
+    gets the models' tables directly with create_all, which is much faster
+    than replaying every migration, and is stamped at the head revision; an
+    existing one is upgraded through the migrations. An in-memory database
+    is always new. Deletions left unfinished by an earlier process resume
+    afterwards.
+    """
+    app = app or current_app._get_current_object()
+    if app.extensions.get('schema_ready'):
+        return
+    with schema_lock:
+        if app.extensions.get('schema_ready'):
+            return
+        with app.app_context():
+            if db.engine.url.database in (None, '', ':memory:'):
+                db.create_all()
+            elif not create_new_schema():
+                upgrade(directory=migrate.directory)
+            app.extensions['reaper'].resume()
+        app.extensions['schema_ready'] = True
+
+
+def with_schema(command):
+    """Wrap a CLI command so the schema is set up before it runs."""
+    @functools.wraps(command)
+    def wrapper(*args, **kwargs):
+        ensure_schema()
+        return command(*args, **kwargs)
+    return wrapper
+
+
+def create_new_schema():
+    """Create and stamp the schema if the database is empty; return whether it was."""
+    with db.engine.connect() as conn:
+        # Hold the write lock so workers starting together on a new file
+        # database do not both create it
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+        if inspect(conn).get_table_names():
+            conn.rollback()
+            return False
+        db.metadata.create_all(conn)
+        MigrationContext.configure(conn).stamp(ScriptDirectory(migrate.directory), 'head')
+        conn.commit()
+        return True
+
+# The starter list state lives in the database, keyed by a client id kept in
+# a cookie together with the version of the state that client last wrote.
+# Each process caches the state it has read; an entry is only trusted while
+# its version matches the cookie, so a change made through another worker is
+# picked up on the next request without any cross-process invalidation.
+STARTER_COOKIE = 'todo_starter'
+EMPTY_STARTER_STATE = (False, frozenset())
+starter_cache = OrderedDict()
+starter_cache_lock = Lock()
+
+
+def parse_starter_cookie(value):
+    """Split a starter cookie into (client_id, version), or None if it is missing or malformed."""
+    client_id, _, version = (value or '').partition(':')
+    if len(client_id) != 32 or not version.isdigit():
+        return None
+    return client_id, int(version)
+
+
+def starter_state_from_row(row):
+    return (row.list_deleted, frozenset(int(t) for t in row.deleted_tasks.split(',') if t))
+
+
+def starter_client():
+    """Return (client_id, version) from the starter cookie, minting an id for new clients."""
+    if 'starter_client' not in g:
+        client = parse_starter_cookie(request.cookies.get(STARTER_COOKIE))
+        if client is None:
+            client = (uuid.uuid4().hex, 0)
+            g.starter_cookie_changed = True
+        g.starter_client = client
+    return g.starter_client
+
+
+def cache_starter_state(client_id, version, state, limit):
+    with starter_cache_lock:
+        starter_cache[client_id] = (version, state)
+        starter_cache.move_to_end(client_id)
+        while len(starter_cache) > limit:
+            starter_cache.popitem(last=False)
+
+
+def get_starter_state():
+    """Return (list_deleted, deleted_task_ids) for the current client."""
+    client_id, version = starter_client()
+    if version == 0:
+        # Nothing has been written for this client yet
+        return EMPTY_STARTER_STATE
+    cached = starter_cache.get(client_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    row = db.session.get(StarterListState, client_id)
+    if row is None:
+        return EMPTY_STARTER_STATE
+    state = starter_state_from_row(row)
+    cache_starter_state(client_id, row.version, state, current_app.config['TODO_STARTER_CACHE_SIZE'])
+    return state
+
+
+def update_starter_state(list_deleted=False, deleted_task=None):
+    """Record a change to the current client's starter list and commit it."""
+    client_id, _ = starter_client()
+    row = db.session.get(StarterListState, client_id)
+    if row is None:
+        row = StarterListState(client_id=client_id, deleted_tasks='', version=0)
+        db.session.add(row)
+    tasks = {int(t) for t in row.deleted_tasks.split(',') if t}
+    if deleted_task is not None:
+        tasks.add(deleted_task)
+    row.list_deleted = row.list_deleted or list_deleted
+    row.deleted_tasks = ','.join(str(t) for t in sorted(tasks))
+    row.version += 1
+    # Read before the commit expires the row and a SELECT reloads it
+    state = (row.list_deleted, frozenset(tasks))
+    version = row.version
+    db.session.commit()
 
-def get_deleted_tasks():
-    if not hasattr(app, 'deleted_starter_tasks'):
-        app.deleted_starter_tasks = set()
-    return app.deleted_starter_tasks
+    cache_starter_state(client_id, version, state, current_app.config['TODO_STARTER_CACHE_SIZE'])
+    g.starter_client = (client_id, version)
+    g.starter_cookie_changed = True
 
 
-@app.route('/todos/<todolist_id>', methods=['POST'])
+def save_starter_cookie(response):
+    if g.get('starter_cookie_changed'):
+        client_id, version = g.starter_client
+        response.set_cookie(STARTER_COOKIE, f'{client_id}:{version}',
+                            max_age=365 * 24 * 3600, httponly=True, samesite='Lax')
+    return response
+
+
+def write(operation):
+    """Run operation(connection) and commit, returning its result.
+
+    In group commit mode the operation joins the writer thread's next batch
+    and this returns once that batch has committed.
+    """
+    if group_commit.enabled:
+        return group_commit.submit(operation)
+    result = operation(db.session.connection())
+    db.session.commit()
+    return result
+
+
+@route('/todos/<todolist_id>', methods=['POST'])
+@budget(2)
 def create_todo(todolist_id):
+    if 'descriptions' in (request.get_json(silent=True) or {}):
+        return create_todos(todolist_id)
+
     error = False
     body = {}
     try:
         description = request.get_json()['description']
         todolist_id = request.get_json()['todolist_id']
-        todo = Todo(description=description, todolist_id=todolist_id)
-        db.session.add(todo)
+        todo_id = write(lambda conn: conn.execute(
+            insert(Todo).values(description=description, todolist_id=todolist_id, completed=False)
+            .returning(Todo.id)).scalar_one())
+        body['id'] = todo_id
+        body['description'] = description
+        changes.publish(todolist_id, 'todo_created',
+                        {'id': todo_id, 'description': description, 'completed': False})
+    except:
+        error = True
+        db.session.rollback()
+    finally:
+        db.session.close()
+
+    if error:
+        abort(400)
+    else:
+        return jsonify(body)
+
+
+def create_todos(todolist_id):
+    """Batch variant of create_todo.
+
+    Expects {"descriptions": [...], "atomic": true}. All rows go in with a
+    single bulk INSERT in one transaction and the new ids come back in the
+    order of the descriptions. With "atomic" (the default) any invalid
+    description rejects the whole batch; with "atomic": false the valid ones
+    are inserted and the invalid ones are reported per index.
+    """
+    error = False
+    body = {}
+    try:
+        data = request.get_json()
+        descriptions = data['descriptions']
+        todolist_id = data.get('todolist_id', todolist_id)
+        atomic = data.get('atomic', True)
+        if not isinstance(descriptions, list) or len(descriptions) > current_app.config['TODO_MAX_BATCH_SIZE']:
+            raise ValueError('descriptions must be a list within the batch size limit')
+
+        rows = []
+        errors = []
+        for index, description in enumerate(descriptions):
+            if isinstance(description, str) and description.strip():
+                rows.append({'description': description, 'todolist_id': todolist_id})
+            else:
+                errors.append({'index': index, 'error': 'description must be a non-empty string'})
+
+        if errors and atomic:
+            body['errors'] = errors
+            return jsonify(body), 400
+
+        new_ids = iter(insert_todos(rows))
+        failed = {item['index'] for item in errors}
+        body['ids'] = [None if index in failed else next(new_ids)
+                       for index in range(len(descriptions))]
+        if errors:
+            body['errors'] = errors
         db.session.commit()
-        body['id'] = todo.id
-        body['description'] = todo.description
+        changes.publish(todolist_id, 'todos_created', {'todos': [
+            {'id': todo_id, 'description': description, 'completed': False}
+            for todo_id, description in zip(body['ids'], descriptions) if todo_id is not None]})
     except:
         error = True
         db.session.rollback()
@@ -73,7 +505,32 @@ def create_todo(todolist_id):
         return jsonify(body)
 
 
-@app.route('/todos', methods=['POST'])
+def insert_todos(rows):
+    """Bulk insert Todo rows and return their ids in parameter order.
+
+    SQLite cannot tell which RETURNING row belongs to which parameters, so
+    SQLAlchemy would send one INSERT per row to keep the ids in order. The
+    rows go in with a single executemany instead, and the ids are read back
+    with latest_todo_ids().
+    """
+    if not rows:
+        return []
+    db.session.execute(insert(Todo), rows)
+    return db.session.scalars(latest_todo_ids(len(rows))).all()[::-1]
+
+
+def latest_todo_ids(count):
+    """Select the ids of the last `count` todos inserted, newest first.
+
+    SQLite gives every new row an id one larger than the largest so far, and
+    the inserting transaction holds the write lock until it commits, so run
+    right after an insert in the same transaction these are its rows.
+    """
+    return select(Todo.id).order_by(Todo.id.desc()).limit(count)
+
+
+@route('/todos', methods=['POST'])
+@budget(1)
 def create_list():
     error = False
     body = {}
@@ -81,9 +538,12 @@ def create_list():
         name = request.get_json()['name']
         list = TodoList(name=name)
         db.session.add(list)
-        db.session.commit()
+        db.session.flush()
+        # Read before the commit expires the object and a SELECT reloads it
         body['id'] = list.id
-        body['name'] = list.name
+        body['name'] = name
+        db.session.commit()
+        changes.publish_all('list_created', body)
     except:
         error = True
         db.session.rollback()
@@ -96,17 +556,69 @@ def create_list():
         return jsonify(body)
 
 
-@app.route('/todos/<list_id>/<todo_id>', methods=['PATCH'])
+@route('/todos/<list_id>/<todo_id>', methods=['PATCH'])
+@budget(1)
 def update_todo(list_id, todo_id):
-    print(list_id)
     error = False
     body = {}
     try:
         completed = request.get_json()['completed']
-        todo = db.session.get(Todo, todo_id)
-        todo.completed = completed
+        completed, todolist_id = write(lambda conn: tuple(conn.execute(
+            update(Todo).where(Todo.id == todo_id).values(completed=completed)
+            .returning(Todo.completed, Todo.todolist_id)).one()))
+        body['completed'] = completed
+        changes.publish(todolist_id, 'todo_updated', {'id': int(todo_id), 'completed': completed})
+    except:
+        error = True
+        db.session.rollback()
+    finally:
+        db.session.close()
+
+    if error:
+        abort(400)
+    else:
+        return jsonify(body)
+
+
+@route('/todos/<list_id>', methods=['PATCH'])
+@budget(1)
+def update_todos(list_id):
+    """Batch variant of update_todo.
+
+    Expects {"todos": [{"id": 1, "completed": true}, ...]} and applies every
+    toggle with a single UPDATE in one transaction. Later entries for the same
+    id win. Todos that are not on the list are ignored.
+    """
+    error = False
+    body = {}
+    try:
+        toggles = request.get_json()['todos']
+        if not isinstance(toggles, list) or len(toggles) > current_app.config['TODO_MAX_BATCH_SIZE']:
+            raise ValueError('todos must be a list within the batch size limit')
+        states = {}
+        for toggle in toggles:
+            if not isinstance(toggle['id'], int) or not isinstance(toggle['completed'], bool):
+                raise ValueError('each todo needs an integer id and a boolean completed')
+            states[toggle['id']] = toggle['completed']
+
+        updated = []
+        if states:
+            done = [todo_id for todo_id, completed in states.items() if completed]
+            updated = db.session.execute(
+                update(Todo)
+                .where(Todo.todolist_id == list_id, Todo.id.in_(states))
+                .values(completed=Todo.id.in_(done))
+                .returning(Todo.id, Todo.completed)
+                .execution_options(synchronize_session=False)).all()
         db.session.commit()
-        body['completed'] = todo.completed
+        body['successful'] = not error
+        body['count'] = len(updated)
+        if updated:
+            # Only the todos actually on this list, in the order they were sent
+            order = {todo_id: index for index, todo_id in enumerate(states)}
+            changes.publish(list_id, 'todos_updated', {'todos': [
+                {'id': todo_id, 'completed': completed}
+                for todo_id, completed in sorted(updated, key=lambda row: order[row.id])]})
     except:
         error = True
         db.session.rollback()
@@ -119,16 +631,52 @@ def update_todo(list_id, todo_id):
         return jsonify(body)
 
 
-@app.route('/todos/<list_id>', methods=['PUT'])
+@route('/todos/<list_id>', methods=['PUT'])
+@budget(1)
 def update_all(list_id):
+    # Marks every todo in the list complete, or incomplete when the body
+    # carries {"completed": false}, with one UPDATE that never loads the rows.
+    error = False
+    body = {}
+    try:
+        completed = (request.get_json(silent=True) or {}).get('completed', True)
+        if not isinstance(completed, bool):
+            raise ValueError('completed must be a boolean')
+        result = db.session.execute(
+            update(Todo)
+            .where(Todo.todolist_id == list_id, Todo.completed != completed)
+            .values(completed=completed)
+            .execution_options(synchronize_session=False))
+        db.session.commit()
+        body['successful'] = not error
+        body['count'] = result.rowcount
+        changes.publish(list_id, 'list_updated', {'completed': completed})
+    except:
+        error = True
+        db.session.rollback()
+    finally:
+        db.session.close()
+
+    if error:
+        abort(400)
+    else:
+        return jsonify(body)
+
+
+@route('/todos/<list_id>/completed', methods=['DELETE'])
+@budget(1)
+def clear_completed(list_id):
     error = False
     body = {}
     try:
-        todos = Todo.query.filter_by(todolist_id=list_id).all()
-        for todo in todos:
-            todo.completed = True
+        result = db.session.execute(
+            delete(Todo)
+            .where(Todo.todolist_id == list_id, Todo.completed == True)
+            .execution_options(synchronize_session=False))
         db.session.commit()
         body['successful'] = not error
+        body['count'] = result.rowcount
+        changes.publish(list_id, 'completed_cleared')
     except:
         error = True
         db.session.rollback()
@@ -141,21 +689,29 @@ def update_all(list_id):
         return jsonify(body)
 
 
-@app.route('/todos/<list_id>/<todo_id>', methods=["DELETE"])
+@route('/todos/<list_id>/<todo_id>', methods=["DELETE"])
+@budget(2)
 def delete_todo(list_id, todo_id):
-    print(list_id)
     error = False
     body = {}
     
     if list_id == 'welcome':
-        get_deleted_tasks().add(int(todo_id))
-        body['successful'] = True
+        try:
+            update_starter_state(deleted_task=int(todo_id))
+            body['successful'] = True
+        except:
+            error = True
+            db.session.rollback()
+        finally:
+            db.session.close()
     else:
         try:
-            # Just delete the Todo.
-            Todo.query.filter_by(id=todo_id).delete()
-            db.session.commit()
+            # Just delete the Todo, learning which list it was on for the change feed.
+            deleted_from = write(lambda conn: conn.execute(
+                delete(Todo).where(Todo.id == todo_id).returning(Todo.todolist_id)).scalar())
             body['successful'] = not error
+            if deleted_from is not None:
+                changes.publish(deleted_from, 'todo_deleted', {'id': int(todo_id)})
         except:
             error = True
             db.session.rollback()
@@ -168,22 +724,24 @@ def delete_todo(list_id, todo_id):
         return jsonify(body)
 
 
-@app.route('/todos/<list_id>', methods=["DELETE"])
+@route('/todos/<list_id>', methods=["DELETE"])
 def delete_list(list_id):
     error = False
     body = {}
     try:
         if list_id == 'welcome':
-            # Mark the starter list as permanently deleted
-            app.starter_list_deleted = True
+            # Mark the starter list as permanently deleted for this client
+            update_starter_state(list_deleted=True)
         else:
-            # First delete all todos associated with this list
-            Todo.query.filter_by(todolist_id=list_id).delete()
-            # Then delete the list itself
-            TodoList.query.filter_by(id=list_id).delete()
-        
+            # Hide the list straight away; its todos are deleted afterwards
+            # in short chunks so a huge list never holds the write lock long
+            reaper.tombstone(list_id)
+
         db.session.commit()
         body['successful'] = not error
+        if list_id != 'welcome':
+            changes.publish_all('list_deleted', {'id': list_id})
+            reaper.schedule(list_id)
     except:
         error = True
         db.session.rollback()
@@ -196,64 +754,395 @@ def delete_list(list_id):
         return jsonify(body)
 
 
-@app.route('/todos/<list_id>')
-def get_todo_list(list_id):
-    class DummyTodo:
-        def __init__(self, id, description):
-            self.id = id
-            self.description = description
-            self.completed = False
-    
-    dummyTodoList = [
-        DummyTodo(1, 'Create a Todo'),
-        DummyTodo(2, 'Accomplish the task'),
-        DummyTodo(3, 'Remove the Todo'),
-    ]
+class DummyTodo:
+    def __init__(self, id, description):
+        self.id = id
+        self.description = description
+        self.completed = False
 
-    dummyList = [
-        {
-            'id': 'welcome',
-            'name': 'Starter Task',
-        }
-    ]
 
-    name = dummyList[0]['name']
-    newList_id = dummyList[0]['id']
+dummyTodoList = [
+    DummyTodo(1, 'Create a Todo'),
+    DummyTodo(2, 'Accomplish the task'),
+    DummyTodo(3, 'Remove the Todo'),
+]
+
+dummyList = [
+    {
+        'id': 'welcome',
+        'name': 'Starter Task',
+    }
+]
+
+
+@route('/todos/<list_id>/events')
+def list_events(list_id):
+    return changes.response(list_id)
+
+
+def starter_variant(list_id):
+    """What of the client's starter list state a page shows, for the response cache."""
+    starter_list_deleted, deleted_tasks = get_starter_state()
+    if list_id == 'welcome':
+        return f'{starter_list_deleted}:{sorted(deleted_tasks)}'
+    return str(starter_list_deleted)
+
+
+PageTodo = namedtuple('PageTodo', 'id description completed')
+
+
+def page_lists(list_id=None):
+    """The live lists for the sidebar and, if list_id is one of them, its todos.
+
+    One query: the lists UNION ALL the todos of list_id, each branch read in
+    id order off an index, so SQLite merges them without sorting. A todo row
+    comes right after the row of its list, whose todo columns are NULL.
+    Returns (lists, name of list_id or None if it is not live, todos).
+    """
+    columns = (TodoList.id, TodoList.name, TodoList.todo_count, TodoList.completed_count)
+    lists_query = (select(*columns, null().label('todo_id'), null().label('description'),
+                          null().label('completed'))
+                   .where(TodoList.deleted_at.is_(None)))
+    if list_id is None:
+        rows = db.session.execute(lists_query.order_by(TodoList.id)).all()
+    else:
+        todos_query = (select(*columns, Todo.id, Todo.description, Todo.completed)
+                       .join(Todo, Todo.todolist_id == TodoList.id)
+                       .where(TodoList.id == list_id, TodoList.deleted_at.is_(None)))
+        rows = db.session.execute(union_all(lists_query, todos_query).order_by('id', 'todo_id')).all()
+
+    lists, name, todos = [], None, []
+    for row in rows:
+        if row.todo_id is not None:
+            todos.append(PageTodo(row.todo_id, row.description, bool(row.completed)))
+            continue
+        lists.append(row)
+        if row.id == list_id:
+            name = row.name
+    return lists, name, todos
+
+
+@route('/todos/<list_id>')
+@budget(2)
+@reads_replica
+@cached(vary=starter_variant)
+def get_todo_list(list_id):
+    starter_list_deleted, deleted_tasks = get_starter_state()
 
-    # Get available lists for sidebar (excluding deleted starter list if needed)
-    available_lists = TodoList.query.order_by('id').all()
-    if not (hasattr(app, 'starter_list_deleted') and app.starter_list_deleted):
-        # Add starter list to available lists if not deleted
-        available_lists = list(available_lists) + dummyList
-    
     if not list_id == 'welcome':
-        # Get list data, but handle if list was deleted. It was more elaborate before
-        # which kept it in place. Now we dont.
-        try:
-            list_obj = db.session.get(TodoList, list_id)
-            if list_obj is None:
-                # List was deleted, show empty UI with available lists
-                return render_template('index.html', data=[], list_id=list_id, list=available_lists, name="Deleted List")
-            return render_template('index.html', data=Todo.query.filter_by(todolist_id=list_id).order_by('id').all(), list_id=list_id, list=available_lists, name=list_obj.name)
-        except:
+        available_lists, name, todos = page_lists(int(list_id) if list_id.isdigit() else -1)
+        if not starter_list_deleted:
+            # Add starter list to available lists if not deleted
+            available_lists = available_lists + dummyList
+        if name is None:
+            # List was deleted (or never existed), show empty UI with available lists
             return render_template('index.html', data=[], list_id=list_id, list=available_lists, name="Deleted List")
+        return render_template('index.html', data=todos, list_id=list_id, list=available_lists, name=name)
+
+    available_lists, _, _ = page_lists()
+    if starter_list_deleted:
+        # Show empty UI but keep it functional
+        return render_template('index.html', data=[], list_id=dummyList[0]['id'], list=available_lists,
+                               name="Deleted Starter List")
+    todos_to_show = [todo for todo in dummyTodoList if todo.id not in deleted_tasks]
+    return render_template('index.html', data=todos_to_show, list_id=dummyList[0]['id'],
+                           list=available_lists + dummyList, name=dummyList[0]['name'])
+
+
+def page_args():
+    """Read the keyset cursor (?after=<id>) and page size (?limit=<n>)."""
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', current_app.config['TODO_API_DEFAULT_LIMIT'], type=int)
+    return after, max(1, min(limit, current_app.config['TODO_API_MAX_LIMIT']))
+
+
+def wants_columnar():
+    """Whether the client asked for ?format=columnar rather than a dict per row."""
+    response_format = request.args.get('format', 'rows')
+    if response_format not in ('rows', 'columnar'):
+        abort(400)
+    return response_format == 'columnar'
+
+
+def keyset_page(query, id_column, after, limit):
+    """Run one page of a keyset-paginated query.
+
+    Fetches limit + 1 rows after the cursor so we know whether another page
+    exists without a COUNT; the cost only depends on the page size.
+    """
+    if after is not None:
+        query = query.where(id_column > after)
+    rows = db.session.execute(query.order_by(id_column).limit(limit + 1)).all()
+    next_after = rows[limit - 1].id if len(rows) > limit else None
+    return rows[:limit], next_after
+
+
+@route('/api/lists')
+@budget(1)
+@reads_replica
+@cached()
+def api_get_lists():
+    after, limit = page_args()
+    as_columns = wants_columnar()
+    rows, next_after = keyset_page(
+        select(TodoList.id, TodoList.name, TodoList.todo_count, TodoList.completed_count)
+        .where(TodoList.deleted_at.is_(None)), TodoList.id, after, limit)
+    if as_columns:
+        return jsonify({
+            'lists': columnar(rows, ('id', 'name', 'todo_count', 'completed_count')),
+            'next_after': next_after,
+        })
+    return jsonify({
+        'lists': [{'id': row.id, 'name': row.name, 'todo_count': row.todo_count,
+                   'completed_count': row.completed_count} for row in rows],
+        'next_after': next_after,
+    })
+
+
+@route('/api/lists/<int:list_id>/todos')
+@budget(1)
+@reads_replica
+@cached(scope=lambda list_id: list_id)
+def api_get_todos(list_id):
+    after, limit = page_args()
+    as_columns = wants_columnar()
+    # A list being deleted has no visible todos left
+    query = (select(Todo.id, Todo.description, Todo.completed)
+             .join(TodoList, TodoList.id == Todo.todolist_id)
+             .where(Todo.todolist_id == list_id, TodoList.deleted_at.is_(None)))
+
+    completed = request.args.get('completed')
+    if completed is not None:
+        if completed.lower() not in ('true', 'false', '1', '0'):
+            abort(400)
+        query = query.where(Todo.completed == (completed.lower() in ('true', '1')))
+
+    rows, next_after = keyset_page(query, Todo.id, after, limit)
+    if as_columns:
+        return jsonify({
+            'todos': columnar(rows, ('id', 'description', 'completed')),
+            'next_after': next_after,
+        })
+    return jsonify({
+        'todos': [{'id': row.id, 'description': row.description, 'completed': row.completed}
+                  for row in rows],
+        'next_after': next_after,
+    })
+
+
+@route('/api/lists/<int:list_id>/export')
+@budget(1)
+@reads_replica
+def api_export_list(list_id):
+    """Stream a list as NDJSON: a "list" line followed by one "todo" line per todo.
+
+    Rows come off the cursor TODO_EXPORT_CHUNK_SIZE at a time and are written
+    out as they arrive, so memory use does not grow with the list.
+    """
+    todo_list = db.session.get(TodoList, list_id)
+    if todo_list is None or todo_list.deleted_at is not None:
+        abort(404)
+    header = {'type': 'list', 'id': todo_list.id, 'name': todo_list.name}
+
+    def generate():
+        yield current_app.json.dumps(header) + '\n'
+        result = db.session.execute(
+            select(Todo.description, Todo.completed)
+            .where(Todo.todolist_id == list_id)
+            .order_by(Todo.id)
+            .execution_options(yield_per=current_app.config['TODO_EXPORT_CHUNK_SIZE']))
+        for rows in result.partitions():
+            yield ''.join(current_app.json.dumps({'type': 'todo', 'description': row.description,
+                                          'completed': row.completed}) + '\n'
+                          for row in rows)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': f'attachment; filename="list-{list_id}.ndjson"'})
+
+
+class ImportLineError(ValueError):
+    def __init__(self, line, message):
+        super().__init__(message)
+        self.line = line
+
+
+def parse_import_line(number, line):
+    """Validate one NDJSON line of an import, returning the decoded object."""
+    try:
+        item = current_app.json.loads(line)
+    except ValueError:
+        raise ImportLineError(number, 'not valid JSON')
+    if not isinstance(item, dict):
+        raise ImportLineError(number, 'expected a JSON object')
+    if item.get('type') == 'list':
+        if number != 1:
+            raise ImportLineError(number, 'the list line must come first')
+        if not isinstance(item.get('name'), str) or not item['name'].strip():
+            raise ImportLineError(number, 'list name must be a non-empty string')
+    elif item.get('type') == 'todo':
+        if not isinstance(item.get('description'), str) or not item['description'].strip():
+            raise ImportLineError(number, 'description must be a non-empty string')
+        if not isinstance(item.get('completed', False), bool):
+            raise ImportLineError(number, 'completed must be a boolean')
     else:
-        # Handle starter list
-        if hasattr(app, 'starter_list_deleted') and app.starter_list_deleted:
-            # Show empty UI but keep it functional
-            return render_template('index.html', data=[], list_id=newList_id, list=available_lists, name="Deleted Starter List")
-        
-        todos_to_show = []
-        for todo in dummyTodoList:
-            if todo.id not in get_deleted_tasks():
-                todos_to_show.append(todo)
-        return render_template('index.html', data=todos_to_show, list_id=newList_id, list=available_lists, name=name)
-
-
-@app.route('/')
+        raise ImportLineError(number, 'type must be "list" or "todo"')
+    return item
+
+
+@route('/api/lists/import', methods=['POST'])
+def api_import_list():
+    """Create a list from an NDJSON body in the export format.
+
+    The body is read line by line and the todos are inserted and committed
+    TODO_IMPORT_CHUNK_SIZE at a time, so neither memory nor the write lock is
+    held for the whole import. The list line is optional (?name= names the
+    list otherwise). If anything fails, the partly imported list is deleted
+    again; an invalid line is reported with its line number.
+    """
+    started = time.perf_counter()
+    chunk_size = current_app.config['TODO_IMPORT_CHUNK_SIZE']
+    list_id = None
+    imported = 0
+    try:
+        items = (parse_import_line(number, line)
+                 for number, line in enumerate(request.stream, start=1) if line.strip())
+        first = next(items, None)
+        if first is not None and first['type'] == 'list':
+            name = first['name']
+        else:
+            name = request.args.get('name', 'Imported list')
+            items = itertools.chain([first] if first is not None else [], items)
+
+        todo_list = TodoList(name=name)
+        db.session.add(todo_list)
+        db.session.commit()
+        list_id = todo_list.id
+
+        for chunk in iter(lambda: list(itertools.islice(items, chunk_size)), []):
+            db.session.execute(insert(Todo), [
+                {'description': item['description'], 'completed': item.get('completed', False),
+                 'todolist_id': list_id} for item in chunk])
+            db.session.commit()
+            imported += len(chunk)
+    except Exception as e:
+        db.session.rollback()
+        if list_id is not None:
+            reaper.tombstone(list_id)
+            db.session.commit()
+            # Readers may have seen the chunks committed so far
+            response_cache.changed(list_id)
+            reaper.schedule(list_id)
+        if not isinstance(e, ImportLineError):
+            abort(400)
+        return jsonify({'error': str(e), 'line': e.line}), 400
+    finally:
+        db.session.close()
+
+    seconds = time.perf_counter() - started
+    changes.publish_all('list_created', {'id': list_id, 'name': name})
+    return jsonify({
+        'id': list_id,
+        'name': name,
+        'imported': imported,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(imported / seconds) if seconds else None,
+    })
+
+
+@route('/api/search')
+@budget(1)
+@reads_replica
+@cached()
+def api_search():
+    """Ranked full-text search over todo descriptions.
+
+    ?q= takes words that must all match, with a trailing * for a prefix;
+    ?list_id= scopes the search to one list. Results are ranked, so pages are
+    addressed with ?offset= rather than a keyset cursor.
+    """
+    query = search.match_query(request.args.get('q'))
+    if query is None:
+        abort(400)
+    _, limit = page_args()
+    as_columns = wants_columnar()
+    offset = max(0, request.args.get('offset', 0, type=int))
+
+    statement = (
+        select(Todo.id, Todo.description, Todo.completed, Todo.todolist_id)
+        .select_from(search.todo_fts)
+        .join(Todo, Todo.id == search.todo_fts.c.rowid)
+        .join(TodoList, TodoList.id == Todo.todolist_id)
+        .where(search.todo_fts.c.todo_fts.op('MATCH')(query), TodoList.deleted_at.is_(None)))
+    list_id = request.args.get('list_id', type=int)
+    if list_id is not None:
+        statement = statement.where(Todo.todolist_id == list_id)
+
+    rows = db.session.execute(
+        statement.order_by(search.rank, Todo.id).offset(offset).limit(limit + 1)).all()
+    next_offset = offset + limit if len(rows) > limit else None
+    if as_columns:
+        return jsonify({
+            'todos': columnar(rows[:limit], ('id', 'description', 'completed', 'list_id')),
+            'next_offset': next_offset,
+        })
+    return jsonify({
+        'todos': [{'id': row.id, 'description': row.description, 'completed': row.completed,
+                   'list_id': row.todolist_id} for row in rows[:limit]],
+        'next_offset': next_offset,
+    })
+
+
+@route('/api/lists/<int:list_id>/deletion')
+@budget(2)
+def api_get_deletion(list_id):
+    progress = reaper.progress(list_id)
+    if progress is None:
+        abort(404)
+    return jsonify(progress)
+
+
+def repair_counts_command():
+    """Recompute the per-list todo counts from the todo table."""
+    repaired = counters.repair(db.session, TodoList, Todo)
+    db.session.commit()
+    click.echo(f'Repaired the counts of {repaired} lists.')
+
+
+@click.option('--bind', help='Address to listen on (default 0.0.0.0:3000, or $PORT).')
+@click.option('--workers', type=int, help='Worker processes (default: one per CPU with file storage).')
+@click.option('--threads', type=int, help='Request threads per worker, besides the change feed streams.')
+def serve_command(bind, workers, threads):
+    """Serve the app with gunicorn, using the settings in gunicorn.conf.py."""
+    if importlib.util.find_spec('gunicorn') is None:
+        raise click.ClickException('flask serve needs gunicorn: pip install gunicorn')
+    os.execv(sys.executable, gunicorn_argv(bind, workers, threads))
+
+
+def gunicorn_argv(bind=None, workers=None, threads=None):
+    """The command line running app:app under gunicorn.
+
+    The options are passed on as the environment variables gunicorn.conf.py
+    reads, so that it stays the one place the defaults are worked out.
+    """
+    for name, value in (('TODO_BIND', bind), ('TODO_WORKERS', workers), ('TODO_THREADS', threads)):
+        if value is not None:
+            os.environ[name] = str(value)
+    root = os.path.dirname(os.path.abspath(__file__))
+    return [sys.executable, '-m', 'gunicorn', '--chdir', root,
+            '--config', os.path.join(root, 'gunicorn.conf.py'), 'app:app']
+
+
+@route('/')
+@budget(1)
+@reads_replica
+@cached()
 def index():
-    return redirect(url_for('get_todo_list', list_id=TodoList.query.first().id if len(TodoList.query.all()) > 0 else 'welcome'))
+    first_id = db.session.scalar(
+        select(TodoList.id).where(TodoList.deleted_at.is_(None)).order_by(TodoList.id).limit(1))
+    return redirect(url_for('get_todo_list', list_id=first_id if first_id is not None else 'welcome'))
+
 
+app = create_app()
 
 if __name__ == '__main__':
     app.debug = True
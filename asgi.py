@@ -0,0 +1,428 @@
+"""Optional ASGI serving mode on an async SQLAlchemy engine.
+
+    TODO_STORAGE=file uvicorn asgi:application --workers 2
+
+The list and todo routes (create, update and delete of todos and lists, the
+list page and the / redirect) run natively on an aiosqlite engine, so one
+process can keep many requests in flight while they wait on the database.
+The change feed streams are served natively too, as tasks on the event loop,
+so an open list page costs no thread. Every other path (static assets,
+/metrics, the JSON API) is handed to the Flask app through asgiref, each
+request on a thread of the loop's default executor.
+
+This mode needs the optional aiosqlite and asgiref packages plus an ASGI
+server such as uvicorn. Use the file storage mode: with the in-memory
+database the async engine and the Flask fallback would each see their own
+private database.
+"""
+import asyncio
+import re
+import uuid
+from http.cookies import SimpleCookie
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from werkzeug.http import dump_cookie
+
+from app import (app, db, ensure_schema, ListDeletion, Todo, TodoList, StarterListState, STARTER_COOKIE,
+                 EMPTY_STARTER_STATE, cache_starter_state, dummyList, dummyTodoList, latest_todo_ids, parse_starter_cookie,
+                 sqlite_pragma_listener, starter_cache, starter_state_from_row)
+from events import AsyncSubscriber
+
+EVENTS_PATH = re.compile(r'^/todos/(?P<list_id>[^/]+)/events$')
+
+
+def make_async_engine(config):
+    url = config['SQLALCHEMY_DATABASE_URI'].replace('sqlite://', 'sqlite+aiosqlite://', 1)
+    if config['TODO_STORAGE'] == 'file':
+        engine = create_async_engine(url, pool_size=config['TODO_DB_POOL_SIZE'],
+                                     max_overflow=config['TODO_DB_MAX_OVERFLOW'])
+        event.listen(engine.sync_engine, 'connect', sqlite_pragma_listener(config))
+    else:
+        engine = create_async_engine(url, poolclass=StaticPool)
+    return engine
+
+
+class ThreadPoolWsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs WSGI apps thread-sensitively, i.e. every request on one
+    # shared thread, so a single slow request (an export download, say)
+    # would hold up all the others passed through to Flask
+    run_wsgi_app = sync_to_async(WsgiToAsgiInstance.__dict__['run_wsgi_app'].func, thread_sensitive=False)
+
+
+class ThreadPoolWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi running each request on its own thread of the default executor."""
+
+    async def __call__(self, scope, receive, send):
+        await ThreadPoolWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+class HTTPError(Exception):
+    def __init__(self, status):
+        self.status = status
+
+
+class Request:
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.body = body
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope['headers']}
+        cookies = SimpleCookie(self.headers.get('cookie', ''))
+        self.cookies = {key: morsel.value for key, morsel in cookies.items()}
+        self.set_cookies = []
+
+    def json(self, silent=False):
+        try:
+            return app.json.loads(self.body)
+        except ValueError:
+            if silent:
+                return None
+            raise HTTPError(400)
+
+    def starter_client(self):
+        """Async-side twin of app.starter_client()."""
+        if not hasattr(self, '_starter_client'):
+            client = parse_starter_cookie(self.cookies.get(STARTER_COOKIE))
+            if client is None:
+                client = (uuid.uuid4().hex, 0)
+                self.save_starter_client(client)
+            self._starter_client = client
+        return self._starter_client
+
+    def save_starter_client(self, client):
+        self._starter_client = client
+        self.set_cookies = [f'{STARTER_COOKIE}={client[0]}:{client[1]}; Max-Age={365 * 24 * 3600}; '
+                            'HttpOnly; Path=/; SameSite=Lax']
+
+
+class AsyncTodoApp:
+    """ASGI application serving the hot routes natively and the rest through Flask."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.changes = flask_app.extensions['events']
+        self.reaper = flask_app.extensions['reaper']
+        self.replica = flask_app.extensions['replica']
+        self.engine = make_async_engine(flask_app.config)
+        self.template = flask_app.jinja_env.get_template('index.html')
+        self.fallback = ThreadPoolWsgiToAsgi(flask_app)
+        self.routes = [
+            ('GET', re.compile(r'^/$'), self.index),
+            ('POST', re.compile(r'^/todos$'), self.create_list),
+            ('POST', re.compile(r'^/todos/(?P<todolist_id>[^/]+)$'), self.create_todo),
+            ('PATCH', re.compile(r'^/todos/(?P<list_id>[^/]+)/(?P<todo_id>[^/]+)$'), self.update_todo),
+            ('PUT', re.compile(r'^/todos/(?P<list_id>[^/]+)$'), self.update_all),
+            ('DELETE', re.compile(r'^/todos/(?P<list_id>[^/]+)/(?P<todo_id>(?!completed$)[^/]+)$'), self.delete_todo),
+            ('DELETE', re.compile(r'^/todos/(?P<list_id>[^/]+)$'), self.delete_list),
+            ('GET', re.compile(r'^/todos/(?P<list_id>[^/]+)$'), self.get_todo_list),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http':
+            match = EVENTS_PATH.match(scope['path'])
+            if match and scope['method'] == 'GET':
+                return await self.list_events(match['list_id'], receive, send)
+            for method, pattern, handler in self.routes:
+                match = pattern.match(scope['path'])
+                if match and scope['method'] == method:
+                    return await self.dispatch(handler, match.groupdict(), scope, receive, send)
+        return await self.fallback(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.flask_app.config['TODO_STORAGE'] != 'file':
+                    async with self.engine.begin() as conn:
+                        await conn.run_sync(db.metadata.create_all)
+                else:
+                    # Both engines share the file; set it up before serving
+                    await asyncio.to_thread(ensure_schema, self.flask_app)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def list_events(self, list_id, receive, send):
+        """Native twin of ChangeFeed.stream(), ending when the client disconnects."""
+        subscriber = self.changes.subscribe(
+            list_id, AsyncSubscriber(asyncio.get_running_loop(), self.changes.queue_size))
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        next_event = None
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no')]})
+            frame = self.changes.retry_frame()
+            while True:
+                await send({'type': 'http.response.body', 'body': frame.encode(), 'more_body': True})
+                if next_event is None:
+                    next_event = asyncio.ensure_future(subscriber.get())
+                done, _ = await asyncio.wait({next_event, disconnected}, timeout=self.changes.heartbeat,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    return
+                if next_event in done:
+                    frame = self.changes.frame(*next_event.result())
+                    next_event = None
+                else:
+                    frame = ': keep-alive\n\n'
+        finally:
+            disconnected.cancel()
+            if next_event is not None:
+                next_event.cancel()
+            self.changes.unsubscribe(list_id, subscriber)
+
+    async def dispatch(self, handler, params, scope, receive, send):
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        request = Request(scope, body)
+        try:
+            status, content_type, payload, extra_headers = await handler(request, **params)
+        except HTTPError as e:
+            status, content_type, payload, extra_headers = e.status, 'text/plain', b'Bad Request', []
+        headers = [(b'content-type', content_type.encode()),
+                   (b'content-length', str(len(payload)).encode())]
+        headers += [(name.encode(), value.encode()) for name, value in extra_headers]
+        headers += [(b'set-cookie', cookie.encode()) for cookie in request.set_cookies]
+        # Read-your-writes for the reads the Flask fallback sends to the replica
+        sticky = self.replica.sticky_cookie(request.method, status)
+        if sticky is not None:
+            headers.append((b'set-cookie', dump_cookie(**sticky).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': payload})
+
+    def json(self, body, status=200):
+        return status, 'application/json', app.json.dumpb(body), []
+
+    def html(self, **context):
+        return 200, 'text/html; charset=utf-8', self.template.render(**context).encode(), []
+
+    async def create_todo(self, request, todolist_id):
+        data = request.json()
+        if not isinstance(data, dict):
+            raise HTTPError(400)
+        if 'descriptions' in data:
+            return await self.create_todos(data, todolist_id)
+        try:
+            description = data['description']
+            todolist_id = data['todolist_id']
+            async with self.engine.begin() as conn:
+                todo_id = (await conn.execute(
+                    insert(Todo).values(description=description, todolist_id=todolist_id, completed=False)
+                    .returning(Todo.id))).scalar_one()
+        except Exception:
+            raise HTTPError(400)
+        self.changes.publish(todolist_id, 'todo_created', {'id': todo_id, 'description': description, 'completed': False})
+        return self.json({'id': todo_id, 'description': description})
+
+    async def create_todos(self, data, todolist_id):
+        try:
+            descriptions = data['descriptions']
+            todolist_id = data.get('todolist_id', todolist_id)
+            atomic = data.get('atomic', True)
+            if not isinstance(descriptions, list) or len(descriptions) > self.flask_app.config['TODO_MAX_BATCH_SIZE']:
+                raise ValueError('descriptions must be a list within the batch size limit')
+            rows = []
+            errors = []
+            for index, description in enumerate(descriptions):
+                if isinstance(description, str) and description.strip():
+                    rows.append({'description': description, 'todolist_id': todolist_id, 'completed': False})
+                else:
+                    errors.append({'index': index, 'error': 'description must be a non-empty string'})
+            if errors and atomic:
+                return self.json({'errors': errors}, 400)
+            ids = []
+            if rows:
+                async with self.engine.begin() as conn:
+                    # One executemany instead of an INSERT per row, see insert_todos()
+                    await conn.execute(insert(Todo), rows)
+                    ids = (await conn.execute(latest_todo_ids(len(rows)))).scalars().all()[::-1]
+        except Exception:
+            raise HTTPError(400)
+        new_ids = iter(ids)
+        failed = {item['index'] for item in errors}
+        body = {'ids': [None if index in failed else next(new_ids) for index in range(len(descriptions))]}
+        if errors:
+            body['errors'] = errors
+        self.changes.publish(todolist_id, 'todos_created', {'todos': [
+            {'id': todo_id, 'description': description, 'completed': False}
+            for todo_id, description in zip(body['ids'], descriptions) if todo_id is not None]})
+        return self.json(body)
+
+    async def create_list(self, request):
+        try:
+            name = request.json()['name']
+            async with self.engine.begin() as conn:
+                list_id = (await conn.execute(
+                    insert(TodoList).values(name=name).returning(TodoList.id))).scalar_one()
+        except Exception:
+            raise HTTPError(400)
+        self.changes.publish_all('list_created', {'id': list_id, 'name': name})
+        return self.json({'id': list_id, 'name': name})
+
+    async def update_todo(self, request, list_id, todo_id):
+        try:
+            completed = request.json()['completed']
+            async with self.engine.begin() as conn:
+                result = await conn.execute(
+                    update(Todo).where(Todo.id == int(todo_id)).values(completed=completed)
+                    .returning(Todo.completed, Todo.todolist_id))
+                completed, todolist_id = result.one()
+        except Exception:
+            raise HTTPError(400)
+        self.changes.publish(todolist_id, 'todo_updated', {'id': int(todo_id), 'completed': completed})
+        return self.json({'completed': completed})
+
+    async def update_all(self, request, list_id):
+        completed = (request.json(silent=True) or {}).get('completed', True)
+        if not isinstance(completed, bool):
+            raise HTTPError(400)
+        try:
+            async with self.engine.begin() as conn:
+                result = await conn.execute(
+                    update(Todo).where(Todo.todolist_id == list_id, Todo.completed != completed)
+                    .values(completed=completed))
+        except Exception:
+            raise HTTPError(400)
+        self.changes.publish(list_id, 'list_updated', {'completed': completed})
+        return self.json({'successful': True, 'count': result.rowcount})
+
+    async def delete_todo(self, request, list_id, todo_id):
+        try:
+            if list_id == 'welcome':
+                await self.update_starter_state(request, deleted_task=int(todo_id))
+            else:
+                async with self.engine.begin() as conn:
+                    deleted_from = (await conn.execute(
+                        delete(Todo).where(Todo.id == todo_id).returning(Todo.todolist_id))).scalar()
+                if deleted_from is not None:
+                    self.changes.publish(deleted_from, 'todo_deleted', {'id': int(todo_id)})
+        except Exception:
+            raise HTTPError(400)
+        return self.json({'successful': True})
+
+    async def delete_list(self, request, list_id):
+        try:
+            if list_id == 'welcome':
+                await self.update_starter_state(request, list_deleted=True)
+            else:
+                async with self.engine.begin() as conn:
+                    await conn.execute(
+                        update(TodoList).where(TodoList.id == list_id, TodoList.deleted_at.is_(None))
+                        .values(deleted_at=func.now()))
+                    if self.flask_app.config['TODO_STORAGE'] != 'file':
+                        # The reaper cannot see this engine's private in-memory
+                        # database, so reap it here in the same transaction
+                        await conn.execute(delete(Todo).where(Todo.todolist_id == list_id))
+                        deleted_at = (await conn.execute(
+                            delete(TodoList).where(TodoList.id == list_id)
+                            .returning(TodoList.deleted_at))).scalar()
+                        if deleted_at is not None:
+                            await conn.execute(delete(ListDeletion).where(ListDeletion.list_id == list_id))
+                            await conn.execute(insert(ListDeletion).values(
+                                list_id=list_id, deleted_at=deleted_at, reaped_at=func.now()))
+                self.changes.publish_all('list_deleted', {'id': list_id})
+                if self.flask_app.config['TODO_STORAGE'] == 'file':
+                    # The reaper runs on the sync engine; keep it off the event loop
+                    await asyncio.to_thread(self.reaper.schedule, list_id)
+        except Exception:
+            raise HTTPError(400)
+        return self.json({'successful': True})
+
+    async def get_starter_state(self, conn, request):
+        client_id, version = request.starter_client()
+        if version == 0:
+            return EMPTY_STARTER_STATE
+        cached = starter_cache.get(client_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        row = (await conn.execute(
+            select(StarterListState).where(StarterListState.client_id == client_id))).first()
+        if row is None:
+            return EMPTY_STARTER_STATE
+        state = starter_state_from_row(row)
+        cache_starter_state(client_id, row.version, state, self.flask_app.config['TODO_STARTER_CACHE_SIZE'])
+        return state
+
+    async def update_starter_state(self, request, list_deleted=False, deleted_task=None):
+        client_id, _ = request.starter_client()
+        table = StarterListState.__table__
+        async with self.engine.begin() as conn:
+            row = (await conn.execute(select(table).where(table.c.client_id == client_id))).first()
+            if row is None:
+                list_deleted_before, tasks, version = False, set(), 0
+            else:
+                list_deleted_before, tasks = starter_state_from_row(row)
+                tasks, version = set(tasks), row.version
+            if deleted_task is not None:
+                tasks.add(deleted_task)
+            values = {'list_deleted': list_deleted_before or list_deleted,
+                      'deleted_tasks': ','.join(str(t) for t in sorted(tasks)),
+                      'version': version + 1}
+            if row is None:
+                await conn.execute(insert(table).values(client_id=client_id, **values))
+            else:
+                await conn.execute(update(table).where(table.c.client_id == client_id).values(**values))
+        cache_starter_state(client_id, version + 1, (values['list_deleted'], frozenset(tasks)),
+                            self.flask_app.config['TODO_STARTER_CACHE_SIZE'])
+        request.save_starter_client((client_id, version + 1))
+
+    async def get_todo_list(self, request, list_id):
+        name = dummyList[0]['name']
+        newList_id = dummyList[0]['id']
+        async with self.engine.connect() as conn:
+            starter_list_deleted, deleted_tasks = await self.get_starter_state(conn, request)
+            available_lists = (await conn.execute(
+                select(TodoList.id, TodoList.name, TodoList.todo_count, TodoList.completed_count)
+                .where(TodoList.deleted_at.is_(None))
+                .order_by(TodoList.id))).all()
+            if not starter_list_deleted:
+                available_lists = list(available_lists) + dummyList
+
+            if list_id != 'welcome':
+                list_row = None
+                if list_id.isdigit():
+                    list_row = (await conn.execute(
+                        select(TodoList.name)
+                        .where(TodoList.id == int(list_id), TodoList.deleted_at.is_(None)))).first()
+                if list_row is None:
+                    return self.html(data=[], list_id=list_id, list=available_lists, name="Deleted List")
+                todos = (await conn.execute(
+                    select(Todo.id, Todo.description, Todo.completed)
+                    .where(Todo.todolist_id == int(list_id)).order_by(Todo.id))).all()
+                return self.html(data=todos, list_id=list_id, list=available_lists, name=list_row.name)
+
+        if starter_list_deleted:
+            return self.html(data=[], list_id=newList_id, list=available_lists, name="Deleted Starter List")
+        todos_to_show = [todo for todo in dummyTodoList if todo.id not in deleted_tasks]
+        return self.html(data=todos_to_show, list_id=newList_id, list=available_lists, name=name)
+
+    async def index(self, request):
+        async with self.engine.connect() as conn:
+            first_id = (await conn.execute(
+                select(TodoList.id).where(TodoList.deleted_at.is_(None))
+                .order_by(TodoList.id).limit(1))).scalar()
+        location = f"/todos/{first_id if first_id is not None else 'welcome'}"
+        return 302, 'text/html; charset=utf-8', b'', [('location', location)]
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+application = AsyncTodoApp(app)
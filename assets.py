@@ -0,0 +1,86 @@
+"""Fingerprinted, long-cached static assets.
+
+Every file under the static folder is served at a URL that embeds a hash of
+its content, e.g. /assets/css/app.3f2a1c9d0b7e.css. Because the URL changes
+whenever the file does, responses can be cached forever:
+
+    Cache-Control: public, max-age=31536000, immutable
+
+Templates get the current URL with asset_url('css/app.css').
+"""
+import hashlib
+import mimetypes
+import os
+from collections import namedtuple
+
+from flask import Response, abort, current_app, has_app_context, request
+
+Asset = namedtuple('Asset', 'path digest data mimetype mtime')
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def fingerprint(filename, digest):
+    root, ext = os.path.splitext(filename)
+    return f'{root}.{digest}{ext}'
+
+
+class Assets:
+    """Flask extension building the asset manifest and serving /assets/."""
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.folder = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['assets'] = self
+        self.folder = app.static_folder
+        self.manifest = self.build_manifest()
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+        app.add_template_global(self.url, 'asset_url')
+
+    def build_manifest(self):
+        manifest = {}
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                path = os.path.join(root, name)
+                logical = os.path.relpath(path, self.folder).replace(os.sep, '/')
+                manifest[logical] = self.load(path)
+        return manifest
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        return Asset(path, hashlib.sha256(data).hexdigest()[:12], data, mimetype,
+                     os.path.getmtime(path))
+
+    def get(self, logical):
+        asset = self.manifest.get(logical)
+        # Pick up edits while developing; in production the manifest is fixed.
+        # Read per call, as `python app.py` turns debug on after create_app().
+        debug = has_app_context() and current_app.debug
+        if asset is not None and debug and os.path.getmtime(asset.path) != asset.mtime:
+            asset = self.manifest[logical] = self.load(asset.path)
+        return asset
+
+    def url(self, logical):
+        asset = self.get(logical)
+        if asset is None:
+            raise KeyError(f'unknown asset {logical!r}')
+        return '/assets/' + fingerprint(logical, asset.digest)
+
+    def serve(self, filename):
+        root, ext = os.path.splitext(filename)
+        logical_root, _, digest = root.rpartition('.')
+        asset = self.get(logical_root + ext)
+        # Old fingerprints are not served, so a stale URL can never be cached
+        # with content that does not match its hash.
+        if asset is None or asset.digest != digest:
+            abort(404)
+        response = Response(asset.data, mimetype=asset.mimetype)
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.set_etag(asset.digest)
+        return response.make_conditional(request)
@@ -0,0 +1,412 @@
+'''
+Load and regression benchmark for every route in app.py.
+
+  1. Seeds a reproducible dataset (--lists x --todos, --seed) with bulk inserts
+  2. Drives each route with the Flask test client, or with --server against a
+     real (multi-worker) server sharing the same database
+  3. Reports p50/p95/p99 latency and throughput per route
+  4. With --baseline, fails when a route's p95 regresses beyond --tolerance
+  5. Fails when a request issued more SQL statements than its route's budget
+     (see querybudget.py; test client mode only)
+
+Examples:
+
+  python benchmark.py --lists 1000 --todos 1000
+  python benchmark.py --save-baseline bench_baseline.json
+  python benchmark.py --baseline bench_baseline.json --tolerance 0.25
+
+To benchmark a real server, point both at the same database file:
+
+  TODO_STORAGE=file TODO_SQLITE_PATH=/tmp/bench.db gunicorn -w 4 app:app
+  TODO_STORAGE=file TODO_SQLITE_PATH=/tmp/bench.db python benchmark.py --server http://127.0.0.1:8000 --concurrency 16
+
+To compare the sync (WSGI) and async (ASGI, see asgi.py) serving modes
+in-process under the same concurrent mix of page loads, creates and toggles:
+
+  TODO_STORAGE=file TODO_SQLITE_PATH=/tmp/bench.db python benchmark.py --compare-async --concurrency 32
+'''
+import argparse
+import asyncio
+import http.client
+import json
+import math
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from sqlalchemy import insert, select
+
+from app import create_app, db, ensure_schema, Todo, TodoList
+
+SEED_CHUNK_SIZE = 10000
+
+
+def seed(app, lists, todos, completed_ratio=0.3, seed_value=1234, name_prefix='Bench'):
+    """Bulk insert `lists` lists of `todos` todos each and return the list ids."""
+    rng = random.Random(seed_value)
+    ensure_schema(app)
+    with app.app_context():
+        # Without sort_by_parameter_order SQLAlchemy can batch the RETURNING
+        # inserts instead of sending one per row; the todos need no ids back
+        # and go in with a plain executemany
+        list_ids = sorted(db.session.execute(
+            insert(TodoList).returning(TodoList.id),
+            [{'name': f'{name_prefix} list {i}'} for i in range(lists)]).scalars().all())
+        rows = []
+        for list_id in list_ids:
+            for i in range(todos):
+                rows.append({'description': f'{name_prefix} todo {list_id}-{i}',
+                             'completed': rng.random() < completed_ratio,
+                             'todolist_id': list_id})
+                if len(rows) >= SEED_CHUNK_SIZE:
+                    db.session.execute(insert(Todo), rows)
+                    rows = []
+        if rows:
+            db.session.execute(insert(Todo), rows)
+        db.session.commit()
+        return list_ids
+
+
+def todo_ids(app, list_id):
+    with app.app_context():
+        return db.session.execute(
+            select(Todo.id).where(Todo.todolist_id == list_id).order_by(Todo.id)).scalars().all()
+
+
+def request_options(body):
+    """How to send a scenario's body: bytes as NDJSON, anything else as JSON."""
+    if isinstance(body, bytes):
+        return body, 'application/x-ndjson'
+    if body is not None:
+        return json.dumps(body), 'application/json'
+    return None, None
+
+
+class TestClientDriver:
+    """Sends requests in-process through the Flask test client."""
+
+    concurrency = 1
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, url, body=None):
+        payload, content_type = request_options(body)
+        response = self.client.open(url, method=method, data=payload, content_type=content_type)
+        if response.mimetype == 'text/event-stream':
+            # A stream never ends: time its first frame, then hang up
+            next(iter(response.response))
+        response.close()
+        return response.status_code
+
+
+class HttpDriver:
+    """Sends requests to a running server over keep-alive HTTP connections."""
+
+    def __init__(self, base_url, concurrency):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.concurrency = concurrency
+        self.local = threading.local()
+
+    def request(self, method, url, body=None):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        payload, content_type = request_options(body)
+        headers = {'Content-Type': content_type} if content_type else {}
+        try:
+            conn.request(method, url, body=payload, headers=headers)
+            response = conn.getresponse()
+            if response.getheader('Content-Type', '').startswith('text/event-stream'):
+                # A stream never ends: time its first frame, then hang up
+                response.readline()
+                self.local.conn = None
+                conn.close()
+            else:
+                response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            self.local.conn = None
+            conn.close()
+            return 599
+
+
+class AsgiDriver:
+    """Sends requests in-process to an ASGI application."""
+
+    def __init__(self, application):
+        self.application = application
+
+    async def request(self, method, url, body=None, headers=None):
+        path, _, query = url.partition('?')
+        payload = json.dumps(body).encode() if body is not None else b''
+        raw_headers = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+        if body is not None:
+            raw_headers.append((b'content-type', b'application/json'))
+        scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                 'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+                 'query_string': query.encode(), 'root_path': '', 'headers': raw_headers,
+                 'client': ('127.0.0.1', 0), 'server': ('localhost', 80)}
+        messages = [{'type': 'http.request', 'body': payload, 'more_body': False}]
+        response = {'status': 599, 'headers': [], 'body': b''}
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = message['headers']
+            elif message['type'] == 'http.response.body':
+                response['body'] += message.get('body', b'')
+
+        await self.application(scope, receive, send)
+        return response
+
+
+def mixed_workload(list_ids, toggle_ids):
+    """Page loads, creates and toggles in a 2:1:1 mix, as used by --compare-async."""
+    def make_request(i):
+        list_id = list_ids[i % len(list_ids)]
+        kind = i % 4
+        if kind == 1:
+            return 'POST', f'/todos/{list_id}', {'description': f'Mixed {i}', 'todolist_id': list_id}
+        if kind == 3:
+            return 'PATCH', f'/todos/{list_ids[0]}/{toggle_ids[i % len(toggle_ids)]}', {'completed': i % 8 == 3}
+        return 'GET', f'/todos/{list_id}', None
+    return make_request
+
+
+def compare_async(app, list_ids, requests, concurrency):
+    """Run the same concurrent workload through the WSGI app and the ASGI app."""
+    from asgi import AsyncTodoApp
+
+    application = AsyncTodoApp(app)
+    make_request = mixed_workload(list_ids, todo_ids(app, list_ids[0]))
+    local = threading.local()
+
+    def sync_one(i):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        method, url, body = make_request(i)
+        started = time.perf_counter()
+        status = local.client.open(url, method=method, json=body).status_code
+        return time.perf_counter() - started, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        sync_outcomes = list(pool.map(sync_one, range(requests)))
+    sync_elapsed = time.perf_counter() - started
+
+    async def run_async():
+        driver = AsgiDriver(application)
+        limit = asyncio.Semaphore(concurrency)
+
+        async def async_one(i):
+            async with limit:
+                method, url, body = make_request(i)
+                started = time.perf_counter()
+                response = await driver.request(method, url, body)
+                return time.perf_counter() - started, response['status']
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(async_one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+        await application.engine.dispose()
+        return outcomes, elapsed
+
+    async_outcomes, async_elapsed = asyncio.run(run_async())
+    return {
+        'sync (wsgi)': summarize(sync_outcomes, sync_elapsed),
+        'async (asgi)': summarize(async_outcomes, async_elapsed),
+    }
+
+
+def build_scenarios(app, list_ids, requests, scratch_size):
+    """One (route, requests) pair per route. Mutating routes get scratch data."""
+    big_list = list_ids[0]
+    # Lists left half deleted, for the deletion progress route
+    deleting_lists = seed(app, min(requests, 10), scratch_size, seed_value=4, name_prefix='Scratch')
+    with app.app_context():
+        for list_id in deleting_lists:
+            app.extensions['reaper'].tombstone(list_id)
+        db.session.commit()
+    import_body = ('{"type": "list", "name": "Imported"}\n' + ''.join(
+        f'{{"type": "todo", "description": "Imported {n}", "completed": {"true" if n % 3 else "false"}}}\n'
+        for n in range(scratch_size))).encode()
+    with app.app_context():
+        asset_url = app.extensions['assets'].url('js/app.js')
+    toggle_ids = todo_ids(app, big_list)[:max(requests, 1)]
+    scratch_todos = todo_ids(app, seed(app, 1, requests, seed_value=1, name_prefix='Scratch')[0])
+    scratch_lists = seed(app, requests, scratch_size, completed_ratio=0.5, seed_value=2, name_prefix='Scratch')
+    cleared_lists = seed(app, requests, scratch_size, completed_ratio=0.5, seed_value=3, name_prefix='Scratch')
+    pick = random.Random(42)
+
+    def cycle(items):
+        return lambda i: items[i % len(items)]
+
+    any_list = cycle(list_ids)
+    any_toggle = cycle(toggle_ids)
+    return [
+        ('index', lambda i: ('GET', '/', None)),
+        ('get_todo_list', lambda i: ('GET', f'/todos/{any_list(i)}', None)),
+        ('get_todo_list_welcome', lambda i: ('GET', '/todos/welcome', None)),
+        ('api_get_lists', lambda i: ('GET', '/api/lists', None)),
+        ('api_get_todos', lambda i: ('GET', f'/api/lists/{any_list(i)}/todos', None)),
+        ('api_export_list', lambda i: ('GET', f'/api/lists/{any_list(i)}/export', None)),
+        ('api_search', lambda i: ('GET', f'/api/search?q=todo+{i % 1000}*', None)),
+        ('create_list', lambda i: ('POST', '/todos', {'name': f'Created {i}'})),
+        ('create_todo', lambda i: ('POST', f'/todos/{big_list}',
+                                   {'description': f'Created {i}', 'todolist_id': big_list})),
+        ('create_todos', lambda i: ('POST', f'/todos/{big_list}',
+                                    {'descriptions': [f'Batch {i}-{n}' for n in range(100)]})),
+        ('update_todo', lambda i: ('PATCH', f'/todos/{big_list}/{any_toggle(i)}',
+                                   {'completed': pick.random() < 0.5})),
+        ('update_todos', lambda i: ('PATCH', f'/todos/{big_list}', {'todos': [
+            {'id': any_toggle(i + n), 'completed': pick.random() < 0.5} for n in range(10)]})),
+        ('update_all', lambda i: ('PUT', f'/todos/{any_list(i)}', {'completed': i % 2 == 0})),
+        ('clear_completed', lambda i: ('DELETE', f'/todos/{cleared_lists[i]}/completed', None)),
+        ('delete_todo', lambda i: ('DELETE', f'/todos/0/{scratch_todos[i]}', None)),
+        ('delete_list', lambda i: ('DELETE', f'/todos/{scratch_lists[i]}', None)),
+        ('api_import_list', lambda i: ('POST', '/api/lists/import', import_body)),
+        ('api_get_deletion', lambda i: ('GET', f'/api/lists/{deleting_lists[i % len(deleting_lists)]}/deletion',
+                                        None)),
+        ('list_events', lambda i: ('GET', f'/todos/{any_list(i)}/events', None)),
+        ('assets', lambda i: ('GET', asset_url, None)),
+        ('static', lambda i: ('GET', '/static/js/app.js', None)),
+        ('metrics', lambda i: ('GET', '/metrics', None)),
+    ]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(outcomes, elapsed):
+    """Turn (latency, status) pairs into percentile, throughput and error stats."""
+    latencies = sorted(latency for latency, _ in outcomes)
+    return {
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'rps': len(outcomes) / elapsed if elapsed else 0.0,
+        'errors': sum(1 for _, status in outcomes if status >= 400),
+    }
+
+
+def run_scenario(driver, make_request, requests):
+    def one(i):
+        method, url, body = make_request(i)
+        started = time.perf_counter()
+        status = driver.request(method, url, body)
+        return time.perf_counter() - started, status
+
+    started = time.perf_counter()
+    if driver.concurrency > 1:
+        with ThreadPoolExecutor(max_workers=driver.concurrency) as pool:
+            outcomes = list(pool.map(one, range(requests)))
+    else:
+        outcomes = [one(i) for i in range(requests)]
+    return summarize(outcomes, time.perf_counter() - started)
+
+
+def run_benchmark(app, driver, lists, todos, requests, scratch_size, seed_value=1234, routes=None):
+    list_ids = seed(app, lists, todos, seed_value=seed_value)
+    results = {}
+    for route, make_request in build_scenarios(app, list_ids, requests, scratch_size):
+        if routes and route not in routes:
+            continue
+        results[route] = run_scenario(driver, make_request, requests)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the routes whose p95 latency regressed beyond the tolerance."""
+    regressions = []
+    for route, stats in results.items():
+        expected = baseline.get('routes', {}).get(route)
+        if expected is None:
+            continue
+        limit = expected['p95_ms'] * (1 + tolerance)
+        if stats['p95_ms'] > limit:
+            regressions.append((route, stats['p95_ms'], limit))
+    return regressions
+
+
+def print_report(results, out=sys.stdout):
+    print(f"{'route':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>12}{'errors':>8}", file=out)
+    for route, stats in results.items():
+        print(f"{route:<24}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+              f"{stats['rps']:>12.1f}{stats['errors']:>8}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark every route of the todo app.')
+    parser.add_argument('--lists', type=int, default=100, help='lists to seed')
+    parser.add_argument('--todos', type=int, default=100, help='todos to seed per list')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--scratch-size', type=int, default=100,
+                        help='todos per throwaway list for delete_list/clear_completed')
+    parser.add_argument('--seed', type=int, default=1234, help='random seed for the dataset')
+    parser.add_argument('--route', action='append', dest='routes', help='only run this route (repeatable)')
+    parser.add_argument('--server', help='base URL of a running server, e.g. http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='concurrent clients in --server and --compare-async mode')
+    parser.add_argument('--compare-async', action='store_true',
+                        help='compare the sync and async serving modes under a concurrent mixed workload')
+    parser.add_argument('--baseline', help='fail if p95 regresses against this baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 regression (0.25 = 25%%)')
+    parser.add_argument('--save-baseline', help='write the results to this baseline file')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    if args.compare_async:
+        if app.config['TODO_STORAGE'] != 'file':
+            print('--compare-async needs TODO_STORAGE=file so both modes share one database', file=sys.stderr)
+            return 2
+        print_report(compare_async(app, seed(app, args.lists, args.todos, seed_value=args.seed),
+                                   args.requests, args.concurrency))
+        return 0
+
+    driver = HttpDriver(args.server, args.concurrency) if args.server else TestClientDriver(app)
+    results = run_benchmark(app, driver, args.lists, args.todos, args.requests, args.scratch_size,
+                            args.seed, args.routes)
+    print_report(results)
+    # A running server counts these in todo_query_budget_exceeded_total instead
+    overruns = {} if args.server else app.extensions['query_budget'].overruns
+    for endpoint, statements in sorted(overruns.items()):
+        print(f'QUERY BUDGET {endpoint}: {statements} SQL statements > '
+              f'{app.view_functions[endpoint].query_budget}', file=sys.stderr)
+
+    dataset = {'lists': args.lists, 'todos': args.todos, 'requests': args.requests,
+               'server': bool(args.server)}
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'dataset': dataset, 'routes': results}, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('dataset') != dataset:
+            print(f"warning: baseline was recorded with {baseline.get('dataset')}", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        for route, p95, limit in regressions:
+            print(f'REGRESSION {route}: p95 {p95:.2f} ms > {limit:.2f} ms', file=sys.stderr)
+        if regressions:
+            return 1
+    return 1 if overruns else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Response compression negotiated on Accept-Encoding.
+
+Compresses HTML, JSON, CSS and JavaScript responses with brotli when the
+brotli package is installed and the client accepts it, otherwise with gzip.
+Bodies smaller than COMPRESS_MIN_SIZE are sent as they are, since the
+framing overhead outweighs the savings.
+
+Responses marked immutable (the fingerprinted assets) are compressed once and
+kept; the static assets are compressed up front when the app starts.
+
+A compressed body is sent with a weak ETag. A 304 Not Modified repeats the
+Vary of the 200 it validates, and its weak ETag when the client holds a
+compressed copy.
+"""
+import gzip
+from threading import Lock
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'application/x-ndjson',
+}
+
+
+class Compress:
+    """Flask extension compressing responses in an after_request hook."""
+
+    def __init__(self, app=None):
+        self.lock = Lock()
+        # (etag, encoding) -> compressed body, for immutable responses only
+        self.cache = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)
+        app.extensions['compress'] = self
+        self.config = app.config
+        if not app.config['COMPRESS_ENABLED']:
+            return
+        app.after_request(self.after_request)
+        assets = app.extensions.get('assets')
+        if assets is not None:
+            self.precompress(assets.manifest.values())
+
+    def encodings(self):
+        return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.config['COMPRESS_BROTLI_QUALITY'])
+        return gzip.compress(data, compresslevel=self.config['COMPRESS_GZIP_LEVEL'], mtime=0)
+
+    def precompress(self, assets):
+        for asset in assets:
+            if asset.mimetype in COMPRESSIBLE_MIMETYPES and len(asset.data) >= self.config['COMPRESS_MIN_SIZE']:
+                for encoding in self.encodings():
+                    self.cache[(asset.digest, encoding)] = self.compress(asset.data, encoding)
+
+    def choose_encoding(self):
+        accepted = request.accept_encodings
+        for encoding in self.encodings():
+            if accepted[encoding]:
+                return encoding
+        return None
+
+    def after_request(self, response):
+        if response.status_code == 304 and response.mimetype in COMPRESSIBLE_MIMETYPES:
+            return self.not_modified(response)
+        if (response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or response.direct_passthrough
+                or response.is_streamed
+                or response.status_code < 200
+                or response.status_code in (204, 206)
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if response.content_length is not None and response.content_length < self.config['COMPRESS_MIN_SIZE']:
+            return response
+        encoding = self.choose_encoding()
+        if encoding is None:
+            return response
+
+        etag, weak = response.get_etag()
+        cacheable = etag is not None and not weak and 'immutable' in response.headers.get('Cache-Control', '')
+        body = self.cache.get((etag, encoding)) if cacheable else None
+        if body is None:
+            data = response.get_data()
+            if len(data) < self.config['COMPRESS_MIN_SIZE']:
+                return response
+            body = self.compress(data, encoding)
+            if cacheable:
+                with self.lock:
+                    self.cache[(etag, encoding)] = body
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        if etag is not None:
+            # Same resource, different bytes: the strong validator no longer
+            # applies, but If-None-Match still matches it weakly.
+            response.set_etag(etag, weak=True)
+        return response
+
+    def not_modified(self, response):
+        """Repeat on a 304 the Vary and ETag of the 200 it validates."""
+        response.vary.add('Accept-Encoding')
+        etag, weak = response.get_etag()
+        # The client matched the weak validator, i.e. it holds a compressed copy
+        if (etag is not None and not weak and request.if_none_match.is_weak(etag)
+                and not request.if_none_match.contains(etag)):
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,55 @@
+"""Per-list todo counts kept on the todolist row.
+
+todolist.todo_count and todolist.completed_count are maintained by triggers
+on the todo table, so every write path (the Flask routes, the async routes,
+bulk inserts, imports and the reaper) keeps them right without a COUNT on
+read. The sidebar and the JSON API show them at the cost of one row per list.
+
+The triggers are SQLite only, like the rest of the storage setup. If the
+counts ever drift (e.g. rows changed with triggers disabled), `flask
+repair-counts` recomputes them in one statement.
+"""
+from sqlalchemy import DDL, event, func, select, update
+
+TRIGGERS = [
+    """CREATE TRIGGER todolist_count_insert AFTER INSERT ON todo BEGIN
+    UPDATE todolist SET todo_count = todo_count + 1,
+                        completed_count = completed_count + new.completed
+    WHERE id = new.todolist_id;
+END""",
+    """CREATE TRIGGER todolist_count_delete AFTER DELETE ON todo BEGIN
+    UPDATE todolist SET todo_count = todo_count - 1,
+                        completed_count = completed_count - old.completed
+    WHERE id = old.todolist_id;
+END""",
+    """CREATE TRIGGER todolist_count_update AFTER UPDATE OF completed, todolist_id ON todo BEGIN
+    UPDATE todolist SET todo_count = todo_count - 1,
+                        completed_count = completed_count - old.completed
+    WHERE id = old.todolist_id;
+    UPDATE todolist SET todo_count = todo_count + 1,
+                        completed_count = completed_count + new.completed
+    WHERE id = new.todolist_id;
+END""",
+]
+
+
+def install(todo_table):
+    """Create the counting triggers along with the todo table (SQLite only)."""
+    for statement in TRIGGERS:
+        event.listen(todo_table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+
+def repair(session, list_model, todo_model):
+    """Recompute every list's counts, returning how many lists were wrong."""
+    total = (select(func.count())
+             .where(todo_model.todolist_id == list_model.id)
+             .scalar_subquery())
+    completed = (select(func.count())
+                 .where(todo_model.todolist_id == list_model.id, todo_model.completed == True)
+                 .scalar_subquery())
+    result = session.execute(
+        update(list_model)
+        .where((list_model.todo_count != total) | (list_model.completed_count != completed))
+        .values(todo_count=total, completed_count=completed)
+        .execution_options(synchronize_session=False))
+    return result.rowcount
@@ -0,0 +1,188 @@
+"""Server-sent events feed of list changes.
+
+The mutation routes publish an event after they commit; every client with
+GET /todos/<list_id>/events open gets it pushed within the same process, with
+no database polling. Each subscriber has a bounded queue: a client too slow to
+keep up is sent a single "resync" event and is expected to reload.
+
+Other extensions can follow the changes too: every function in listeners is
+called with (list_id, event, data) on publish, list_id being None for
+publish_all.
+
+Under a threaded server every open stream holds a thread for as long as the
+page stays open. EVENTS_MAX_STREAMS caps how many a process serves that way
+(unlimited by default; gunicorn.conf.py sets it from TODO_MAX_STREAMS and
+adds as many threads), so streams can never take the threads the other
+requests need. A stream over the cap gets only its retry frame and ends at
+once, and the browser's EventSource reconnects after the retry interval.
+close() ends the thread streams, so that a worker shutting down does not
+wait for its open pages to go away.
+
+Streams served on an asyncio event loop (the async mode's native route)
+subscribe with an AsyncSubscriber instead of a thread-blocking queue, hold no
+thread and are not capped.
+
+The fan-out is per process. When running several workers, clients only see
+changes made through the worker that serves their stream; put a shared broker
+behind publish() for cross-worker delivery.
+"""
+import asyncio
+import queue
+from threading import Lock
+
+from flask import Response
+
+
+class ChangeFeed:
+    """Flask extension holding the per-list subscriber queues."""
+
+    def __init__(self, app=None):
+        self.lock = Lock()
+        # list id (str) -> set of subscriber queues
+        self.subscribers = {}
+        self.listeners = []
+        self.heartbeat = 15
+        self.queue_size = 256
+        self.max_streams = None
+        # Streams currently holding a thread
+        self.streams = 0
+        self.closed = False
+        self.json = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('EVENTS_HEARTBEAT_SECONDS', 15)
+        app.config.setdefault('EVENTS_QUEUE_SIZE', 256)
+        app.config.setdefault('EVENTS_MAX_STREAMS', None)
+        app.extensions['events'] = self
+        self.heartbeat = app.config['EVENTS_HEARTBEAT_SECONDS']
+        self.queue_size = app.config['EVENTS_QUEUE_SIZE']
+        self.max_streams = app.config['EVENTS_MAX_STREAMS']
+        # The app's JSON provider, so that events are encoded like every response
+        self.json = app.json
+
+    def subscribe(self, list_id, subscriber=None):
+        if subscriber is None:
+            subscriber = queue.Queue(maxsize=self.queue_size)
+        with self.lock:
+            self.subscribers.setdefault(str(list_id), set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, list_id, subscriber):
+        with self.lock:
+            subscribers = self.subscribers.get(str(list_id))
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscribers[str(list_id)]
+
+    def subscriber_count(self):
+        with self.lock:
+            return sum(len(subscribers) for subscribers in self.subscribers.values())
+
+    def publish(self, list_id, event, data=None):
+        """Send an event to the subscribers of one list."""
+        with self.lock:
+            subscribers = list(self.subscribers.get(str(list_id), ()))
+        self._notify(list_id, event, data or {})
+        self._deliver(subscribers, event, data or {})
+
+    def publish_all(self, event, data=None):
+        """Send an event to every subscriber, e.g. when the set of lists changes."""
+        with self.lock:
+            subscribers = [s for group in self.subscribers.values() for s in group]
+        self._notify(None, event, data or {})
+        self._deliver(subscribers, event, data or {})
+
+    def _notify(self, list_id, event, data):
+        for listener in self.listeners:
+            listener(list_id, event, data)
+
+    def _deliver(self, subscribers, event, data):
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                # Drop the backlog and tell the client to reload instead
+                with subscriber.mutex:
+                    subscriber.queue.clear()
+                subscriber.put_nowait(('resync', {}))
+
+    def stream(self, list_id):
+        """Generator of SSE frames for one list, ending when the client goes away."""
+        subscriber = self.subscribe(list_id)
+        with self.lock:
+            self.streams += 1
+        try:
+            yield self.retry_frame()
+            while True:
+                try:
+                    item = subscriber.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if item is None:
+                    return
+                yield self.frame(*item)
+        finally:
+            with self.lock:
+                self.streams -= 1
+            self.unsubscribe(list_id, subscriber)
+
+    def full(self):
+        """Whether another stream would go over EVENTS_MAX_STREAMS."""
+        with self.lock:
+            return self.closed or (self.max_streams is not None and self.streams >= self.max_streams)
+
+    def close(self):
+        """End the streams served on threads, and turn new ones away."""
+        with self.lock:
+            self.closed = True
+            subscribers = [s for group in self.subscribers.values() for s in group if isinstance(s, queue.Queue)]
+        for subscriber in subscribers:
+            with subscriber.mutex:
+                subscriber.queue.clear()
+            subscriber.put_nowait(None)
+
+    def retry_frame(self):
+        return f'retry: {self.heartbeat * 1000}\n\n'
+
+    def frame(self, event, data):
+        return f'event: {event}\ndata: {self.json.dumps(data)}\n\n'
+
+    def response(self, list_id):
+        # Over the cap, only say when to come back, without holding a thread
+        body = [self.retry_frame()] if self.full() else self.stream(list_id)
+        return Response(body, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+class AsyncSubscriber:
+    """Subscriber queue for a stream served on an asyncio event loop.
+
+    publish() may run on any thread, so events are handed to the loop with
+    call_soon_threadsafe. Overflowing the queue collapses it into a single
+    resync event, as for the thread-side subscribers.
+    """
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def put_nowait(self, item):
+        try:
+            self.loop.call_soon_threadsafe(self._put, item)
+        except RuntimeError:  # the loop has been closed
+            pass
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(('resync', {}))
+
+    async def get(self):
+        return await self.queue.get()
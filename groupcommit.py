@@ -0,0 +1,155 @@
+"""Opt-in group commit for the single-todo write routes.
+
+With GROUP_COMMIT_ENABLED, create_todo, update_todo and delete_todo do not
+commit on their own. Each hands its statements to submit(), and one writer
+thread runs whatever has queued up in a single transaction, committing once
+per batch. Operations that arrive while a batch commits form the next one.
+When the last batch held more than one operation, i.e. writes are arriving
+concurrently, the writer also waits up to GROUP_COMMIT_MAX_DELAY_MS for
+stragglers; a lone write on an idle server is committed at once. A batch
+never exceeds GROUP_COMMIT_MAX_BATCH operations. The caller blocks until
+its batch has committed, so a response still means the change is durable;
+under load the cost of a commit is shared by the batch. A caller that gives
+up after GROUP_COMMIT_TIMEOUT_SECONDS withdraws its operation, which the
+writer then skips, so a write reported as failed is never committed later.
+
+Every operation runs in its own SAVEPOINT, so one failing operation is
+rolled back and reported to its caller without affecting the others.
+
+Batch sizes and the queue depth are exported as todo_group_commit_* metrics.
+Meant for the file storage mode; the writer thread needs a connection of its
+own, which the single shared in-memory connection cannot safely provide
+under concurrent requests.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class GroupCommit:
+    """Flask extension running queued write operations in batched transactions."""
+
+    def __init__(self, app=None, db=None):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        self.queue = None
+        self.batch_sizes = None
+        self.last_batch_size = 0
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('GROUP_COMMIT_ENABLED', False)
+        app.config.setdefault('GROUP_COMMIT_MAX_BATCH', 100)
+        app.config.setdefault('GROUP_COMMIT_MAX_DELAY_MS', 2)
+        app.config.setdefault('GROUP_COMMIT_QUEUE_SIZE', 10000)
+        app.config.setdefault('GROUP_COMMIT_TIMEOUT_SECONDS', 10)
+        app.extensions['group_commit'] = self
+        self.app = app
+        self.db = db
+        self.queue = queue.Queue(maxsize=app.config['GROUP_COMMIT_QUEUE_SIZE'])
+        metrics = app.extensions.get('metrics')
+        if metrics is not None:
+            self.batch_sizes = metrics.histogram(
+                'todo_group_commit_batch_size', 'Operations committed per group commit.',
+                buckets=BATCH_SIZE_BUCKETS)
+            metrics.gauge('todo_group_commit_queue_depth', 'Operations waiting for the writer.',
+                          callback=self.queue.qsize)
+
+    @property
+    def enabled(self):
+        return self.app.config['GROUP_COMMIT_ENABLED']
+
+    def submit(self, operation):
+        """Run operation(connection) in the next batch and return its result.
+
+        Blocks until the batch has committed; exceptions raised by the
+        operation, or by the commit, are raised here.
+        """
+        self.start()
+        future = Future()
+        timeout = self.app.config['GROUP_COMMIT_TIMEOUT_SECONDS']
+        self.queue.put((operation, future), timeout=timeout)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            if future.cancel():
+                raise
+            # The writer has started on it, so its outcome is on the way
+            return future.result()
+
+    def start(self):
+        with self.lock:
+            # A thread started before a fork does not exist in the child
+            if self.thread is None or not self.thread.is_alive() or self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self.run, name='todo-group-commit', daemon=True)
+                self.thread.start()
+
+    def next_batch(self):
+        """Wait for an operation, then gather more until the batch is full or due."""
+        batch = [self.queue.get()]
+        delay = self.app.config['GROUP_COMMIT_MAX_DELAY_MS'] / 1000 if self.last_batch_size > 1 else 0
+        deadline = time.monotonic() + delay
+        while len(batch) < self.app.config['GROUP_COMMIT_MAX_BATCH']:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        self.last_batch_size = len(batch)
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            try:
+                results = self.commit(batch)
+            except Exception as e:
+                log.exception('group commit of %d operations failed', len(batch))
+                for _, future in batch:
+                    try:
+                        future.set_exception(e)
+                    except InvalidStateError:  # cancelled
+                        pass
+                continue
+            if self.batch_sizes is not None and results:
+                self.batch_sizes.observe(value=len(results))
+            for future, result, error in results:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+    def commit(self, batch):
+        """Run a batch in one transaction, returning (future, result, error) per operation run.
+
+        Operations whose caller has given up are skipped.
+        """
+        results = []
+        with self.app.app_context(), self.db.engine.connect() as conn:
+            # Take the write lock up front. pysqlite would otherwise start the
+            # transaction lazily, and releasing the first SAVEPOINT would
+            # commit it.
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+            for operation, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with conn.begin_nested():
+                        results.append((future, operation(conn), None))
+                except Exception as e:
+                    results.append((future, None, e))
+            conn.commit()
+        return results
@@ -0,0 +1,122 @@
+"""gunicorn settings for running the app in production (see `flask serve`).
+
+The app is imported once in the master and the workers are forked from it
+(preload_app), so they share its code pages and start serving straight
+away; building the app opens no database connection to inherit, and each
+worker sets the schema up, and starts its own reaper and group commit
+threads, on its first request.
+
+Workers and threads per worker default to what the machine can run, from
+the CPUs this process may use (its affinity mask, capped by a cgroup CPU
+quota inside a container):
+
+- file storage: one worker per CPU, TODO_THREADS_PER_CPU (2) threads each,
+  so a thread waiting on SQLite or the client does not idle its core;
+- memory storage: a single worker with a single request thread, since the
+  in-memory database is private to one process and shares one connection.
+
+On top of those, each worker has TODO_MAX_STREAMS (32) threads for the
+change feed streams: with the gthread worker an open list page's
+EventSource holds a thread for as long as the page is open, and the worker
+timeout does not recycle it. The app is told the same limit and turns away
+streams beyond it (they reconnect later, see events.py), so however many
+pages are open the request threads stay free. Raise it with the number of
+list pages expected to be open at once per worker, or serve the streams
+from the async mode (asgi.py), where they hold no thread. In memory mode,
+requests may then overlap on the shared connection, as they do under the
+development server. A worker asked to stop ends its streams straight away,
+and the pages reconnect to another.
+
+TODO_WORKERS and TODO_THREADS (request threads) override the counts.
+Workers are recycled after TODO_MAX_REQUESTS requests (with some jitter, so
+they do not all restart at once), and idle keep-alive connections are held
+for TODO_KEEPALIVE seconds, which should be longer than any load balancer's
+idle timeout in front of the app.
+
+`kill -HUP <master>` re-reads this file and replaces the workers
+gracefully, letting running requests finish within graceful_timeout. As the
+app is preloaded, new code needs a new master: `kill -USR2` starts one next
+to the old, then `kill -QUIT` the old one.
+"""
+import math
+import os
+import signal
+
+
+def cgroup_cpu_limit(path='/sys/fs/cgroup/cpu.max'):
+    """The CPU quota of a cgroup v2 in CPUs, rounded up; None when unlimited."""
+    try:
+        with open(path) as f:
+            quota, period = f.read().split()[:2]
+    except (OSError, ValueError):
+        return None
+    if quota == 'max':
+        return None
+    return max(1, math.ceil(int(quota) / int(period)))
+
+
+def available_cpus():
+    """How many CPUs this process may run on."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    return min(cpus, limit) if limit is not None else cpus
+
+
+def default_workers(storage, cpus):
+    return cpus if storage == 'file' else 1
+
+
+def default_threads(storage):
+    return int(os.environ.get('TODO_THREADS_PER_CPU', 2)) if storage == 'file' else 1
+
+
+storage = os.environ.get('TODO_STORAGE', 'memory')
+
+bind = os.environ.get('TODO_BIND', '0.0.0.0:' + os.environ.get('PORT', '3000'))
+preload_app = True
+worker_class = 'gthread'
+workers = int(os.environ.get('TODO_WORKERS') or default_workers(storage, available_cpus()))
+request_threads = int(os.environ.get('TODO_THREADS') or default_threads(storage))
+max_streams = int(os.environ.get('TODO_MAX_STREAMS', 32))
+threads = request_threads + max_streams
+# Set in the master before the app is loaded
+raw_env = [f'TODO_MAX_STREAMS={max_streams}']
+
+keepalive = int(os.environ.get('TODO_KEEPALIVE', 5))
+max_requests = int(os.environ.get('TODO_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+timeout = 30
+graceful_timeout = 30
+
+# Heartbeat files on a RAM disk, so a slow container filesystem does not
+# get workers killed as unresponsive
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+errorlog = '-'
+accesslog = '-' if os.environ.get('TODO_ACCESS_LOG', '0') == '1' else None
+
+
+def when_ready(server):
+    server.log.info('Serving %s storage with %d workers of %d request threads and %d stream threads',
+                    storage, workers, request_threads, max_streams)
+
+
+def post_worker_init(worker):
+    # Streams never finish by themselves: end them when the worker is told to
+    # stop gracefully, rather than waiting out graceful_timeout
+    handle_exit = worker.handle_exit
+
+    def end_streams(sig, frame):
+        handle_exit(sig, frame)
+        worker.wsgi.extensions['events'].close()
+
+    signal.signal(signal.SIGTERM, end_streams)
+
+
+def worker_int(worker):
+    # Quick shutdown: the stream threads would otherwise keep the worker from exiting
+    worker.wsgi.extensions['events'].close()
@@ -0,0 +1,212 @@
+"""Request and SQL instrumentation, exposed in Prometheus text format.
+
+Usage:
+
+    metrics = Metrics(app)
+
+records per-endpoint latency histograms, in-flight request gauges and the
+number of SQL statements and cumulative SQL time of every request, and serves
+them at /metrics. Other parts of the app can register their own series with
+counter(), gauge() and histogram().
+
+Everything is kept in plain dicts behind one lock; recording a request costs a
+few dictionary updates, so it is meant to stay on in production.
+"""
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=(), lock=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.lock = lock or Lock()
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def get(self, *label_values):
+        return self.values.get(label_values, 0)
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for label_values, value in items:
+            yield self.name, self.labels, label_values, value
+
+
+class Gauge(Counter):
+    """A value that goes up and down, or is read from a callback at scrape time."""
+    kind = 'gauge'
+
+    def __init__(self, name, help, labels=(), lock=None, callback=None):
+        super().__init__(name, help, labels, lock)
+        self.callback = callback
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values, value):
+        with self.lock:
+            self.values[label_values] = value
+
+    def samples(self):
+        if self.callback is not None:
+            yield self.name, self.labels, (), self.callback()
+            return
+        yield from super().samples()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS, lock=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.lock = lock or Lock()
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self.values = {}
+
+    def observe(self, *label_values, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(label_values)
+            if series is None:
+                series = self.values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *label_values):
+        series = self.values.get(label_values)
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, list(series)) for key, series in self.values.items())
+        bucket_labels = self.labels + ('le',)
+        for label_values, series in items:
+            cumulative = 0
+            for bound, hits in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += hits
+                yield self.name + '_bucket', bucket_labels, label_values + (bound,), cumulative
+            yield self.name + '_sum', self.labels, label_values, series[-1]
+            yield self.name + '_count', self.labels, label_values, cumulative
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g._sql_started = perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and '_sql_started' in g:
+        g._sql_time = g.get('_sql_time', 0.0) + perf_counter() - g._sql_started
+        g._sql_count = g.get('_sql_count', 0) + 1
+
+
+class Metrics:
+    """Flask extension collecting the metrics described in the module docstring."""
+
+    def __init__(self, app=None):
+        self.lock = Lock()
+        self.registry = {}
+        self.requests = self.counter(
+            'todo_http_requests_total', 'HTTP requests served.', ('endpoint', 'method', 'status'))
+        self.latency = self.histogram(
+            'todo_http_request_duration_seconds', 'HTTP request latency.', ('endpoint', 'method'))
+        self.in_flight = self.gauge(
+            'todo_http_requests_in_flight', 'HTTP requests being served.', ('endpoint',))
+        self.sql_statements = self.histogram(
+            'todo_sql_statements_per_request', 'SQL statements issued per request.',
+            ('endpoint',), buckets=SQL_COUNT_BUCKETS)
+        self.sql_time = self.histogram(
+            'todo_sql_duration_seconds_per_request', 'Cumulative SQL time per request.', ('endpoint',))
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.extensions['metrics'] = self
+        if not app.config['METRICS_ENABLED']:
+            return
+        app.before_request(self._start_request)
+        app.after_request(self._record_status)
+        app.teardown_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels, self.lock))
+
+    def gauge(self, name, help, labels=(), callback=None):
+        return self._register(Gauge(name, help, labels, self.lock, callback))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets, self.lock))
+
+    def _register(self, metric):
+        self.registry[metric.name] = metric
+        return metric
+
+    def _start_request(self):
+        g._metrics_endpoint = request.endpoint or 'unmatched'
+        g._metrics_started = perf_counter()
+        g._sql_count = 0
+        g._sql_time = 0.0
+        self.in_flight.inc(g._metrics_endpoint)
+
+    def _record_status(self, response):
+        g._metrics_status = response.status_code
+        return response
+
+    def _finish_request(self, exc):
+        if '_metrics_started' not in g:
+            return
+        endpoint = g._metrics_endpoint
+        elapsed = perf_counter() - g.pop('_metrics_started')
+        status = g.get('_metrics_status', 500)
+        self.in_flight.dec(endpoint)
+        self.requests.inc(endpoint, request.method, status)
+        self.latency.observe(endpoint, request.method, value=elapsed)
+        self.sql_statements.observe(endpoint, value=g.get('_sql_count', 0))
+        self.sql_time.observe(endpoint, value=g.get('_sql_time', 0.0))
+
+    def render(self):
+        lines = []
+        for metric in list(self.registry.values()):
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, label_names, label_values, value in metric.samples():
+                lines.append(f'{name}{_format_labels(label_names, label_values)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
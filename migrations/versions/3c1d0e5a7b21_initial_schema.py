@@ -0,0 +1,37 @@
+"""initial schema
+
+Revision ID: 3c1d0e5a7b21
+Revises: 
+Create Date: 2026-10-18 09:12:40.118402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1d0e5a7b21'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('todolist',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('todo',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('completed', sa.Boolean(), nullable=False),
+    sa.Column('todolist_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['todolist_id'], ['todolist.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('todo')
+    op.drop_table('todolist')
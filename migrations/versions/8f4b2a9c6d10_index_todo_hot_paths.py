@@ -0,0 +1,30 @@
+"""index todo hot paths
+
+Revision ID: 8f4b2a9c6d10
+Revises: 3c1d0e5a7b21
+Create Date: 2026-10-18 09:31:02.554817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f4b2a9c6d10'
+down_revision = '3c1d0e5a7b21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('todo', schema=None) as batch_op:
+        batch_op.create_index('ix_todo_todolist_id_id', ['todolist_id', 'id'], unique=False)
+        batch_op.create_index('ix_todo_todolist_id_incomplete', ['todolist_id', 'id'], unique=False,
+                              sqlite_where=sa.text('completed = 0'),
+                              postgresql_where=sa.text('NOT completed'))
+
+
+def downgrade():
+    with op.batch_alter_table('todo', schema=None) as batch_op:
+        batch_op.drop_index('ix_todo_todolist_id_incomplete')
+        batch_op.drop_index('ix_todo_todolist_id_id')
@@ -0,0 +1,29 @@
+"""add list deletion
+
+Revision ID: a6c2e8d4f0b3
+Revises: f1b3d5e7a9c2
+Create Date: 2026-10-18 21:40:12.518307
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c2e8d4f0b3'
+down_revision = 'f1b3d5e7a9c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('list_deletion',
+    sa.Column('list_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.Column('reaped_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('list_id')
+    )
+
+
+def downgrade():
+    op.drop_table('list_deletion')
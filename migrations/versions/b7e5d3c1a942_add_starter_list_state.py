@@ -0,0 +1,30 @@
+"""add starter list state
+
+Revision ID: b7e5d3c1a942
+Revises: 8f4b2a9c6d10
+Create Date: 2026-10-18 11:05:47.210934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e5d3c1a942'
+down_revision = '8f4b2a9c6d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('starter_list_state',
+    sa.Column('client_id', sa.String(length=32), nullable=False),
+    sa.Column('list_deleted', sa.Boolean(), nullable=False),
+    sa.Column('deleted_tasks', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('client_id')
+    )
+
+
+def downgrade():
+    op.drop_table('starter_list_state')
@@ -0,0 +1,26 @@
+"""add todolist deleted_at
+
+Revision ID: d2a8f61c4e35
+Revises: b7e5d3c1a942
+Create Date: 2026-10-18 14:22:09.518377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a8f61c4e35'
+down_revision = 'b7e5d3c1a942'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('todolist', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('todolist', schema=None) as batch_op:
+        batch_op.drop_column('deleted_at')
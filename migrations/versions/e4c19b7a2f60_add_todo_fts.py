@@ -0,0 +1,43 @@
+"""add todo full-text index
+
+Revision ID: e4c19b7a2f60
+Revises: d2a8f61c4e35
+Create Date: 2026-10-18 15:40:31.882016
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4c19b7a2f60'
+down_revision = 'd2a8f61c4e35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("CREATE VIRTUAL TABLE todo_fts USING fts5("
+               "description, content='todo', content_rowid='id')")
+    op.execute("""CREATE TRIGGER todo_fts_insert AFTER INSERT ON todo BEGIN
+    INSERT INTO todo_fts(rowid, description) VALUES (new.id, new.description);
+END""")
+    op.execute("""CREATE TRIGGER todo_fts_delete AFTER DELETE ON todo BEGIN
+    INSERT INTO todo_fts(todo_fts, rowid, description) VALUES ('delete', old.id, old.description);
+END""")
+    op.execute("""CREATE TRIGGER todo_fts_update AFTER UPDATE OF description ON todo BEGIN
+    INSERT INTO todo_fts(todo_fts, rowid, description) VALUES ('delete', old.id, old.description);
+    INSERT INTO todo_fts(rowid, description) VALUES (new.id, new.description);
+END""")
+    # Index the todos that already exist
+    op.execute("INSERT INTO todo_fts(todo_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DROP TRIGGER IF EXISTS todo_fts_update')
+    op.execute('DROP TRIGGER IF EXISTS todo_fts_delete')
+    op.execute('DROP TRIGGER IF EXISTS todo_fts_insert')
+    op.execute('DROP TABLE IF EXISTS todo_fts')
@@ -0,0 +1,57 @@
+"""add todolist counts
+
+Revision ID: f1b3d5e7a9c2
+Revises: e4c19b7a2f60
+Create Date: 2026-10-18 17:12:54.306418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b3d5e7a9c2'
+down_revision = 'e4c19b7a2f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('todolist', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('todo_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('completed_count', sa.Integer(), server_default='0', nullable=False))
+
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("""CREATE TRIGGER todolist_count_insert AFTER INSERT ON todo BEGIN
+    UPDATE todolist SET todo_count = todo_count + 1,
+                        completed_count = completed_count + new.completed
+    WHERE id = new.todolist_id;
+END""")
+        op.execute("""CREATE TRIGGER todolist_count_delete AFTER DELETE ON todo BEGIN
+    UPDATE todolist SET todo_count = todo_count - 1,
+                        completed_count = completed_count - old.completed
+    WHERE id = old.todolist_id;
+END""")
+        op.execute("""CREATE TRIGGER todolist_count_update AFTER UPDATE OF completed, todolist_id ON todo BEGIN
+    UPDATE todolist SET todo_count = todo_count - 1,
+                        completed_count = completed_count - old.completed
+    WHERE id = old.todolist_id;
+    UPDATE todolist SET todo_count = todo_count + 1,
+                        completed_count = completed_count + new.completed
+    WHERE id = new.todolist_id;
+END""")
+
+    # Count the todos that already exist
+    op.execute("""UPDATE todolist SET
+    todo_count = (SELECT count(*) FROM todo WHERE todo.todolist_id = todolist.id),
+    completed_count = (SELECT count(*) FROM todo WHERE todo.todolist_id = todolist.id AND todo.completed)""")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS todolist_count_update')
+        op.execute('DROP TRIGGER IF EXISTS todolist_count_delete')
+        op.execute('DROP TRIGGER IF EXISTS todolist_count_insert')
+    with op.batch_alter_table('todolist', schema=None) as batch_op:
+        batch_op.drop_column('completed_count')
+        batch_op.drop_column('todo_count')
@@ -0,0 +1,127 @@
+"""Per-request budgets on the number of SQL statements.
+
+A view declares the most statements it may issue with @budget(n). Every
+request to it counts the statements run on its own thread, from its
+before_request hooks to its after_request hooks, and one that goes over is
+an N+1 query or a similar regression:
+
+- with QUERY_BUDGET_ENFORCED (the default under TESTING) QueryBudgetExceeded
+  is raised, so any test that touches the endpoint fails;
+- otherwise the overrun is logged, counted in
+  todo_query_budget_exceeded_total and remembered in `overruns`, which the
+  benchmark checks after a run.
+
+query_budget(n) does the same for an arbitrary block, e.g. around a test
+client call or a helper. Statements run by other threads on the request's
+behalf (the group commit writer, the reaper) are not counted, nor are those
+of a streamed response body.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(AssertionError):
+    def __init__(self, what, limit, statements):
+        super().__init__(f'{what} issued {len(statements)} SQL statements, budget is {limit}:\n'
+                         + '\n'.join(statements))
+        self.limit = limit
+        self.statements = statements
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for statements in getattr(_local, 'counters', ()):
+        statements.append(statement)
+
+
+def _start_counting():
+    if not hasattr(_local, 'counters'):
+        _local.counters = []
+    statements = []
+    _local.counters.append(statements)
+    return statements
+
+
+def _stop_counting(statements):
+    counters = getattr(_local, 'counters', [])
+    if any(counter is statements for counter in counters):
+        counters[:] = [counter for counter in counters if counter is not statements]
+
+
+@contextmanager
+def query_budget(limit, what='block'):
+    """Raise QueryBudgetExceeded if the block issues more than limit statements."""
+    statements = _start_counting()
+    try:
+        yield statements
+    finally:
+        _stop_counting(statements)
+    if len(statements) > limit:
+        raise QueryBudgetExceeded(what, limit, statements)
+
+
+def budget(limit):
+    """Declare the most SQL statements a view may issue per request."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+class QueryBudget:
+    """Flask extension checking every request against its view's budget."""
+
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        # endpoint -> most statements seen in a request over budget
+        self.overruns = {}
+        self.exceeded = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('QUERY_BUDGET_ENFORCED', app.config.get('TESTING', False))
+        app.extensions['query_budget'] = self
+        metrics = app.extensions.get('metrics')
+        if metrics is not None:
+            self.exceeded = metrics.counter(
+                'todo_query_budget_exceeded_total', 'Requests that issued more SQL statements than budgeted.',
+                ('endpoint',))
+        app.before_request(self.start)
+        app.after_request(self.check)
+        app.teardown_request(self.stop)
+
+    def start(self):
+        view = current_app.view_functions.get(request.endpoint)
+        limit = getattr(view, 'query_budget', None)
+        if limit is not None:
+            g._query_budget = (limit, _start_counting())
+
+    def stop(self, exc=None):
+        if '_query_budget' in g:
+            _stop_counting(g.pop('_query_budget')[1])
+
+    def check(self, response):
+        if '_query_budget' not in g:
+            return response
+        limit, statements = g.pop('_query_budget')
+        _stop_counting(statements)
+        if len(statements) <= limit:
+            return response
+        if current_app.config['QUERY_BUDGET_ENFORCED']:
+            raise QueryBudgetExceeded(request.endpoint, limit, statements)
+        log.warning('%s issued %d SQL statements, budget is %d', request.endpoint, len(statements), limit)
+        if self.exceeded is not None:
+            self.exceeded.inc(request.endpoint)
+        with self.lock:
+            self.overruns[request.endpoint] = max(self.overruns.get(request.endpoint, 0), len(statements))
+        return response
@@ -0,0 +1,171 @@
+"""Deferred deletion of todo lists.
+
+Deleting a list only tombstones it: its deleted_at column is set and every
+read hides it from then on. The todos are removed afterwards in chunks of
+REAPER_CHUNK_SIZE, each in its own short transaction, so other writers get
+the SQLite write lock between chunks however big the list was. The list row
+itself goes once no todos are left.
+
+Every chunk is idempotent and the tombstone is stored in the database, so a
+reaper that dies half way simply carries on where it stopped the next time
+the app starts (or when `flask reap` is run). Once the list row goes, a
+deletion record takes its place, so GET /api/lists/<id>/deletion can still
+tell a reaped list from one that never existed.
+
+With REAPER_BACKGROUND (the default for file storage) the first chunk runs
+inside the DELETE request and the rest on a daemon thread. The in-memory
+database has a single shared connection, so there the whole list is reaped
+inline, still chunk by chunk.
+"""
+import logging
+import os
+import threading
+import time
+
+import click
+from sqlalchemy import delete, exists, func, insert, select, update
+
+log = logging.getLogger(__name__)
+
+
+class Reaper:
+    """Flask extension tombstoning lists and reaping their todos."""
+
+    def __init__(self, app=None, db=None, list_model=None, todo_model=None, deletion_model=None):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.pid = None
+        if app is not None:
+            self.init_app(app, db, list_model, todo_model, deletion_model)
+
+    def init_app(self, app, db, list_model, todo_model, deletion_model):
+        app.config.setdefault('REAPER_CHUNK_SIZE', 1000)
+        app.config.setdefault('REAPER_PAUSE_SECONDS', 0.01)
+        app.config.setdefault('REAPER_BACKGROUND', app.config.get('TODO_STORAGE') == 'file')
+        app.extensions['reaper'] = self
+        self.app = app
+        self.db = db
+        self.lists = list_model
+        self.todos = todo_model
+        self.deletions = deletion_model
+
+    @property
+    def background(self):
+        return self.app.config['REAPER_BACKGROUND']
+
+    def tombstone(self, list_id):
+        """Hide a list from reads. Runs in the caller's session; the caller commits."""
+        result = self.db.session.execute(
+            update(self.lists)
+            .where(self.lists.id == list_id, self.lists.deleted_at.is_(None))
+            .values(deleted_at=func.now())
+            .execution_options(synchronize_session=False))
+        return result.rowcount
+
+    def schedule(self, list_id):
+        """Start reaping a list whose tombstone has been committed."""
+        if not self.background:
+            self.reap(list_id)
+        elif not self.reap_chunk(list_id):
+            self.wake()
+
+    def reap_chunk(self, list_id):
+        """Delete one chunk of a tombstoned list's todos in its own transaction.
+
+        Returns True once the list is gone.
+        """
+        chunk_size = self.app.config['REAPER_CHUNK_SIZE']
+        with self.app.app_context(), self.db.engine.begin() as conn:
+            chunk = (select(self.todos.id)
+                     .where(self.todos.todolist_id == list_id)
+                     .limit(chunk_size)
+                     .scalar_subquery())
+            deleted = conn.execute(delete(self.todos).where(self.todos.id.in_(chunk))).rowcount
+            if deleted >= chunk_size:
+                return False
+            # Only a tombstoned list with nothing left on it may go, so a
+            # todo that raced in after the last chunk is picked up next time.
+            removed = conn.execute(
+                delete(self.lists)
+                .where(self.lists.id == list_id,
+                       self.lists.deleted_at.is_not(None),
+                       ~exists().where(self.todos.todolist_id == self.lists.id))
+                .returning(self.lists.deleted_at)).first()
+            if removed is not None:
+                # A reused id replaces the record of its earlier deletion
+                conn.execute(delete(self.deletions).where(self.deletions.list_id == list_id))
+                conn.execute(insert(self.deletions).values(
+                    list_id=list_id, deleted_at=removed.deleted_at, reaped_at=func.now()))
+            remaining = conn.execute(
+                select(exists().where(self.todos.todolist_id == list_id))).scalar()
+            return not remaining
+
+    def reap(self, list_id):
+        while not self.reap_chunk(list_id):
+            time.sleep(self.app.config['REAPER_PAUSE_SECONDS'])
+
+    def pending(self):
+        """Ids of the lists that are tombstoned but not reaped yet."""
+        with self.app.app_context(), self.db.engine.connect() as conn:
+            return conn.execute(
+                select(self.lists.id)
+                .where(self.lists.deleted_at.is_not(None))
+                .order_by(self.lists.id)).scalars().all()
+
+    def reap_pending(self):
+        pending = self.pending()
+        for list_id in pending:
+            self.reap(list_id)
+        return len(pending)
+
+    def progress(self, list_id):
+        """Report on a list's deletion, or None if the list is live or never existed."""
+        with self.app.app_context(), self.db.engine.connect() as conn:
+            row = conn.execute(
+                select(self.lists.deleted_at).where(self.lists.id == list_id)).first()
+            if row is None:
+                deletion = conn.execute(
+                    select(self.deletions.deleted_at).where(self.deletions.list_id == list_id)).first()
+                if deletion is None:
+                    return None
+                return {'id': list_id, 'status': 'deleted', 'remaining': 0,
+                        'deleted_at': deletion.deleted_at.isoformat()}
+            if row.deleted_at is None:
+                return None
+            remaining = conn.execute(
+                select(func.count()).where(self.todos.todolist_id == list_id)).scalar()
+            return {'id': list_id, 'status': 'deleting', 'remaining': remaining,
+                    'deleted_at': row.deleted_at.isoformat()}
+
+    def resume(self):
+        """Pick up deletions left unfinished by an earlier process."""
+        if self.pending():
+            if self.background:
+                self.wake()
+            else:
+                self.reap_pending()
+
+    def wake(self):
+        with self.lock:
+            # A thread started before a fork does not exist in the child
+            if self.thread is None or not self.thread.is_alive() or self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self.run, name='todo-reaper', daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            try:
+                self.reap_pending()
+            except Exception:
+                log.exception('reaping deleted lists failed, retrying shortly')
+                time.sleep(1)
+                self.wakeup.set()
+
+    def reap_command(self):
+        """Delete the todos of every tombstoned list now."""
+        click.echo(f'Reaped {self.reap_pending()} deleted lists.')
@@ -0,0 +1,118 @@
+"""Read/write splitting onto a read replica.
+
+Views marked @reads_replica (the pages and the read API) run their queries
+on a separate, read-only engine built from REPLICA_DATABASE_URI; everything
+else, and anything a replica view writes or flushes, stays on the primary.
+With the file storage mode, TODO_READ_REPLICA=1 points it at a read-only
+connection pool on the same SQLite file, so reads never take a connection
+the writers are waiting for and cannot take the write lock by mistake; any
+other URI (a replica kept up to date by replication, or a copy refreshed
+periodically) works the same way.
+
+A replica may lag behind the primary. So that a client always sees its own
+writes, every successful write request sets a cookie for
+REPLICA_STICKY_SECONDS (5), and while it lasts that client's reads go to the
+primary too. The writes served natively by the async mode set it as well.
+
+A cached view (see responsecache.py) fills its cache misses from the
+primary, through read_primary(): the entry is stored under the versions as
+of now, which a lagging replica may not have caught up with yet, and every
+client, sticky or not, would then be served it.
+
+Requests to replica views are counted by the engine that served them in
+todo_replica_requests_total.
+"""
+import math
+import time
+
+from flask import current_app, g, has_app_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+from sqlalchemy.sql.dml import UpdateBase
+
+STICKY_COOKIE = 'todo_primary'
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+class RoutingSession(Session):
+    """Session sending the queries of a replica view to the replica engine."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase) and has_app_context():
+            replica = g.get('replica_engine')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def reads_replica(view):
+    """Let a view's reads go to the replica, unless its client wrote just now."""
+    view.reads_replica = True
+    return view
+
+
+def read_primary():
+    """Send the rest of this request's reads to the primary."""
+    if g.pop('replica_engine', None) is not None:
+        g.replica_read = 'primary'
+
+
+class Replica:
+    """Flask extension choosing the engine each request reads from."""
+
+    def __init__(self, app=None):
+        self.engine = None
+        self.requests = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('REPLICA_DATABASE_URI', None)
+        app.config.setdefault('REPLICA_ENGINE_OPTIONS', {})
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+        app.extensions['replica'] = self
+        self.config = app.config
+        if not app.config['REPLICA_DATABASE_URI']:
+            return
+        # Creating the engine does not connect yet
+        self.engine = create_engine(app.config['REPLICA_DATABASE_URI'], **app.config['REPLICA_ENGINE_OPTIONS'])
+        metrics = app.extensions.get('metrics')
+        if metrics is not None:
+            self.requests = metrics.counter(
+                'todo_replica_requests_total', 'Requests to replica views by the engine that served them.',
+                ('engine',))
+        app.before_request(self.route)
+        app.after_request(self.stick)
+
+    def sticky(self):
+        """Whether the client wrote recently enough to have to read from the primary."""
+        try:
+            return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def route(self):
+        view = current_app.view_functions.get(request.endpoint)
+        if request.method not in SAFE_METHODS or not getattr(view, 'reads_replica', False):
+            return
+        g.replica_read = 'primary' if self.sticky() else 'replica'
+        if g.replica_read == 'replica':
+            g.replica_engine = self.engine
+
+    def stick(self, response):
+        # Counted once the view has run, which may have switched to the primary
+        engine = g.get('replica_read')
+        if engine is not None and self.requests is not None:
+            self.requests.inc(engine)
+        cookie = self.sticky_cookie(request.method, response.status_code)
+        if cookie is not None:
+            response.set_cookie(**cookie)
+        return response
+
+    def sticky_cookie(self, method, status):
+        """The set_cookie() arguments pinning a client that wrote to the primary, if it has to be."""
+        seconds = self.config['REPLICA_STICKY_SECONDS']
+        if self.engine is None or method in SAFE_METHODS or status >= 400 or seconds <= 0:
+            return None
+        return {'key': STICKY_COOKIE, 'value': f'{time.time() + seconds:.3f}', 'max_age': math.ceil(seconds),
+                'httponly': True, 'samesite': 'Lax'}
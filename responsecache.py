@@ -0,0 +1,188 @@
+"""Versioned cache of rendered list pages and JSON read responses.
+
+Every list has a version number, and so does the set of lists as a whole.
+The mutation routes already publish a change feed event after they commit;
+the cache listens to the feed and bumps the version of the list concerned
+together with the global one. Nothing is ever invalidated: a cached response
+is stored under a key made of the URL, the versions it depends on and any
+per-client variant, so a change simply makes the old entries unreachable and
+the LRU eventually evicts them (by size, RESPONSE_CACHE_MAX_BYTES).
+
+The same key, hashed, is sent as a strong ETag with Cache-Control: no-cache.
+A browser revalidating with If-None-Match gets 304 Not Modified after a
+version lookup in the store, without the view running at all.
+
+Versions live in the store next to the responses. LRUStore keeps both in
+process, so by default the cache is only enabled for the in-memory storage
+mode, which is single-process anyway. To use it with several workers, set
+RESPONSE_CACHE_STORE to an object with the same methods backed by a shared
+store (e.g. Redis INCR for bump() and GET/SET with an LRU policy) and enable
+it with RESPONSE_CACHE_ENABLED.
+
+Misses of views that read from a replica are filled from the primary (see
+replica.py), as a lagging replica would store stale data under new versions.
+
+The natively served routes of the async mode are not cached, but their
+writes publish events like the Flask routes do and so keep the versions
+right.
+"""
+import functools
+import hashlib
+import uuid
+from collections import OrderedDict
+from threading import Lock
+
+from flask import Response, current_app, make_response, request
+
+from replica import read_primary
+
+GLOBAL_VERSION = 'lists'
+
+
+class LRUStore:
+    """In-process store of versions and of cached responses, evicting by size.
+
+    Versions are kept apart from the responses and never evicted; they are
+    one integer per list. epoch tells version numbers of this store apart
+    from those a previous process handed out.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.epoch = uuid.uuid4().hex[:8]
+        self.lock = Lock()
+        self.versions = {}
+        # key -> (size, value), least recently used first
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def get_versions(self, names):
+        with self.lock:
+            return [self.versions.get(name, 0) for name in names]
+
+    def bump(self, names):
+        with self.lock:
+            for name in names:
+                self.versions[name] = self.versions.get(name, 0) + 1
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[0]
+            self.entries[key] = (size, value)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self.entries.popitem(last=False)
+                self.size -= evicted
+
+
+class ResponseCache:
+    """Flask extension caching GET responses under per-list version numbers."""
+
+    def __init__(self, app=None):
+        self.store = None
+        self.results = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RESPONSE_CACHE_ENABLED', app.config.get('TODO_STORAGE') != 'file')
+        app.config.setdefault('RESPONSE_CACHE_MAX_BYTES', 16 * 1024 * 1024)
+        app.config.setdefault('RESPONSE_CACHE_STORE', None)
+        app.extensions['response_cache'] = self
+        self.config = app.config
+        self.store = app.config['RESPONSE_CACHE_STORE'] or LRUStore(app.config['RESPONSE_CACHE_MAX_BYTES'])
+        app.extensions['events'].listeners.append(self.on_change)
+        metrics = app.extensions.get('metrics')
+        if metrics is not None:
+            self.results = metrics.counter(
+                'todo_response_cache_requests_total', 'Cacheable requests by outcome.', ('result',))
+            if isinstance(self.store, LRUStore):
+                metrics.gauge('todo_response_cache_bytes', 'Size of the cached responses.',
+                              callback=lambda: self.store.size)
+
+    @property
+    def enabled(self):
+        return self.config['RESPONSE_CACHE_ENABLED']
+
+    def changed(self, list_id=None):
+        """Bump the global version and, if given, that of one list."""
+        names = [GLOBAL_VERSION]
+        if list_id is not None:
+            names.append(f'list:{list_id}')
+        self.store.bump(names)
+
+    def on_change(self, list_id, event, data):
+        # List-wide events (created, deleted) carry the list id in their data
+        self.changed(list_id if list_id is not None else data.get('id'))
+
+    def etag(self, list_id, variant):
+        """The validator for the current request, from the versions it depends on."""
+        names = [GLOBAL_VERSION] if list_id is None else [f'list:{list_id}']
+        versions = self.store.get_versions(names)
+        key = f'{self.store.epoch}|{versions}|{request.full_path}|{variant}'
+        return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+    def count(self, result):
+        if self.results is not None:
+            self.results.inc(result)
+
+    def respond(self, view, view_args, list_id, variant):
+        etag = self.etag(list_id, variant)
+        if request.if_none_match.contains_weak(etag):
+            self.count('not_modified')
+            response = Response(status=304)
+        else:
+            cached = self.store.get(etag)
+            if cached is not None:
+                self.count('hit')
+                status, mimetype, location, body = cached
+                response = Response(body, status=status, mimetype=mimetype)
+                if location is not None:
+                    response.headers['Location'] = location
+            else:
+                self.count('miss')
+                read_primary()
+                response = make_response(view(**view_args))
+                if response.status_code not in (200, 302) or response.is_streamed:
+                    return response
+                body = response.get_data()
+                self.store.set(etag, (response.status_code, response.mimetype,
+                                      response.headers.get('Location'), body),
+                               len(body) + len(etag))
+        if response.status_code in (200, 304):
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+
+def cached(scope=None, vary=None):
+    """Serve a GET view from the response cache.
+
+    scope(**view_args) names the list whose version the response depends
+    on; without it the response depends on the global version, i.e. on every
+    list. vary(**view_args) returns per-client key material, if any. Both
+    run before the view, so the versions are read before the database is.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**view_args):
+            cache = current_app.extensions['response_cache']
+            if not cache.enabled:
+                return view(**view_args)
+            list_id = scope(**view_args) if scope is not None else None
+            variant = vary(**view_args) if vary is not None else ''
+            return cache.respond(view, view_args, list_id, variant)
+        return wrapper
+    return decorator
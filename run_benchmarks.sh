@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python3 benchmark.py ${@}
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""Full-text search over todo descriptions with SQLite FTS5.
+
+todo_fts is an external-content FTS5 table over todo.description: it stores
+only the inverted index and reads the text back from the todo table. Triggers
+on todo keep it in step with every insert, delete and description change,
+whichever code path (ORM, bulk insert, the reaper) makes them.
+
+Searches are ranked with bm25 and cost a lookup in the index per term
+instead of a LIKE '%...%' scan of every description.
+
+Note that a batch migration which rebuilds the todo table drops its triggers;
+such a revision has to create them again (see TRIGGERS).
+"""
+import re
+
+from sqlalchemy import DDL, column, event, func, literal_column, table
+
+FTS_TABLE = 'todo_fts'
+
+CREATE_TABLE = ("CREATE VIRTUAL TABLE todo_fts USING fts5("
+                "description, content='todo', content_rowid='id')")
+
+TRIGGERS = [
+    """CREATE TRIGGER todo_fts_insert AFTER INSERT ON todo BEGIN
+    INSERT INTO todo_fts(rowid, description) VALUES (new.id, new.description);
+END""",
+    """CREATE TRIGGER todo_fts_delete AFTER DELETE ON todo BEGIN
+    INSERT INTO todo_fts(todo_fts, rowid, description) VALUES ('delete', old.id, old.description);
+END""",
+    """CREATE TRIGGER todo_fts_update AFTER UPDATE OF description ON todo BEGIN
+    INSERT INTO todo_fts(todo_fts, rowid, description) VALUES ('delete', old.id, old.description);
+    INSERT INTO todo_fts(rowid, description) VALUES (new.id, new.description);
+END""",
+]
+
+# Lightweight handle for queries; the table is not part of the models' metadata
+todo_fts = table(FTS_TABLE, column('rowid'), column(FTS_TABLE))
+rank = func.bm25(literal_column(FTS_TABLE))
+
+TERM = re.compile(r'\w+\*?')
+
+
+def install(todo_table):
+    """Create and drop todo_fts along with the todo table (SQLite only)."""
+    for statement in [CREATE_TABLE] + TRIGGERS:
+        event.listen(todo_table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+    event.listen(todo_table, 'before_drop',
+                 DDL(f'DROP TABLE IF EXISTS {FTS_TABLE}').execute_if(dialect='sqlite'))
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Keep autogenerate from dropping todo_fts and its shadow tables."""
+    return not (type_ == 'table' and name.startswith(FTS_TABLE))
+
+
+def match_query(text):
+    """Turn user input into an FTS5 query, or None if it has no terms.
+
+    Every word must match; a trailing * makes it a prefix ("mil*" finds
+    "milk"). Words are quoted, so FTS5 operators in the input are taken
+    literally instead of raising a syntax error.
+    """
+    terms = []
+    for term in TERM.findall(text or ''):
+        word = term.rstrip('*')
+        terms.append(f'"{word}"*' if term.endswith('*') else f'"{word}"')
+    return ' '.join(terms) or None
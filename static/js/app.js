@@ -0,0 +1,334 @@
+const messages = document.querySelector(".messages");
+const displayMessage = t => {
+  if (t) {
+    messages.textContent = "Success";
+    messages.classList.add("success");
+    messages.classList.remove("invisible");
+  } else if (t != null) {
+    messages.textContent = "Unsuccessful";
+    messages.classList.remove("success");
+    messages.classList.remove("invisible");
+  } else {
+    messages.textContent = "Please enter a message!";
+    messages.classList.remove("success");
+    messages.style.color = "#000";
+    messages.classList.remove("invisible");
+  }
+  const timeout = setTimeout(() => {
+    messages.classList.add("invisible");
+    clearTimeout(timeout);
+  }, 1000);
+  // return timeout;
+};
+
+const listItems = document.querySelectorAll(".list-item span:first-of-type");
+listItems.forEach(el => {
+  el.addEventListener("click", () => {
+    listId = el.getAttribute('data-id');
+    window.location = `/todos/${listId}`;
+  });
+});
+
+
+// Checkbox toggles are queued and sent together as one PATCH once the user
+// pauses, so ticking off a run of todos costs a single request.
+const TOGGLE_DELAY = 250;
+const pendingToggles = new Map();
+let toggleTimer = null;
+
+const flushToggles = (keepalive = false) => {
+  clearTimeout(toggleTimer);
+  toggleTimer = null;
+  if (!pendingToggles.size) return;
+  const listId = document.querySelector(".title-div h3").getAttribute("id");
+  const todos = Array.from(pendingToggles, ([id, completed]) => ({ id, completed }));
+  pendingToggles.clear();
+  fetch(`/todos/${listId}`, {
+    method: "PATCH",
+    body: JSON.stringify({ todos: todos }),
+    headers: {
+      "Content-Type": "application/json"
+    },
+    keepalive: keepalive
+  })
+    .then(res => res.json())
+    .then(data => displayMessage(data.successful))
+    .catch(err => {
+      console.log(err);
+      displayMessage(false);
+    });
+};
+
+const queueToggle = (todoId, completed) => {
+  pendingToggles.set(Number(todoId), completed);
+  clearTimeout(toggleTimer);
+  toggleTimer = setTimeout(flushToggles, TOGGLE_DELAY);
+};
+
+// Don't lose toggles made just before navigating away.
+window.addEventListener("pagehide", () => flushToggles(true));
+
+const checkboxes = document.querySelectorAll(".todos input");
+checkboxes.forEach(checkbox => {
+  checkbox.addEventListener("change", e => {
+    queueToggle(e.target.dataset["id"], e.target.checked);
+  });
+});
+
+const setAllCompleted = completed => {
+  const listId = document.querySelector(".title-div h3").getAttribute("id");
+  fetch(`/todos/${listId}`, {
+    method: "PUT",
+    body: JSON.stringify({ completed: completed }),
+    headers: {
+      "Content-Type": "application/json"
+    }
+  })
+    .then(res => res.json())
+    .then(data => {
+      if (data.successful) {
+        document
+          .querySelectorAll(".todos input[type='checkbox']")
+          .forEach(el => (el.checked = completed));
+        displayMessage(true);
+      }
+    })
+    .catch(err => {
+      console.log(err);
+      displayMessage(false);
+    });
+};
+
+document.querySelector(".complete-all").addEventListener("click", () => setAllCompleted(true));
+document.querySelector(".uncomplete-all").addEventListener("click", () => setAllCompleted(false));
+
+document.querySelector(".clear-completed").addEventListener("click", () => {
+  const listId = document.querySelector(".title-div h3").getAttribute("id");
+  fetch(`/todos/${listId}/completed`, {
+    method: "DELETE"
+  })
+    .then(res => res.json())
+    .then(data => {
+      if (data.successful) {
+        document
+          .querySelectorAll(".todos input[type='checkbox']:checked")
+          .forEach(el => (el.closest("li").style.display = "none"));
+        displayMessage(true);
+      }
+    })
+    .catch(err => {
+      console.log(err);
+      displayMessage(false);
+    });
+});
+
+
+const listDeletes = document.querySelectorAll('.list-delete');
+listDeletes.forEach(el => {
+  el.addEventListener('click', () => {
+    const listId = el.getAttribute('data-id');
+    fetch(`/todos/${listId}`, {
+      method: "DELETE"
+    })
+      .then(res => res.json())
+      .then(data => {
+        if (data.successful) {
+          const currentListID = Number(document.querySelector(".title-div h3").getAttribute("id"));
+          if (currentListID == listId) {
+            window.location = `/`;
+          }
+          document.querySelector(`.lists li#_${listId}`).style.display = "none";
+          displayMessage(true);
+        }
+      })
+      .catch(displayMessage(false));
+  });
+});
+
+const deleteButtons = document.querySelectorAll(".todos li div + span");
+deleteButtons.forEach(button => {
+  button.addEventListener("click", e => {
+    const todoId = e.target.dataset["id"];
+    const listId = document.querySelector(".title-div h3").getAttribute("id");
+    const parent = document.querySelector(".todos li");
+    fetch(`/todos/${listId}/${todoId}`, {
+      method: "DELETE"
+    })
+      .then(res => res.json())
+      .then(data => {
+        if (data.successful) {
+          document.querySelector(`#_${todoId}`).style.display = "none";
+          displayMessage(true);
+        }
+      })
+      .catch(displayMessage(false));
+  });
+});
+
+// Adds a list to the sidebar unless it is already there (the change feed may
+// have delivered it first).
+const appendList = data => {
+  const listId = data.id;
+  if (document.querySelector(`.lists li#_${listId}`)) return;
+  const listItem = document.createElement("li");
+  listItem.setAttribute("id", `_${listId}`);
+  listItem.classList.add('list-item');
+  const listName = document.createElement("span");
+  listName.addEventListener("click", () => {
+    window.location = `/todos/${data.id}`;
+  });
+  const listDelete = document.createElement("span");
+  listDelete.classList.add('list-delete');
+  listDelete.innerHTML = "&cross;";
+  listDelete.addEventListener("click", () => {
+    fetch(`/todos/${listId}`, {
+      method: "DELETE"
+    })
+      .then(res => res.json())
+      .then(data => {
+        if (data.successful) {
+          document.querySelector(`.lists li#_${listId}`).style.display = "none";
+          displayMessage(true);
+        }
+      })
+      .catch(displayMessage(false));
+  });
+  listName.textContent = ` ${data.name}`;
+  listItem.append(listName, listDelete);
+  document.querySelector(".lists").append(listItem);
+};
+
+// Adds a todo to the list unless it is already there.
+const appendTodo = (listId, data) => {
+  const todoId = data.id;
+  if (document.querySelector(`.todos li#_${todoId}`)) return;
+  const newTodo = document.createElement("li");
+  newTodo.setAttribute("id", `_${todoId}`);
+  const container = document.createElement("div");
+  const checker = document.createElement("input");
+  const description = document.createElement("span");
+  const deleteButton = document.createElement("span");
+  deleteButton.innerHTML = "&cross;";
+  deleteButton.addEventListener("click", () => {
+    fetch(`/todos/${listId}/${todoId}`, {
+      method: "DELETE"
+    })
+      .then(res => res.json())
+      .then(data => {
+        if (data.successful) {
+          document.querySelector(`.todos li#_${todoId}`).style.display =
+            "none";
+          displayMessage(true);
+        }
+      })
+      .catch(displayMessage(false));
+  });
+  checker.setAttribute("type", "checkbox");
+  checker.setAttribute("data-id", todoId);
+  checker.checked = Boolean(data.completed);
+  checker.addEventListener("change", e => {
+    queueToggle(todoId, e.target.checked);
+  });
+  description.textContent = ` ${data.description}`;
+  container.append(checker, description);
+  newTodo.append(container, deleteButton);
+  document.querySelector(".todos").append(newTodo);
+};
+
+document.querySelector(".list-container form").onsubmit = function (e) {
+  e.preventDefault();
+  const listId = document.querySelector(".title-div h3").getAttribute("id");
+  if (document.querySelector(".list-name").value) {
+    fetch(`/todos`, {
+      method: "POST",
+      body: JSON.stringify({
+        name: document.querySelector(".list-name").value
+      }),
+      headers: {
+        "Content-Type": "application/json"
+      }
+    })
+      .then(res => res.json())
+      .then(data => {
+        appendList(data);
+        displayMessage(true);
+      })
+      .catch(error => {
+        console.log(error);
+        displayMessage(false);
+      });
+  } else displayMessage();
+};
+
+document.querySelector(".todo-container form").onsubmit = function (e) {
+  e.preventDefault();
+  const listId = document.querySelector(".title-div h3").getAttribute("id");
+  if (document.querySelector(".description").value) {
+    fetch(`/todos/${listId}`, {
+      method: "POST",
+      body: JSON.stringify({
+        description: document.querySelector(".description").value,
+        todolist_id: listId
+      }),
+      headers: {
+        "Content-Type": "application/json"
+      }
+    })
+      .then(res => res.json())
+      .then(data => {
+        appendTodo(listId, data);
+        displayMessage(true);
+      })
+      .catch(error => {
+        console.log(error);
+        displayMessage(false);
+      });
+  } else displayMessage();
+}
+
+// Keep the page current with changes made in other tabs and by other users.
+const currentListId = document.querySelector(".title-div h3").getAttribute("id");
+if (window.EventSource && currentListId !== "welcome") {
+  const feed = new EventSource(`/todos/${currentListId}/events`);
+  const on = (name, handler) =>
+    feed.addEventListener(name, e => handler(JSON.parse(e.data)));
+  const todoItem = id => document.querySelector(`.todos li#_${id}`);
+
+  on("todo_created", todo => appendTodo(currentListId, todo));
+  on("todos_created", data => data.todos.forEach(todo => appendTodo(currentListId, todo)));
+  on("todo_updated", todo => {
+    const item = todoItem(todo.id);
+    if (item) item.querySelector("input[type='checkbox']").checked = todo.completed;
+  });
+  on("todo_deleted", todo => {
+    const item = todoItem(todo.id);
+    if (item) item.style.display = "none";
+  });
+  on("todos_updated", data => {
+    data.todos.forEach(todo => {
+      const item = todoItem(todo.id);
+      if (item) item.querySelector("input[type='checkbox']").checked = todo.completed;
+    });
+  });
+  on("list_updated", data => {
+    document
+      .querySelectorAll(".todos input[type='checkbox']")
+      .forEach(el => (el.checked = data.completed));
+  });
+  on("completed_cleared", () => {
+    document
+      .querySelectorAll(".todos input[type='checkbox']:checked")
+      .forEach(el => (el.closest("li").style.display = "none"));
+  });
+  on("list_created", list => appendList(list));
+  on("list_deleted", list => {
+    if (list.id == currentListId) {
+      window.location = `/`;
+      return;
+    }
+    const item = document.querySelector(`.lists li#_${list.id}`);
+    if (item) item.style.display = "none";
+  });
+  // We fell too far behind; start over from a fresh page.
+  on("resync", () => window.location.reload());
+}
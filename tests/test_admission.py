@@ -0,0 +1,95 @@
+import threading
+import unittest
+from app import create_app, db
+
+
+class AdmissionControlTestCase(unittest.TestCase):
+    """Tests for per-client rate limiting and the concurrency limit"""
+
+    def setUp(self):
+        """Enable admission control with small limits"""
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                                     'ADMISSION_ENABLED': True, 'ADMISSION_RATE': 1,
+                                     'ADMISSION_BURST': 2, 'ADMISSION_MAX_CONCURRENCY': 1,
+                                     'ADMISSION_QUEUE_SIZE': 0,
+                                     'ADMISSION_QUEUE_TIMEOUT_SECONDS': 0.05})
+        self.app = self.flask_app.test_client()
+        self.admission = self.flask_app.extensions['admission']
+
+        with self.flask_app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def get(self, url='/api/lists', client='10.0.0.1'):
+        return self.app.get(url, environ_base={'REMOTE_ADDR': client})
+
+    def free_slot(self):
+        with self.admission.condition:
+            self.admission.active -= 1
+            self.admission.condition.notify()
+
+    def test_rate_limit_per_client(self):
+        """Test that a client is limited to its burst while others still get through"""
+        self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(self.get().status_code, 200)
+
+        limited = self.get()
+        self.assertEqual(limited.status_code, 429)
+        self.assertEqual(limited.headers['Retry-After'], '1')
+        self.assertEqual(self.get(client='10.0.0.2').status_code, 200)
+
+    def test_concurrency_limit_sheds_load(self):
+        """Test that requests beyond the concurrency limit and queue get 503"""
+        self.assertIsNone(self.admission.acquire())
+        try:
+            overloaded = self.get()
+            self.assertEqual(overloaded.status_code, 503)
+            self.assertIn('Retry-After', overloaded.headers)
+
+            self.flask_app.config['ADMISSION_QUEUE_SIZE'] = 1
+            self.assertEqual(self.get(client='10.0.0.2').status_code, 503)
+        finally:
+            self.free_slot()
+
+        self.assertEqual(self.get(client='10.0.0.3').status_code, 200)
+
+    def test_queued_request_gets_freed_slot(self):
+        """Test that a request waiting in the queue is admitted when a slot frees up"""
+        self.flask_app.config.update(ADMISSION_QUEUE_SIZE=1, ADMISSION_QUEUE_TIMEOUT_SECONDS=5)
+        self.assertIsNone(self.admission.acquire())
+        timer = threading.Timer(0.1, self.free_slot)
+        timer.start()
+
+        self.assertEqual(self.get().status_code, 200)
+        timer.join()
+
+    def test_exempt_endpoints(self):
+        """Test that /metrics is served even when a client is out of tokens"""
+        for _ in range(3):
+            self.get()
+        self.assertEqual(self.get('/metrics').status_code, 200)
+
+    def test_rejections_are_counted(self):
+        """Test that rejections show up on /metrics by reason"""
+        for _ in range(3):
+            self.get()
+
+        body = self.get('/metrics').data.decode()
+        self.assertIn('todo_admission_rejected_total{reason="rate_limited"}', body)
+
+    def test_slots_released_after_requests(self):
+        """Test that finished requests give their slot back"""
+        self.flask_app.config['ADMISSION_BURST'] = 10
+        for _ in range(5):
+            self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(self.admission.active, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
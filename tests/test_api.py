@@ -0,0 +1,90 @@
+import unittest
+import json
+from app import create_app, db, Todo, TodoList
+
+
+class JsonReadApiTestCase(unittest.TestCase):
+    """Tests for the keyset-paginated JSON read API"""
+
+    def setUp(self):
+        """Set up a list with ten todos, every third one completed"""
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app = self.flask_app.test_client()
+
+        with self.flask_app.app_context():
+            db.create_all()
+            todo_list = TodoList(name='Paged List')
+            db.session.add(todo_list)
+            db.session.commit()
+            for i in range(10):
+                db.session.add(Todo(description=f'Todo {i}', todolist_id=todo_list.id,
+                                    completed=(i % 3 == 0)))
+            db.session.commit()
+            self.list_id = todo_list.id
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def get_json(self, url):
+        response = self.app.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)
+
+    def test_walk_all_pages(self):
+        """Test that following next_after visits every todo exactly once"""
+        seen = []
+        url = f'/api/lists/{self.list_id}/todos?limit=4'
+        while True:
+            data = self.get_json(url)
+            seen.extend(todo['description'] for todo in data['todos'])
+            if data['next_after'] is None:
+                break
+            url = f'/api/lists/{self.list_id}/todos?limit=4&after={data["next_after"]}'
+
+        self.assertEqual(seen, [f'Todo {i}' for i in range(10)])
+
+    def test_filter_completed(self):
+        """Test filtering todos by completed state"""
+        done = self.get_json(f'/api/lists/{self.list_id}/todos?completed=true')
+        self.assertEqual([t['description'] for t in done['todos']],
+                         ['Todo 0', 'Todo 3', 'Todo 6', 'Todo 9'])
+        self.assertIsNone(done['next_after'])
+
+        open_todos = self.get_json(f'/api/lists/{self.list_id}/todos?completed=false')
+        self.assertEqual(len(open_todos['todos']), 6)
+        self.assertFalse(any(t['completed'] for t in open_todos['todos']))
+
+    def test_bad_completed_filter(self):
+        """Test that an unknown completed value is a bad request"""
+        response = self.app.get(f'/api/lists/{self.list_id}/todos?completed=maybe')
+        self.assertEqual(response.status_code, 400)
+
+    def test_limit_is_capped(self):
+        """Test that the page size never exceeds the configured maximum"""
+        self.flask_app.config['TODO_API_MAX_LIMIT'] = 3
+        try:
+            data = self.get_json(f'/api/lists/{self.list_id}/todos?limit=1000')
+        finally:
+            self.flask_app.config['TODO_API_MAX_LIMIT'] = 500
+        self.assertEqual(len(data['todos']), 3)
+        self.assertEqual(data['next_after'], data['todos'][-1]['id'])
+
+    def test_get_lists(self):
+        """Test paging through the lists"""
+        with self.flask_app.app_context():
+            db.session.add(TodoList(name='Second List'))
+            db.session.commit()
+
+        first = self.get_json('/api/lists?limit=1')
+        self.assertEqual(first['lists'][0]['name'], 'Paged List')
+        second = self.get_json(f'/api/lists?limit=1&after={first["next_after"]}')
+        self.assertEqual(second['lists'][0]['name'], 'Second List')
+        self.assertIsNone(second['next_after'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,23 +1,23 @@
 import unittest
 import json
-from app import app, db, Todo, TodoList
+from app import create_app, db, Todo, TodoList
 
 
 class TodoAppTestCase(unittest.TestCase):
     
     def setUp(self):
         """Set up stuff before each test"""
-        self.app = app.test_client()
-        app.config['TESTING'] = True
         # use a different database for testing so we don't mess up the real one
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app = self.flask_app.test_client()
         
-        with app.app_context():
+        with self.flask_app.app_context():
             db.create_all()
     
     def tearDown(self):
         """Clean up after each test"""
-        with app.app_context():
+        with self.flask_app.app_context():
             db.session.remove()
             db.drop_all()
     
@@ -82,7 +82,7 @@ class TodoAppTestCase(unittest.TestCase):
     def test_update_todo_completion(self):
         """Test updating a todo's completion status"""
         # Setup: create list and todo
-        with app.app_context():
+        with self.flask_app.app_context():
             todo_list = TodoList(name='Test List')
             db.session.add(todo_list)
             db.session.commit()
@@ -107,7 +107,7 @@ class TodoAppTestCase(unittest.TestCase):
     def test_update_all_todos(self):
         """Test marking all todos in a list as complete"""
         # Setup: create list with multiple todos
-        with app.app_context():
+        with self.flask_app.app_context():
             todo_list = TodoList(name='Test List')
             db.session.add(todo_list)
             db.session.commit()
@@ -128,7 +128,7 @@ class TodoAppTestCase(unittest.TestCase):
         self.assertTrue(data['successful'])
         
         # Check that todos are actually completed
-        with app.app_context():
+        with self.flask_app.app_context():
             todos = Todo.query.filter_by(todolist_id=list_id).all()
             for todo in todos:
                 self.assertTrue(todo.completed)
@@ -136,7 +136,7 @@ class TodoAppTestCase(unittest.TestCase):
     def test_delete_todo(self):
         """Test deleting a todo item"""
         # Setup
-        with app.app_context():
+        with self.flask_app.app_context():
             todo_list = TodoList(name='Test List')
             db.session.add(todo_list)
             db.session.commit()
@@ -156,14 +156,14 @@ class TodoAppTestCase(unittest.TestCase):
         self.assertTrue(data['successful'])
         
         # Verify it's actually deleted
-        with app.app_context():
+        with self.flask_app.app_context():
             deleted_todo = db.session.get(Todo, todo_id)
             self.assertIsNone(deleted_todo)
     
     def test_delete_todolist(self):
         """Test deleting an entire todo list"""
         # Setup
-        with app.app_context():
+        with self.flask_app.app_context():
             todo_list = TodoList(name='List to delete')
             db.session.add(todo_list)
             db.session.commit()
@@ -177,7 +177,7 @@ class TodoAppTestCase(unittest.TestCase):
         self.assertTrue(data['successful'])
         
         # Verify it's deleted
-        with app.app_context():
+        with self.flask_app.app_context():
             deleted_list = db.session.get(TodoList, list_id)
             self.assertIsNone(deleted_list)
     
@@ -190,7 +190,7 @@ class TodoAppTestCase(unittest.TestCase):
     def test_get_real_todolist_page(self):
         """Test getting a real todo list page"""
         # Setup
-        with app.app_context():
+        with self.flask_app.app_context():
             todo_list = TodoList(name='My List')
             db.session.add(todo_list)
             db.session.commit()
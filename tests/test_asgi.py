@@ -0,0 +1,188 @@
+import asyncio
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+
+ASYNC_DEPS = all(importlib.util.find_spec(name) for name in ('aiosqlite', 'asgiref', 'greenlet'))
+
+
+@unittest.skipUnless(ASYNC_DEPS, 'the async serving mode needs aiosqlite, asgiref and greenlet')
+class AsgiModeTestCase(unittest.TestCase):
+    """Tests for the routes served natively by the async ASGI app"""
+
+    def setUp(self):
+        from app import create_app, db
+        from asgi import AsyncTodoApp
+        from benchmark import AsgiDriver
+
+        self.db = db
+        self.application = AsyncTodoApp(create_app({'TESTING': True,
+                                                    'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'}))
+        self.driver = AsgiDriver(self.application)
+        self.loop = asyncio.new_event_loop()
+        self.wait(self.create_schema())
+
+    def tearDown(self):
+        self.wait(self.application.engine.dispose())
+        self.loop.close()
+
+    async def create_schema(self):
+        async with self.application.engine.begin() as conn:
+            await conn.run_sync(self.db.metadata.create_all)
+
+    def wait(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def request(self, method, url, body=None, headers=None):
+        return self.wait(self.driver.request(method, url, body, headers))
+
+    def test_list_and_todo_lifecycle(self):
+        """Test create, toggle, complete all and delete through the async routes"""
+        created = self.request('POST', '/todos', {'name': 'Async List'})
+        self.assertEqual(created['status'], 200)
+        list_id = json.loads(created['body'])['id']
+
+        todo = json.loads(self.request('POST', f'/todos/{list_id}',
+                                       {'description': 'Async todo', 'todolist_id': list_id})['body'])
+        batch = json.loads(self.request('POST', f'/todos/{list_id}',
+                                        {'descriptions': ['One', 'Two']})['body'])
+        self.assertEqual(len(batch['ids']), 2)
+
+        toggled = self.request('PATCH', f'/todos/{list_id}/{todo["id"]}', {'completed': True})
+        self.assertTrue(json.loads(toggled['body'])['completed'])
+
+        completed = json.loads(self.request('PUT', f'/todos/{list_id}')['body'])
+        self.assertEqual(completed['count'], 2)
+
+        page = self.request('GET', f'/todos/{list_id}')
+        self.assertEqual(page['status'], 200)
+        self.assertIn(b'Async todo', page['body'])
+        self.assertIn(b'Items - Async List', page['body'])
+
+        self.assertEqual(self.request('DELETE', f'/todos/{list_id}/{todo["id"]}')['status'], 200)
+        self.assertEqual(self.request('DELETE', f'/todos/{list_id}')['status'], 200)
+        self.assertIn(b'Deleted List', self.request('GET', f'/todos/{list_id}')['body'])
+
+    def test_index_redirect(self):
+        """Test that / redirects to the welcome list when there are no lists"""
+        response = self.request('GET', '/')
+        self.assertEqual(response['status'], 302)
+        self.assertIn((b'location', b'/todos/welcome'), response['headers'])
+
+    def test_starter_list_state_uses_cookie(self):
+        """Test that welcome list deletions are remembered for the same client"""
+        response = self.request('DELETE', '/todos/welcome/2')
+        cookie = dict(response['headers'])[b'set-cookie'].decode().split(';')[0]
+
+        page = self.request('GET', '/todos/welcome', headers={'Cookie': cookie})
+        self.assertNotIn(b'<li id="_2">', page['body'])
+        self.assertIn(b'<li id="_1">', page['body'])
+
+    def test_bad_request(self):
+        """Test that a todo without a description is a bad request"""
+        response = self.request('POST', '/todos/1', {'todolist_id': 1})
+        self.assertEqual(response['status'], 400)
+
+    def test_other_paths_fall_back_to_flask(self):
+        """Test that paths without a native handler are served by the Flask app"""
+        response = self.request('GET', '/metrics')
+        self.assertEqual(response['status'], 200)
+        self.assertIn(b'todo_http_requests_total', response['body'])
+
+    def test_event_stream_leaves_other_requests_free(self):
+        """Test that an open event stream is served natively and blocks nothing"""
+        list_id = json.loads(self.request('POST', '/todos', {'name': 'Streamed'})['body'])['id']
+
+        async def scenario():
+            frames = asyncio.Queue()
+            hang_up = asyncio.Event()
+
+            async def receive():
+                await hang_up.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.body':
+                    await frames.put(message['body'])
+
+            scope = {'type': 'http', 'method': 'GET', 'path': f'/todos/{list_id}/events',
+                     'query_string': b'', 'headers': []}
+            stream = asyncio.ensure_future(self.application(scope, receive, send))
+            first = await asyncio.wait_for(frames.get(), 5)
+
+            # Both go through the Flask fallback while the stream stays open
+            metrics = await asyncio.wait_for(self.driver.request('GET', '/metrics'), 5)
+            lists = await asyncio.wait_for(self.driver.request('GET', '/api/lists'), 5)
+            await self.driver.request('POST', f'/todos/{list_id}', {'description': 'Live', 'todolist_id': list_id})
+            pushed = await asyncio.wait_for(frames.get(), 5)
+
+            hang_up.set()
+            await asyncio.wait_for(stream, 5)
+            return first, metrics, lists, pushed
+
+        first, metrics, lists, pushed = self.wait(scenario())
+
+        self.assertTrue(first.startswith(b'retry:'))
+        self.assertEqual((metrics['status'], lists['status']), (200, 200))
+        self.assertIn(b'event: todo_created', pushed)
+        self.assertEqual(json.loads(pushed.decode().split('data: ', 1)[1])['description'], 'Live')
+        self.assertEqual(self.application.changes.subscriber_count(), 0)
+
+
+@unittest.skipUnless(ASYNC_DEPS, 'the async serving mode needs aiosqlite, asgiref and greenlet')
+class AsgiReplicaTestCase(unittest.TestCase):
+    """Tests for read-your-writes when the native writes are followed by replica reads"""
+
+    def setUp(self):
+        from app import create_app, db
+        from asgi import AsyncTodoApp
+        from benchmark import AsgiDriver
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        # A replica that never catches up: an empty database of its own
+        replica_path = os.path.join(self.tmpdir.name, 'replica.db')
+        self.flask_app = create_app({'TESTING': True, 'TODO_STORAGE': 'file',
+                                     'TODO_SQLITE_PATH': os.path.join(self.tmpdir.name, 'todo.db'),
+                                     'REPLICA_DATABASE_URI': 'sqlite:///' + replica_path})
+        self.db = db
+        self.replica = self.flask_app.extensions['replica']
+        db.metadata.create_all(self.replica.engine)
+        self.application = AsyncTodoApp(self.flask_app)
+        self.driver = AsgiDriver(self.application)
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.application.engine.dispose())
+        self.loop.close()
+        with self.flask_app.app_context():
+            self.db.session.remove()
+            self.db.engine.dispose()
+        self.replica.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def request(self, method, url, body=None, headers=None):
+        return self.loop.run_until_complete(self.driver.request(method, url, body, headers))
+
+    def test_native_writes_stick_to_primary(self):
+        """Test that a native write sets the sticky cookie, so the client's API reads see it"""
+        # Sets the schema up on the primary
+        self.assertEqual(self.request('GET', '/api/lists')['status'], 200)
+        created = self.request('POST', '/todos', {'name': 'Native'})
+        cookies = [value.decode() for name, value in created['headers'] if name == b'set-cookie']
+        sticky = [cookie.split(';')[0] for cookie in cookies if cookie.startswith('todo_primary=')]
+        self.assertEqual(len(sticky), 1)
+
+        lists = json.loads(self.request('GET', '/api/lists', headers={'Cookie': sticky[0]})['body'])['lists']
+        self.assertEqual([todo_list['name'] for todo_list in lists], ['Native'])
+        # Without it the read goes to the replica, which has not seen the write
+        self.assertEqual(json.loads(self.request('GET', '/api/lists')['body'])['lists'], [])
+
+        rejected = self.request('POST', '/todos/1', {'todolist_id': 1})
+        self.assertEqual(rejected['status'], 400)
+        self.assertNotIn(b'set-cookie', dict(rejected['headers']))
+
+
+if __name__ == '__main__':
+    unittest.main()
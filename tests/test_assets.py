@@ -0,0 +1,57 @@
+import unittest
+from app import create_app, db
+
+
+class StaticAssetsTestCase(unittest.TestCase):
+    """Tests for fingerprinted, long-cached static assets"""
+
+    def setUp(self):
+        self.flask_app = create_app({'TESTING': True})
+        self.app = self.flask_app.test_client()
+        self.assets = self.flask_app.extensions['assets']
+
+        with self.flask_app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_page_references_fingerprinted_assets(self):
+        """Test that the page links the CSS and JS instead of inlining them"""
+        response = self.app.get('/todos/welcome')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.assets.url('css/app.css').encode(), response.data)
+        self.assertIn(self.assets.url('js/app.js').encode(), response.data)
+        self.assertNotIn(b'<style>', response.data)
+
+    def test_asset_served_with_immutable_caching(self):
+        """Test that an asset is served from its hashed URL and cached forever"""
+        url = self.assets.url('js/app.js')
+        response = self.app.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertTrue(response.content_type.startswith(('text/javascript', 'application/javascript')))
+        self.assertIn(b'displayMessage', response.data)
+
+        cached = self.app.get(url, headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    def test_debug_turned_on_after_create_app_reloads_edits(self):
+        """Test that assets are reloaded when debug is set after building the app, as python app.py does"""
+        self.assets.manifest['js/app.js'] = self.assets.manifest['js/app.js']._replace(mtime=0)
+        with self.flask_app.app_context():
+            self.assertEqual(self.assets.get('js/app.js').mtime, 0)
+
+            self.flask_app.debug = True
+            self.assertNotEqual(self.assets.get('js/app.js').mtime, 0)
+
+    def test_stale_fingerprint_is_not_served(self):
+        """Test that a hash that doesn't match the content is a 404"""
+        response = self.app.get('/assets/js/app.000000000000.js')
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
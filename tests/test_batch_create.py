@@ -0,0 +1,81 @@
+import unittest
+import json
+from app import create_app, db, Todo, TodoList
+
+
+class BatchCreateTodoTestCase(unittest.TestCase):
+    """Tests for creating many todos with one POST /todos/<list_id>"""
+
+    def setUp(self):
+        """Set up stuff before each test"""
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app = self.flask_app.test_client()
+
+        with self.flask_app.app_context():
+            db.create_all()
+            todo_list = TodoList(name='Batch List')
+            db.session.add(todo_list)
+            db.session.commit()
+            self.list_id = todo_list.id
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def post_batch(self, payload):
+        return self.app.post(f'/todos/{self.list_id}',
+                             data=json.dumps(payload),
+                             content_type='application/json')
+
+    def test_batch_returns_ids_in_order(self):
+        """Test that every description is inserted and ids come back in order"""
+        descriptions = [f'Item {i}' for i in range(50)]
+        response = self.post_batch({'descriptions': descriptions})
+
+        self.assertEqual(response.status_code, 200)
+        ids = json.loads(response.data)['ids']
+        self.assertEqual(len(ids), 50)
+        self.assertEqual(ids, sorted(ids))
+
+        with self.flask_app.app_context():
+            for todo_id, description in zip(ids, descriptions):
+                todo = db.session.get(Todo, todo_id)
+                self.assertEqual(todo.description, description)
+                self.assertEqual(todo.todolist_id, self.list_id)
+                self.assertFalse(todo.completed)
+
+    def test_atomic_batch_rejects_everything(self):
+        """Test that one bad description rejects the whole atomic batch"""
+        response = self.post_batch({'descriptions': ['Good', '', 'Also good']})
+
+        self.assertEqual(response.status_code, 400)
+        data = json.loads(response.data)
+        self.assertEqual([e['index'] for e in data['errors']], [1])
+
+        with self.flask_app.app_context():
+            self.assertEqual(Todo.query.count(), 0)
+
+    def test_partial_batch_reports_per_item_errors(self):
+        """Test that non-atomic batches insert the valid items only"""
+        response = self.post_batch({'descriptions': ['Good', 42, 'Also good'],
+                                     'atomic': False})
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertIsNone(data['ids'][1])
+        self.assertEqual([e['index'] for e in data['errors']], [1])
+
+        with self.flask_app.app_context():
+            self.assertEqual(Todo.query.count(), 2)
+
+    def test_batch_must_be_a_list(self):
+        """Test that a non-list descriptions value is a bad request"""
+        response = self.post_batch({'descriptions': 'not a list'})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
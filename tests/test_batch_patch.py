@@ -0,0 +1,106 @@
+import unittest
+import json
+from app import create_app, db, Todo, TodoList
+
+
+class BatchPatchTestCase(unittest.TestCase):
+    """Tests for toggling many todos with one PATCH /todos/<list_id>"""
+
+    def setUp(self):
+        """Set up two lists with a few todos each"""
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app = self.flask_app.test_client()
+
+        with self.flask_app.app_context():
+            db.create_all()
+            todo_list = TodoList(name='Batch List')
+            other_list = TodoList(name='Other List')
+            db.session.add(todo_list)
+            db.session.add(other_list)
+            db.session.commit()
+            todos = [Todo(description=f'Todo {i}', todolist_id=todo_list.id, completed=i == 2)
+                     for i in range(3)]
+            elsewhere = Todo(description='Elsewhere', todolist_id=other_list.id)
+            db.session.add_all(todos + [elsewhere])
+            db.session.commit()
+            self.list_id = todo_list.id
+            self.todo_ids = [todo.id for todo in todos]
+            self.elsewhere_id = elsewhere.id
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def patch(self, todos):
+        return self.app.patch(f'/todos/{self.list_id}',
+                              data=json.dumps({'todos': todos}),
+                              content_type='application/json')
+
+    def completed(self, todo_id):
+        with self.flask_app.app_context():
+            return db.session.get(Todo, todo_id).completed
+
+    def test_applies_every_toggle(self):
+        """Test that one request sets each todo to its requested state"""
+        first, second, third = self.todo_ids
+        response = self.patch([
+            {'id': first, 'completed': True},
+            {'id': second, 'completed': True},
+            {'id': third, 'completed': False},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertTrue(data['successful'])
+        self.assertEqual(data['count'], 3)
+        self.assertTrue(self.completed(first))
+        self.assertTrue(self.completed(second))
+        self.assertFalse(self.completed(third))
+
+    def test_last_toggle_wins(self):
+        """Test that repeated toggles of one todo collapse to the last state"""
+        first = self.todo_ids[0]
+        response = self.patch([
+            {'id': first, 'completed': True},
+            {'id': first, 'completed': False},
+        ])
+
+        self.assertEqual(json.loads(response.data)['count'], 1)
+        self.assertFalse(self.completed(first))
+
+    def test_ignores_todos_of_other_lists(self):
+        """Test that a batch cannot reach into another list"""
+        response = self.patch([{'id': self.elsewhere_id, 'completed': True}])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['count'], 0)
+        self.assertFalse(self.completed(self.elsewhere_id))
+
+    def test_event_lists_only_updated_todos(self):
+        """Test that the change feed event leaves out the todos of other lists"""
+        changes = self.flask_app.extensions['events']
+        subscriber = changes.subscribe(self.list_id)
+        first = self.todo_ids[0]
+        response = self.patch([{'id': self.elsewhere_id, 'completed': True}, {'id': first, 'completed': True}])
+
+        self.assertEqual(json.loads(response.data)['count'], 1)
+        self.assertEqual(subscriber.get_nowait(), ('todos_updated', {'todos': [{'id': first, 'completed': True}]}))
+        changes.unsubscribe(self.list_id, subscriber)
+
+    def test_invalid_batch_changes_nothing(self):
+        """Test that a malformed entry rejects the whole batch"""
+        first = self.todo_ids[0]
+        response = self.patch([
+            {'id': first, 'completed': True},
+            {'id': self.todo_ids[1], 'completed': 'yes'},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.completed(first))
+
+
+if __name__ == '__main__':
+    unittest.main()
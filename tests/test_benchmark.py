@@ -0,0 +1,49 @@
+import unittest
+from app import create_app, db
+import benchmark
+
+
+class BenchmarkSuiteTestCase(unittest.TestCase):
+    """Smoke tests for the benchmark harness itself"""
+
+    def setUp(self):
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        with self.flask_app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_every_route_runs_without_errors(self):
+        """Test a tiny run drives every route in the URL map and reports latency stats"""
+        results = benchmark.run_benchmark(self.flask_app, benchmark.TestClientDriver(self.flask_app),
+                                          lists=3, todos=5, requests=4, scratch_size=2)
+        endpoints = {rule.endpoint for rule in self.flask_app.url_map.iter_rules()}
+        self.assertEqual(endpoints - set(results), set())
+        # The event streams were hung up on
+        self.assertEqual(self.flask_app.extensions['events'].subscriber_count(), 0)
+        for route, stats in results.items():
+            self.assertEqual(stats['errors'], 0, route)
+            self.assertLessEqual(stats['p50_ms'], stats['p95_ms'])
+            self.assertLessEqual(stats['p95_ms'], stats['p99_ms'])
+
+    def test_compare_flags_regressions(self):
+        """Test that only routes beyond the tolerance are reported"""
+        baseline = {'routes': {'fast': {'p95_ms': 10.0}, 'slow': {'p95_ms': 10.0}}}
+        results = {'fast': {'p95_ms': 12.0}, 'slow': {'p95_ms': 13.0}, 'new': {'p95_ms': 99.0}}
+        regressions = benchmark.compare(results, baseline, tolerance=0.25)
+        self.assertEqual([route for route, _, _ in regressions], ['slow'])
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 0.50), 50)
+        self.assertEqual(benchmark.percentile(values, 0.99), 99)
+        self.assertEqual(benchmark.percentile([], 0.5), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
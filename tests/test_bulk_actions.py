@@ -0,0 +1,91 @@
+import unittest
+import json
+from app import create_app, db, Todo, TodoList
+
+
+class BulkListActionsTestCase(unittest.TestCase):
+    """Tests for the set-based complete all / uncomplete all / clear completed"""
+
+    def setUp(self):
+        """Set up a list with two open and one completed todo"""
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app = self.flask_app.test_client()
+
+        with self.flask_app.app_context():
+            db.create_all()
+            todo_list = TodoList(name='Bulk List')
+            other_list = TodoList(name='Other List')
+            db.session.add(todo_list)
+            db.session.add(other_list)
+            db.session.commit()
+            db.session.add(Todo(description='Open 1', todolist_id=todo_list.id))
+            db.session.add(Todo(description='Open 2', todolist_id=todo_list.id))
+            db.session.add(Todo(description='Done', todolist_id=todo_list.id, completed=True))
+            db.session.add(Todo(description='Elsewhere', todolist_id=other_list.id, completed=True))
+            db.session.commit()
+            self.list_id = todo_list.id
+            self.other_id = other_list.id
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_complete_all_returns_changed_count(self):
+        """Test that complete all only counts the rows it changed"""
+        response = self.app.put(f'/todos/{self.list_id}')
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertTrue(data['successful'])
+        self.assertEqual(data['count'], 2)
+
+        with self.flask_app.app_context():
+            todos = Todo.query.filter_by(todolist_id=self.list_id).all()
+            self.assertTrue(all(todo.completed for todo in todos))
+
+    def test_uncomplete_all(self):
+        """Test that PUT with completed false clears every checkbox in the list"""
+        response = self.app.put(f'/todos/{self.list_id}',
+                                data=json.dumps({'completed': False}),
+                                content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['count'], 1)
+
+        with self.flask_app.app_context():
+            todos = Todo.query.filter_by(todolist_id=self.list_id).all()
+            self.assertFalse(any(todo.completed for todo in todos))
+            # Other lists are untouched
+            other = Todo.query.filter_by(todolist_id=self.other_id).one()
+            self.assertTrue(other.completed)
+
+    def test_non_boolean_completed_rejected(self):
+        """Test that a completed value that is not a JSON boolean changes nothing"""
+        response = self.app.put(f'/todos/{self.list_id}',
+                                data=json.dumps({'completed': 'false'}),
+                                content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        with self.flask_app.app_context():
+            self.assertEqual(Todo.query.filter_by(todolist_id=self.list_id, completed=True).count(), 1)
+
+    def test_clear_completed(self):
+        """Test that clear completed deletes only the completed todos of the list"""
+        response = self.app.delete(f'/todos/{self.list_id}/completed')
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertTrue(data['successful'])
+        self.assertEqual(data['count'], 1)
+
+        with self.flask_app.app_context():
+            remaining = Todo.query.filter_by(todolist_id=self.list_id).all()
+            self.assertEqual(sorted(t.description for t in remaining), ['Open 1', 'Open 2'])
+            self.assertEqual(Todo.query.filter_by(todolist_id=self.other_id).count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import gzip
+import unittest
+import json
+from app import create_app, db, TodoList
+import compression
+
+
+class CompressionTestCase(unittest.TestCase):
+    """Tests for Accept-Encoding negotiated response compression"""
+
+    def setUp(self):
+        """Set up a list with enough todos for the page to be worth compressing"""
+        self.flask_app = create_app({'TESTING': True})
+        self.app = self.flask_app.test_client()
+        self.assets = self.flask_app.extensions['assets']
+        self.compress = self.flask_app.extensions['compress']
+
+        with self.flask_app.app_context():
+            db.create_all()
+            todo_list = TodoList(name='Big List')
+            db.session.add(todo_list)
+            db.session.commit()
+            self.list_id = todo_list.id
+        self.app.post(f'/todos/{self.list_id}',
+                      data=json.dumps({'descriptions': [f'Todo number {i}' for i in range(50)]}),
+                      content_type='application/json')
+
+    def tearDown(self):
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_gzip_html(self):
+        """Test that a large page is gzipped when the client accepts gzip"""
+        plain = self.app.get(f'/todos/{self.list_id}')
+        response = self.app.get(f'/todos/{self.list_id}', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertLess(len(response.data), len(plain.data))
+
+    def test_no_compression_without_accept_encoding(self):
+        """Test that clients that don't ask for compression get identity bodies"""
+        response = self.app.get(f'/todos/{self.list_id}', headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+
+    def test_small_bodies_are_not_compressed(self):
+        """Test that bodies under COMPRESS_MIN_SIZE are left alone"""
+        response = self.app.get('/api/lists', headers={'Accept-Encoding': 'gzip'})
+        self.assertLess(len(response.data), self.flask_app.config['COMPRESS_MIN_SIZE'])
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    @unittest.skipIf(compression.brotli is None, 'brotli is not installed')
+    def test_brotli_preferred_when_available(self):
+        """Test that brotli wins over gzip when both are accepted"""
+        response = self.app.get(f'/todos/{self.list_id}', headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+
+    def test_static_assets_precompressed(self):
+        """Test that assets are served from the startup precompression cache"""
+        digest = self.assets.get('js/app.js').digest
+        self.assertIn((digest, 'gzip'), self.compress.cache)
+
+        response = self.app.get(self.assets.url('js/app.js'), headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.data, self.compress.cache[(digest, 'gzip')])
+        self.assertEqual(gzip.decompress(response.data), self.assets.get('js/app.js').data)
+
+        # The weak ETag of the compressed variant still revalidates
+        cached = self.app.get(self.assets.url('js/app.js'),
+                              headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.headers['ETag'], response.headers['ETag'])
+        self.assertIn('Accept-Encoding', cached.headers['Vary'])
+
+    def test_not_modified_repeats_validators(self):
+        """Test that a cached page's 304 carries the ETag and Vary of the 200 it validates"""
+        for encoding in ('gzip', 'identity'):
+            page = self.app.get(f'/todos/{self.list_id}', headers={'Accept-Encoding': encoding})
+            cached = self.app.get(f'/todos/{self.list_id}',
+                                  headers={'Accept-Encoding': encoding, 'If-None-Match': page.headers['ETag']})
+
+            self.assertEqual(cached.status_code, 304, encoding)
+            self.assertEqual(cached.headers['ETag'], page.headers['ETag'], encoding)
+            self.assertIn('Accept-Encoding', cached.headers['Vary'], encoding)
+
+
+if __name__ == '__main__':
+    unittest.main()
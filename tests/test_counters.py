@@ -0,0 +1,89 @@
+import unittest
+import json
+from sqlalchemy import text
+from app import create_app, db, TodoList
+
+
+class ListCountersTestCase(unittest.TestCase):
+    """Tests for the trigger-maintained todo_count and completed_count"""
+
+    def setUp(self):
+        """Set up an empty list"""
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app = self.flask_app.test_client()
+
+        with self.flask_app.app_context():
+            db.create_all()
+            todo_list = TodoList(name='Counted List')
+            db.session.add(todo_list)
+            db.session.commit()
+            self.list_id = todo_list.id
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def send(self, method, url, body=None):
+        response = self.app.open(url, method=method, data=json.dumps(body) if body is not None else None,
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)
+
+    def counts(self):
+        with self.flask_app.app_context():
+            todo_list = db.session.get(TodoList, self.list_id)
+            return todo_list.completed_count, todo_list.todo_count
+
+    def test_counts_follow_every_route(self):
+        """Test that creating, toggling and deleting todos keeps the counts exact"""
+        url = f'/todos/{self.list_id}'
+        first = self.send('POST', url, {'description': 'One', 'todolist_id': self.list_id})['id']
+        ids = self.send('POST', url, {'descriptions': ['Two', 'Three', 'Four']})['ids']
+        self.assertEqual(self.counts(), (0, 4))
+
+        self.send('PATCH', f'{url}/{first}', {'completed': True})
+        self.assertEqual(self.counts(), (1, 4))
+        self.send('PATCH', url, {'todos': [{'id': ids[0], 'completed': True},
+                                           {'id': first, 'completed': False}]})
+        self.assertEqual(self.counts(), (1, 4))
+        self.send('PUT', url)
+        self.assertEqual(self.counts(), (4, 4))
+        self.send('PUT', url, {'completed': False})
+        self.assertEqual(self.counts(), (0, 4))
+
+        self.send('PATCH', f'{url}/{ids[1]}', {'completed': True})
+        self.send('DELETE', f'{url}/{ids[2]}')
+        self.assertEqual(self.counts(), (1, 3))
+        self.send('DELETE', f'{url}/completed')
+        self.assertEqual(self.counts(), (0, 2))
+
+    def test_counts_shown_in_sidebar_and_api(self):
+        """Test that list summaries come straight from the counters"""
+        self.send('POST', f'/todos/{self.list_id}', {'descriptions': ['One', 'Two', 'Three']})
+        self.send('PUT', f'/todos/{self.list_id}')
+        self.send('POST', f'/todos/{self.list_id}', {'descriptions': ['Four']})
+
+        page = self.app.get(f'/todos/{self.list_id}')
+        self.assertIn(b'3/4 done', page.data)
+        lists = json.loads(self.app.get('/api/lists').data)['lists']
+        self.assertEqual((lists[0]['completed_count'], lists[0]['todo_count']), (3, 4))
+
+    def test_repair_counts(self):
+        """Test that repair-counts fixes counts that drifted"""
+        self.send('POST', f'/todos/{self.list_id}', {'descriptions': ['One', 'Two']})
+        with self.flask_app.app_context():
+            db.session.execute(text('UPDATE todolist SET todo_count = 7, completed_count = 5'))
+            db.session.commit()
+
+        result = self.flask_app.test_cli_runner().invoke(args=['repair-counts'])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('Repaired the counts of 1 lists', result.output)
+        self.assertEqual(self.counts(), (0, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 import json
-from app import app, db
+from app import create_app, db
 
 
 class StarterTaskDeleteFeatureTest(unittest.TestCase):
@@ -8,20 +8,16 @@ class StarterTaskDeleteFeatureTest(unittest.TestCase):
     
     def setUp(self):
         """setup before each test"""
-        self.app = app.test_client()
-        app.config['TESTING'] = True
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app = self.flask_app.test_client()
         
-        # Clear any previously deleted tasks for clean test
-        if hasattr(app, 'deleted_starter_tasks'):
-            app.deleted_starter_tasks.clear()
-        
-        with app.app_context():
+        with self.flask_app.app_context():
             db.create_all()
     
     def tearDown(self):
         """cleanup after test"""
-        with app.app_context():
+        with self.flask_app.app_context():
             db.session.remove()
             db.drop_all()
     
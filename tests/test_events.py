@@ -0,0 +1,120 @@
+import unittest
+import json
+from app import create_app, db, TodoList
+from events import ChangeFeed
+
+
+class ChangeFeedTestCase(unittest.TestCase):
+    """Tests for the in-process publish/subscribe of list changes"""
+
+    def test_publish_reaches_only_that_list(self):
+        """Test that subscribers only get their own list's events"""
+        feed = ChangeFeed()
+        mine = feed.subscribe(1)
+        other = feed.subscribe(2)
+        feed.publish(1, 'todo_created', {'id': 5})
+
+        self.assertEqual(mine.get_nowait(), ('todo_created', {'id': 5}))
+        self.assertTrue(other.empty())
+
+        feed.publish_all('list_created', {'id': 3})
+        self.assertEqual(mine.get_nowait()[0], 'list_created')
+        self.assertEqual(other.get_nowait()[0], 'list_created')
+
+        feed.unsubscribe(1, mine)
+        feed.unsubscribe(2, other)
+        self.assertEqual(feed.subscriber_count(), 0)
+
+    def test_slow_subscriber_gets_resync(self):
+        """Test that overflowing a subscriber's queue collapses it into a resync"""
+        feed = ChangeFeed()
+        feed.queue_size = 2
+        subscriber = feed.subscribe(1)
+        for i in range(5):
+            feed.publish(1, 'todo_updated', {'id': i})
+
+        self.assertEqual(subscriber.get_nowait(), ('resync', {}))
+
+
+class ListEventsRouteTestCase(unittest.TestCase):
+    """Tests for GET /todos/<list_id>/events"""
+
+    def setUp(self):
+        """Set up stuff before each test"""
+        self.flask_app = create_app({'TESTING': True})
+        self.app = self.flask_app.test_client()
+        self.changes = self.flask_app.extensions['events']
+
+        with self.flask_app.app_context():
+            db.create_all()
+            todo_list = TodoList(name='Live List')
+            db.session.add(todo_list)
+            db.session.commit()
+            self.list_id = todo_list.id
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_mutations_are_pushed(self):
+        """Test that creating and toggling a todo shows up on the stream"""
+        response = self.app.get(f'/todos/{self.list_id}/events', buffered=False)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        frames = iter(response.response)
+        self.assertTrue(next(frames).startswith(b'retry:'))
+
+        created = self.app.post(f'/todos/{self.list_id}',
+                                data=json.dumps({'description': 'Pushed', 'todolist_id': self.list_id}),
+                                content_type='application/json')
+        todo_id = json.loads(created.data)['id']
+        self.app.patch(f'/todos/{self.list_id}/{todo_id}',
+                       data=json.dumps({'completed': True}),
+                       content_type='application/json')
+
+        frame = next(frames).decode()
+        self.assertIn('event: todo_created', frame)
+        self.assertEqual(json.loads(frame.split('data: ', 1)[1])['description'], 'Pushed')
+        frame = next(frames).decode()
+        self.assertIn('event: todo_updated', frame)
+        # Encoded by the app's JSON provider, like the responses
+        self.assertIn('data: ' + self.flask_app.json.dumps({'id': todo_id, 'completed': True}) + '\n', frame)
+
+        response.close()
+        self.assertEqual(self.changes.subscriber_count(), 0)
+
+    def test_streams_over_the_cap_are_told_to_retry(self):
+        """Test that beyond EVENTS_MAX_STREAMS a stream ends after its retry frame"""
+        self.changes.max_streams = 1
+        response = self.app.get(f'/todos/{self.list_id}/events', buffered=False)
+        frames = iter(response.response)
+        next(frames)
+
+        refused = self.app.get(f'/todos/{self.list_id}/events')
+        self.assertEqual(refused.status_code, 200)
+        self.assertEqual(refused.data.decode(), self.changes.retry_frame())
+        # Requests other than streams are still served
+        self.assertEqual(self.app.get('/api/lists').status_code, 200)
+
+        response.close()
+        self.assertEqual((self.changes.streams, self.changes.subscriber_count()), (0, 0))
+        response = self.app.get(f'/todos/{self.list_id}/events', buffered=False)
+        next(iter(response.response))
+        self.assertEqual(self.changes.streams, 1)
+        response.close()
+
+    def test_close_ends_streams(self):
+        """Test that closing the feed ends the open streams and turns new ones away"""
+        response = self.app.get(f'/todos/{self.list_id}/events', buffered=False)
+        frames = iter(response.response)
+        next(frames)
+
+        self.changes.close()
+        self.assertEqual(list(frames), [])
+        self.assertEqual(self.changes.subscriber_count(), 0)
+        self.assertEqual(self.app.get(f'/todos/{self.list_id}/events').data.decode(), self.changes.retry_frame())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import json
+from app import create_app, db, Todo, TodoList
+
+
+class ExportImportTestCase(unittest.TestCase):
+    """Tests for the NDJSON list export and chunked import"""
+
+    def setUp(self):
+        """Set up a list of five todos, two of them completed"""
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                                     'TODO_EXPORT_CHUNK_SIZE': 2,
+                                     'TODO_IMPORT_CHUNK_SIZE': 2})
+        self.app = self.flask_app.test_client()
+
+        with self.flask_app.app_context():
+            db.create_all()
+            todo_list = TodoList(name='Moving List')
+            db.session.add(todo_list)
+            db.session.commit()
+            db.session.add_all([Todo(description=f'Todo {i}', todolist_id=todo_list.id,
+                                     completed=i < 2) for i in range(5)])
+            db.session.commit()
+            self.list_id = todo_list.id
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def import_lines(self, lines, query=''):
+        body = ''.join(json.dumps(line) + '\n' for line in lines)
+        return self.app.post(f'/api/lists/import{query}', data=body,
+                             content_type='application/x-ndjson')
+
+    def test_export_streams_ndjson(self):
+        """Test that the export is a list line followed by every todo in order"""
+        response = self.app.get(f'/api/lists/{self.list_id}/export')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertTrue(response.is_streamed)
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(lines[0], {'type': 'list', 'id': self.list_id, 'name': 'Moving List'})
+        self.assertEqual([line['description'] for line in lines[1:]], [f'Todo {i}' for i in range(5)])
+        self.assertEqual([line['completed'] for line in lines[1:]], [True, True, False, False, False])
+
+    def test_export_unknown_list(self):
+        """Test that exporting a missing list is a 404"""
+        self.assertEqual(self.app.get('/api/lists/9999/export').status_code, 404)
+
+    def test_round_trip(self):
+        """Test that importing an export recreates the list"""
+        exported = self.app.get(f'/api/lists/{self.list_id}/export').data
+
+        response = self.app.post('/api/lists/import', data=exported,
+                                 content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertNotEqual(data['id'], self.list_id)
+        self.assertEqual(data['name'], 'Moving List')
+        self.assertEqual(data['imported'], 5)
+        self.assertIn('rows_per_second', data)
+        with self.flask_app.app_context():
+            todos = Todo.query.filter_by(todolist_id=data['id']).order_by(Todo.id).all()
+            self.assertEqual([todo.description for todo in todos], [f'Todo {i}' for i in range(5)])
+            self.assertEqual(sum(todo.completed for todo in todos), 2)
+
+    def test_import_without_list_line(self):
+        """Test that a bare list of todos is imported under ?name="""
+        response = self.import_lines([{'type': 'todo', 'description': 'Only todo'}], '?name=Bare')
+
+        data = json.loads(response.data)
+        self.assertEqual(data['name'], 'Bare')
+        self.assertEqual(data['imported'], 1)
+
+    def test_invalid_line_rolls_back_import(self):
+        """Test that a bad line after several chunks leaves no list behind"""
+        lines = [{'type': 'list', 'name': 'Broken'}]
+        lines += [{'type': 'todo', 'description': f'Todo {i}'} for i in range(5)]
+        lines.append({'type': 'todo', 'description': ''})
+
+        response = self.import_lines(lines)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)['line'], 7)
+        with self.flask_app.app_context():
+            self.assertIsNone(TodoList.query.filter_by(name='Broken').first())
+            self.assertEqual(Todo.query.count(), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from alembic.script import ScriptDirectory
+from app import create_app, db, migrate
+
+
+class AppFactoryTestCase(unittest.TestCase):
+    """Tests for create_app() and the lazy schema setup"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'todo.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def file_app(self):
+        app = create_app({'TESTING': True, 'TODO_STORAGE': 'file', 'TODO_SQLITE_PATH': self.db_path})
+        self.addCleanup(self.dispose, app)
+        return app
+
+    def dispose(self, app):
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    def test_apps_are_isolated(self):
+        """Test that each app gets its own in-memory database"""
+        first = create_app({'TESTING': True})
+        second = create_app({'TESTING': True})
+
+        first.test_client().post('/todos', json={'name': 'Only Here'})
+
+        self.assertEqual(len(first.test_client().get('/api/lists').get_json()['lists']), 1)
+        self.assertEqual(second.test_client().get('/api/lists').get_json()['lists'], [])
+
+    def test_create_app_does_not_touch_the_database(self):
+        """Test that the database is only opened by the first request"""
+        app = self.file_app()
+        self.assertFalse(os.path.exists(self.db_path))
+
+        response = app.test_client().get('/api/lists')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(os.path.exists(self.db_path))
+
+    def test_new_database_stamped_at_head(self):
+        """Test that a new file database is created from the models and stamped"""
+        self.file_app().test_client().post('/todos', json={'name': 'Stamped List'})
+
+        with sqlite3.connect(self.db_path) as conn:
+            version = conn.execute('SELECT version_num FROM alembic_version').fetchone()[0]
+        self.assertEqual(version, ScriptDirectory(migrate.directory).get_current_head())
+
+        # A later process upgrades the stamped database instead of recreating it
+        lists = self.file_app().test_client().get('/api/lists').get_json()['lists']
+        self.assertEqual([todo_list['name'] for todo_list in lists], ['Stamped List'])
+
+    def test_cli_sets_up_schema(self):
+        """Test that CLI commands work against a database nothing has created yet"""
+        result = self.file_app().test_cli_runner().invoke(args=['repair-counts'])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('Repaired the counts of 0 lists', result.output)
+
+
+if __name__ == '__main__':
+    unittest.main()
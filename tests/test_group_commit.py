@@ -0,0 +1,117 @@
+import threading
+import unittest
+import json
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import insert
+from app import create_app, db, Todo, TodoList
+
+
+class GroupCommitTestCase(unittest.TestCase):
+    """Tests for batching single-todo writes through the group commit writer"""
+
+    def setUp(self):
+        """Set up a list and turn group commit on"""
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                                     'GROUP_COMMIT_ENABLED': True,
+                                     'GROUP_COMMIT_MAX_DELAY_MS': 50})
+        self.app = self.flask_app.test_client()
+        self.group_commit = self.flask_app.extensions['group_commit']
+
+        with self.flask_app.app_context():
+            db.create_all()
+            todo_list = TodoList(name='Busy List')
+            db.session.add(todo_list)
+            db.session.commit()
+            self.list_id = todo_list.id
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def insert_todo(self, description):
+        return lambda conn: conn.execute(
+            insert(Todo).values(description=description, todolist_id=self.list_id, completed=False)
+            .returning(Todo.id)).scalar_one()
+
+    def test_routes_write_through_the_batcher(self):
+        """Test that create, update and delete still work and report their results"""
+        batches = self.group_commit.batch_sizes.count()
+
+        created = self.app.post(f'/todos/{self.list_id}', data=json.dumps(
+            {'description': 'Batched', 'todolist_id': self.list_id}), content_type='application/json')
+        todo_id = json.loads(created.data)['id']
+        updated = self.app.patch(f'/todos/{self.list_id}/{todo_id}', data=json.dumps(
+            {'completed': True}), content_type='application/json')
+        self.assertEqual(json.loads(updated.data), {'completed': True})
+        deleted = self.app.delete(f'/todos/{self.list_id}/{todo_id}')
+        self.assertTrue(json.loads(deleted.data)['successful'])
+
+        self.assertEqual(self.group_commit.batch_sizes.count(), batches + 3)
+        with self.flask_app.app_context():
+            self.assertEqual(Todo.query.count(), 0)
+
+    def test_concurrent_writes_share_commits(self):
+        """Test that writes arriving together are committed as one batch"""
+        batches = self.group_commit.batch_sizes.count()
+
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            ids = list(pool.map(self.group_commit.submit,
+                                [self.insert_todo(f'Todo {i}') for i in range(20)]))
+
+        self.assertEqual(len(set(ids)), 20)
+        self.assertLess(self.group_commit.batch_sizes.count() - batches, 20)
+        with self.flask_app.app_context():
+            self.assertEqual(Todo.query.count(), 20)
+
+    def test_failed_operation_only_fails_its_caller(self):
+        """Test that one bad operation is rolled back alone"""
+        operations = [self.insert_todo('Good 1'), self.insert_todo(None), self.insert_todo('Good 2')]
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(self.group_commit.submit, operation) for operation in operations]
+        errors = [future.exception() for future in futures]
+
+        self.assertIsNone(errors[0])
+        self.assertIsNotNone(errors[1])
+        self.assertIsNone(errors[2])
+        with self.flask_app.app_context():
+            self.assertEqual(sorted(todo.description for todo in Todo.query.all()), ['Good 1', 'Good 2'])
+
+    def test_timed_out_write_is_never_committed(self):
+        """Test that a write whose caller gave up while the writer was busy is skipped"""
+        self.flask_app.config['GROUP_COMMIT_TIMEOUT_SECONDS'] = 0.2
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocking(conn):
+            started.set()
+            release.wait()
+            return self.insert_todo('Slow')(conn)
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            slow = pool.submit(self.group_commit.submit, blocking)
+            started.wait()
+            with self.assertRaises(TimeoutError):
+                self.group_commit.submit(self.insert_todo('Abandoned'))
+            release.set()
+            # Already running when its caller timed out, so it waits for the outcome
+            self.assertIsInstance(slow.result(), int)
+        self.group_commit.submit(self.insert_todo('After'))
+
+        with self.flask_app.app_context():
+            self.assertEqual(sorted(todo.description for todo in Todo.query.all()), ['After', 'Slow'])
+
+    def test_metrics_exported(self):
+        """Test that batch sizes and queue depth show up on /metrics"""
+        self.group_commit.submit(self.insert_todo('Counted'))
+
+        body = self.app.get('/metrics').data.decode()
+        self.assertIn('todo_group_commit_batch_size_count', body)
+        self.assertIn('todo_group_commit_queue_depth 0', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import datetime
+import unittest
+from app import create_app, db, Todo, TodoList
+from jsonprovider import OrjsonProvider, StdlibProvider, columnar, orjson
+
+
+class ColumnarFormatTestCase(unittest.TestCase):
+    """Tests for ?format=columnar on the collection endpoints"""
+
+    def setUp(self):
+        """Set up two lists, the first with three todos"""
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app = self.flask_app.test_client()
+
+        with self.flask_app.app_context():
+            db.create_all()
+            first = TodoList(name='First List')
+            second = TodoList(name='Second List')
+            db.session.add_all([first, second])
+            db.session.commit()
+            db.session.add_all([Todo(description=f'Todo {i}', todolist_id=first.id, completed=i == 1)
+                                for i in range(3)])
+            db.session.commit()
+            self.list_id = first.id
+            self.other_id = second.id
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_todos_columnar(self):
+        """Test that the todos come back as parallel arrays matching the row format"""
+        rows = self.app.get(f'/api/lists/{self.list_id}/todos').get_json()
+        columns = self.app.get(f'/api/lists/{self.list_id}/todos?format=columnar').get_json()
+
+        self.assertEqual(columns['todos'], {
+            'id': [todo['id'] for todo in rows['todos']],
+            'description': ['Todo 0', 'Todo 1', 'Todo 2'],
+            'completed': [False, True, False],
+        })
+        self.assertIsNone(columns['next_after'])
+
+    def test_columnar_pages(self):
+        """Test that the keyset cursor works the same in the columnar format"""
+        first = self.app.get(f'/api/lists/{self.list_id}/todos?format=columnar&limit=2').get_json()
+        second = self.app.get(f'/api/lists/{self.list_id}/todos?format=columnar&limit=2'
+                              f'&after={first["next_after"]}').get_json()
+
+        self.assertEqual(first['todos']['description'], ['Todo 0', 'Todo 1'])
+        self.assertEqual(second['todos']['description'], ['Todo 2'])
+        self.assertIsNone(second['next_after'])
+
+    def test_lists_and_search_columnar(self):
+        """Test that the lists and search endpoints take the format too"""
+        lists = self.app.get('/api/lists?format=columnar').get_json()['lists']
+        found = self.app.get('/api/search?q=todo&format=columnar').get_json()['todos']
+
+        self.assertEqual(lists, {'id': [self.list_id, self.other_id], 'name': ['First List', 'Second List'],
+                                 'todo_count': [3, 0], 'completed_count': [1, 0]})
+        self.assertEqual(found['list_id'], [self.list_id] * 3)
+        self.assertEqual(sorted(found['description']), ['Todo 0', 'Todo 1', 'Todo 2'])
+
+    def test_empty_columnar(self):
+        """Test that an empty page still has every column"""
+        todos = self.app.get(f'/api/lists/{self.other_id}/todos?format=columnar').get_json()['todos']
+        self.assertEqual(todos, {'id': [], 'description': [], 'completed': []})
+
+    def test_unknown_format_rejected(self):
+        """Test that an unknown format is a bad request"""
+        response = self.app.get(f'/api/lists/{self.list_id}/todos?format=xml')
+        self.assertEqual(response.status_code, 400)
+
+    def test_columnar_is_smaller(self):
+        """Test that the columnar body is smaller than the row one"""
+        rows = self.app.get(f'/api/lists/{self.list_id}/todos').data
+        columns = self.app.get(f'/api/lists/{self.list_id}/todos?format=columnar').data
+        self.assertLess(len(columns), len(rows))
+
+
+class JSONProviderTestCase(unittest.TestCase):
+    """Tests for the choice of JSON backend and its output"""
+
+    def test_stdlib_backend(self):
+        """Test that TODO_JSON_BACKEND=stdlib keeps Flask's provider"""
+        app = create_app({'TESTING': True, 'TODO_JSON_BACKEND': 'stdlib'})
+        self.assertIsInstance(app.json, StdlibProvider)
+        self.assertNotIsInstance(app.json, OrjsonProvider)
+        self.assertEqual(app.test_client().post('/todos', json={'name': 'Plain'}).get_json()['name'], 'Plain')
+
+    def test_unknown_backend_rejected(self):
+        """Test that a misspelt backend fails at startup"""
+        with self.assertRaises(ValueError):
+            create_app({'TESTING': True, 'TODO_JSON_BACKEND': 'ujson'})
+
+    @unittest.skipIf(orjson is None, 'orjson is not installed')
+    def test_orjson_matches_stdlib(self):
+        """Test that both backends decode to the same values"""
+        fast = create_app({'TESTING': True})
+        plain = create_app({'TESTING': True, 'TODO_JSON_BACKEND': 'stdlib'})
+        self.assertIsInstance(fast.json, OrjsonProvider)
+
+        value = {'b': [1, 2.5, None, True], 'a': 'café', 'c': datetime.datetime(2024, 5, 1, 12, 30)}
+        with fast.app_context():
+            fast_body = fast.json.response(value).get_data()
+        with plain.app_context():
+            plain_body = plain.json.response(value).get_data()
+
+        self.assertEqual(fast.json.loads(fast_body), plain.json.loads(plain_body))
+        self.assertEqual(fast.json.loads(fast_body)['c'], 'Wed, 01 May 2024 12:30:00 GMT')
+        self.assertTrue(fast_body.endswith(b'\n'))
+
+    @unittest.skipIf(orjson is None, 'orjson is not installed')
+    def test_orjson_rejects_invalid_json(self):
+        """Test that invalid JSON is a ValueError and a bad request, as with the stdlib"""
+        app = create_app({'TESTING': True})
+        with self.assertRaises(ValueError):
+            app.json.loads('{"name": ')
+
+        response = app.test_client().post('/api/lists/import', data='{"type": "list", "name": \n')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['error'], 'not valid JSON')
+
+    def test_columnar_helper(self):
+        """Test that rows are transposed in field order"""
+        self.assertEqual(columnar([(1, 'a'), (2, 'b')], ('id', 'name')), {'id': [1, 2], 'name': ['a', 'b']})
+        self.assertEqual(columnar([], ('id', 'name')), {'id': [], 'name': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import json
+from app import create_app, db, TodoList
+
+
+class MetricsTestCase(unittest.TestCase):
+    """Tests for the /metrics endpoint and per-request instrumentation"""
+
+    def setUp(self):
+        """Set up stuff before each test"""
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app = self.flask_app.test_client()
+        self.metrics = self.flask_app.extensions['metrics']
+
+        with self.flask_app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_metrics_exposed_in_prometheus_format(self):
+        """Test that /metrics serves the request series in text format"""
+        self.app.post('/todos', data=json.dumps({'name': 'Metrics List'}),
+                      content_type='application/json')
+
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.data.decode()
+        self.assertIn('# TYPE todo_http_request_duration_seconds histogram', text)
+        self.assertIn('todo_http_requests_total{endpoint="create_list",method="POST",status="200"}', text)
+        self.assertIn('todo_http_request_duration_seconds_bucket{endpoint="create_list",method="POST",le="+Inf"}', text)
+        self.assertIn('todo_sql_statements_per_request_count{endpoint="create_list"}', text)
+
+    def test_sql_statements_counted_per_request(self):
+        """Test that SQL statements issued by a request are counted"""
+        with self.flask_app.app_context():
+            db.session.add(TodoList(name='Counted List'))
+            db.session.commit()
+
+        before = self.metrics.sql_statements.count('api_get_lists')
+        sql_before = self.metrics.sql_statements.values.get(('api_get_lists',), [0.0])[-1]
+        self.app.get('/api/lists')
+
+        self.assertEqual(self.metrics.sql_statements.count('api_get_lists'), before + 1)
+        sql_after = self.metrics.sql_statements.values[('api_get_lists',)][-1]
+        self.assertEqual(sql_after - sql_before, 1)
+
+    def test_in_flight_returns_to_zero(self):
+        """Test that the in-flight gauge is released after each request"""
+        self.app.get('/api/lists')
+        self.app.get('/todos/welcome')
+        self.assertEqual(self.metrics.in_flight.get('api_get_lists'), 0)
+        self.assertEqual(self.metrics.in_flight.get('get_todo_list'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask_migrate import upgrade
+from sqlalchemy import text
+from app import create_app, db, migrate
+
+
+class MigrationsTestCase(unittest.TestCase):
+    """Test that the migrations build the same schema as the models"""
+
+    def setUp(self):
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        with self.flask_app.app_context():
+            # Start from an empty database so every revision runs
+            upgrade(directory=migrate.directory)
+
+    def tearDown(self):
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_migrations_match_models(self):
+        """Test that autogenerate finds nothing left to migrate"""
+        with self.flask_app.app_context():
+            with db.engine.connect() as conn:
+                diff = compare_metadata(
+                    MigrationContext.configure(conn, opts=migrate.alembic_ctx_kwargs), db.metadata)
+        self.assertEqual(diff, [])
+
+    def test_list_queries_use_index(self):
+        """Test that fetching a list's todos is an index range scan"""
+        with self.flask_app.app_context():
+            plan = db.session.execute(text(
+                'EXPLAIN QUERY PLAN SELECT id, description FROM todo '
+                'WHERE todolist_id = 1 ORDER BY id')).all()
+            incomplete_plan = db.session.execute(text(
+                'EXPLAIN QUERY PLAN SELECT id FROM todo '
+                'WHERE todolist_id = 1 AND completed = 0 ORDER BY id')).all()
+        self.assertIn('ix_todo_todolist_id_id', ' '.join(row[-1] for row in plan))
+        self.assertIn('ix_todo_todolist_id_incomplete', ' '.join(row[-1] for row in incomplete_plan))
+
+
+if __name__ == '__main__':
+    unittest.main()
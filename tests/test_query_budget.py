@@ -0,0 +1,111 @@
+import unittest
+from sqlalchemy import select
+from app import create_app, db, ensure_schema, Todo, TodoList
+from querybudget import QueryBudgetExceeded, budget, query_budget
+
+
+class QueryBudgetTestCase(unittest.TestCase):
+    """Tests for the SQL statement budgets and the read paths they guard"""
+
+    def setUp(self):
+        """Set up ten lists of five todos each, with a view over its budget"""
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                                     'RESPONSE_CACHE_ENABLED': False})
+        self.app = self.flask_app.test_client()
+
+        @budget(1)
+        def two_queries():
+            db.session.scalar(select(TodoList.id).limit(1))
+            db.session.scalar(select(Todo.id).limit(1))
+            return 'done'
+        self.flask_app.add_url_rule('/two-queries', view_func=two_queries)
+
+        # Set up the schema now, so that it is not counted against the first request
+        ensure_schema(self.flask_app)
+        with self.flask_app.app_context():
+            lists = [TodoList(name=f'List {n}') for n in range(10)]
+            db.session.add_all(lists)
+            db.session.commit()
+            db.session.add_all([Todo(description=f'Todo {n}.{i}', todolist_id=todo_list.id, completed=i < 2)
+                                for n, todo_list in enumerate(lists) for i in range(5)])
+            db.session.commit()
+            self.list_ids = [todo_list.id for todo_list in lists]
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_query_budget_block(self):
+        """Test that a block over its budget fails and lists the statements"""
+        with self.flask_app.app_context():
+            with query_budget(1) as statements:
+                db.session.scalar(select(TodoList.id).limit(1))
+            self.assertEqual(len(statements), 1)
+
+            with self.assertRaises(QueryBudgetExceeded) as raised:
+                with query_budget(1, 'two selects'):
+                    db.session.scalar(select(TodoList.id).limit(1))
+                    db.session.scalar(select(Todo.id).limit(1))
+        self.assertEqual(len(raised.exception.statements), 2)
+        self.assertIn('two selects issued 2 SQL statements, budget is 1', str(raised.exception))
+
+    def test_endpoint_over_budget_fails_under_testing(self):
+        """Test that a view issuing more statements than budgeted raises in tests"""
+        with self.assertRaises(QueryBudgetExceeded):
+            self.app.get('/two-queries')
+
+    def test_endpoint_over_budget_counted_when_not_enforced(self):
+        """Test that outside tests an overrun is served, logged and counted"""
+        self.flask_app.config['QUERY_BUDGET_ENFORCED'] = False
+        with self.assertLogs('querybudget', 'WARNING'):
+            response = self.app.get('/two-queries')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.flask_app.extensions['query_budget'].overruns, {'two_queries': 2})
+        self.assertIn('todo_query_budget_exceeded_total{endpoint="two_queries"} 1',
+                      self.app.get('/metrics').data.decode())
+
+    def test_read_paths_take_one_statement(self):
+        """Test that the pages and read API cost one statement however many lists there are"""
+        list_id = self.list_ids[3]
+        for url in ['/', f'/todos/{list_id}', '/todos/welcome', '/todos/999', '/api/lists',
+                    f'/api/lists/{list_id}/todos', '/api/search?q=todo']:
+            with query_budget(1, url):
+                self.assertLess(self.app.get(url).status_code, 400, url)
+
+    def test_page_shows_its_own_todos(self):
+        """Test that the single page query keeps the sidebar and the todos apart"""
+        list_id = self.list_ids[3]
+        page = self.app.get(f'/todos/{list_id}').data.decode()
+
+        self.assertIn('Items - List 3', page)
+        self.assertEqual(page.count('<span>Todo 3.'), 5)
+        self.assertNotIn('<span>Todo 4.', page)
+        self.assertEqual(page.count('class="list-count">2/5 done'), 10)
+        self.assertEqual(page.count(' checked '), 2)
+
+    def test_index_redirects_to_first_live_list(self):
+        """Test that / picks the first list that is not being deleted"""
+        self.app.delete(f'/todos/{self.list_ids[0]}')
+
+        response = self.app.get('/')
+
+        self.assertTrue(response.headers['Location'].endswith(f'/todos/{self.list_ids[1]}'))
+
+    def test_batch_create_is_one_insert(self):
+        """Test that a batch create does not issue an INSERT per todo"""
+        with query_budget(2):
+            response = self.app.post(f'/todos/{self.list_ids[0]}',
+                                     json={'descriptions': [f'Batch {i}' for i in range(50)]})
+        ids = response.get_json()['ids']
+
+        with self.flask_app.app_context():
+            self.assertEqual([db.session.get(Todo, todo_id).description for todo_id in ids],
+                             [f'Batch {i}' for i in range(50)])
+
+
+if __name__ == '__main__':
+    unittest.main()
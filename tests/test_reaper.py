@@ -0,0 +1,117 @@
+import unittest
+import json
+from app import create_app, db, ensure_schema, Todo, TodoList
+
+
+class ListReaperTestCase(unittest.TestCase):
+    """Tests for tombstoned list deletion and the chunked reaper"""
+
+    def setUp(self):
+        """Set up a list with five todos and a list that stays"""
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                                     'REAPER_CHUNK_SIZE': 2,
+                                     'REAPER_PAUSE_SECONDS': 0})
+        self.app = self.flask_app.test_client()
+        self.reaper = self.flask_app.extensions['reaper']
+        # Set up the schema now, so that the first request does not resume
+        # the deletions the tests leave pending
+        ensure_schema(self.flask_app)
+
+        with self.flask_app.app_context():
+            doomed = TodoList(name='Doomed List')
+            kept = TodoList(name='Kept List')
+            db.session.add_all([doomed, kept])
+            db.session.commit()
+            db.session.add_all([Todo(description=f'Todo {i}', todolist_id=doomed.id) for i in range(5)])
+            db.session.add(Todo(description='Keep me', todolist_id=kept.id))
+            db.session.commit()
+            self.list_id = doomed.id
+            self.kept_id = kept.id
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def tombstone(self):
+        """Tombstone the doomed list without reaping it, as if the process died"""
+        with self.flask_app.app_context():
+            self.reaper.tombstone(self.list_id)
+            db.session.commit()
+
+    def get_json(self, url):
+        response = self.app.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)
+
+    def test_delete_list_reaps_in_chunks(self):
+        """Test that deleting a list larger than one chunk removes everything"""
+        response = self.app.delete(f'/todos/{self.list_id}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(json.loads(response.data)['successful'])
+        with self.flask_app.app_context():
+            self.assertIsNone(db.session.get(TodoList, self.list_id))
+            self.assertEqual(Todo.query.filter_by(todolist_id=self.list_id).count(), 0)
+            self.assertEqual(Todo.query.filter_by(todolist_id=self.kept_id).count(), 1)
+        self.assertEqual(self.get_json(f'/api/lists/{self.list_id}/deletion')['status'], 'deleted')
+
+    def test_tombstoned_list_is_hidden(self):
+        """Test that a list is invisible to every read once tombstoned"""
+        self.tombstone()
+
+        lists = self.get_json('/api/lists')['lists']
+        self.assertEqual([item['id'] for item in lists], [self.kept_id])
+        self.assertEqual(self.get_json(f'/api/lists/{self.list_id}/todos')['todos'], [])
+
+        page = self.app.get(f'/todos/{self.list_id}')
+        self.assertIn(b'Deleted List', page.data)
+        self.assertNotIn(b'Doomed List', page.data)
+
+    def test_chunk_is_bounded_and_progress_reported(self):
+        """Test that one chunk deletes at most REAPER_CHUNK_SIZE todos"""
+        self.tombstone()
+
+        self.assertFalse(self.reaper.reap_chunk(self.list_id))
+        progress = self.get_json(f'/api/lists/{self.list_id}/deletion')
+        self.assertEqual(progress['status'], 'deleting')
+        self.assertEqual(progress['remaining'], 3)
+
+    def test_pending_deletions_resume(self):
+        """Test that tombstones left behind by an earlier process are reaped"""
+        self.tombstone()
+        self.reaper.reap_chunk(self.list_id)
+
+        self.assertEqual(self.reaper.pending(), [self.list_id])
+        self.reaper.resume()
+        self.assertEqual(self.reaper.pending(), [])
+        with self.flask_app.app_context():
+            self.assertIsNone(db.session.get(TodoList, self.list_id))
+
+    def test_reap_command(self):
+        """Test that flask reap drains the pending deletions"""
+        self.tombstone()
+
+        result = self.flask_app.test_cli_runner().invoke(args=['reap'])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('Reaped 1 deleted lists', result.output)
+        self.assertEqual(self.get_json(f'/api/lists/{self.list_id}/deletion')['remaining'], 0)
+
+    def test_live_list_has_no_deletion(self):
+        """Test that asking about a list that is not being deleted is a 404"""
+        response = self.app.get(f'/api/lists/{self.kept_id}/deletion')
+        self.assertEqual(response.status_code, 404)
+
+    def test_unknown_list_has_no_deletion(self):
+        """Test that a list id that never existed is a 404, not a finished deletion"""
+        self.app.delete(f'/todos/{self.list_id}')
+
+        self.assertEqual(self.app.get('/api/lists/12345/deletion').status_code, 404)
+        self.assertEqual(self.get_json(f'/api/lists/{self.list_id}/deletion')['status'], 'deleted')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from app import create_app, db
+from replica import STICKY_COOKIE
+
+
+class ReplicaTestCase(unittest.TestCase):
+    """Tests for sending reads to the read-only engine and writes to the primary"""
+
+    def setUp(self):
+        """Set up a file database with a read-only pool and one list"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.flask_app = create_app({'TESTING': True, 'TODO_STORAGE': 'file',
+                                     'TODO_SQLITE_PATH': os.path.join(self.tmpdir.name, 'todo.db'),
+                                     'TODO_READ_REPLICA': True})
+        self.app = self.flask_app.test_client()
+        self.replica = self.flask_app.extensions['replica']
+
+        self.list_id = self.app.post('/todos', json={'name': 'Replicated'}).get_json()['id']
+        # Start every test as a client that has not written yet
+        self.app.delete_cookie(STICKY_COOKIE)
+
+        self.statements = {'primary': [], 'replica': []}
+        with self.flask_app.app_context():
+            self.primary_engine = db.engine
+        event.listen(self.primary_engine, 'before_cursor_execute', self.count('primary'))
+        event.listen(self.replica.engine, 'before_cursor_execute', self.count('replica'))
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        self.replica.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def count(self, engine):
+        def count_statement(conn, cursor, statement, *args):
+            self.statements[engine].append(statement)
+        return count_statement
+
+    def test_reads_go_to_replica(self):
+        """Test that the pages and read API are served from the read-only engine"""
+        for url in ['/', f'/todos/{self.list_id}', '/api/lists', f'/api/lists/{self.list_id}/todos',
+                    '/api/search?q=anything']:
+            self.assertLess(self.app.get(url).status_code, 400, url)
+
+        self.assertEqual(self.statements['primary'], [])
+        self.assertGreaterEqual(len(self.statements['replica']), 5)
+        self.assertIn('todo_replica_requests_total{engine="replica"} 5',
+                      self.app.get('/metrics').data.decode())
+
+    def test_writes_go_to_primary(self):
+        """Test that a mutation runs on the primary and sets the sticky cookie"""
+        response = self.app.post(f'/todos/{self.list_id}', json={'description': 'Written',
+                                                                  'todolist_id': self.list_id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.statements['replica'], [])
+        self.assertTrue(any(statement.startswith('INSERT') for statement in self.statements['primary']))
+        self.assertIn(STICKY_COOKIE, response.headers['Set-Cookie'])
+
+    def test_read_your_writes(self):
+        """Test that a client that just wrote reads from the primary, and others do not"""
+        self.app.post(f'/todos/{self.list_id}', json={'description': 'Mine', 'todolist_id': self.list_id})
+        self.statements['primary'].clear()
+
+        todos = self.app.get(f'/api/lists/{self.list_id}/todos').get_json()['todos']
+        self.assertEqual([todo['description'] for todo in todos], ['Mine'])
+        self.assertEqual(self.statements['replica'], [])
+
+        self.flask_app.test_client().get(f'/api/lists/{self.list_id}/todos')
+        self.assertNotEqual(self.statements['replica'], [])
+
+    def test_sticky_window_expires(self):
+        """Test that reads go back to the replica once the window has passed"""
+        self.app.set_cookie(STICKY_COOKIE, f'{time.time() - 1:.3f}')
+        self.app.get('/api/lists')
+
+        self.assertEqual(self.statements['primary'], [])
+        self.assertNotEqual(self.statements['replica'], [])
+
+    def test_failed_write_does_not_stick(self):
+        """Test that a rejected write does not pin the client to the primary"""
+        response = self.app.patch(f'/todos/{self.list_id}', json={'todos': 'not a list'})
+
+        self.assertGreaterEqual(response.status_code, 400)
+        self.assertNotIn(STICKY_COOKIE, response.headers.get('Set-Cookie', ''))
+
+    def test_replica_is_read_only(self):
+        """Test that the replica pool cannot write to the database"""
+        with self.replica.engine.connect() as conn:
+            with self.assertRaises(OperationalError):
+                conn.execute(text("INSERT INTO todolist (name) VALUES ('Sneaky')"))
+
+    def test_disabled_by_default(self):
+        """Test that without a replica configured every request uses the primary"""
+        app = create_app({'TESTING': True})
+        self.assertIsNone(app.extensions['replica'].engine)
+        self.assertNotIn(STICKY_COOKIE, app.test_client().post('/todos', json={'name': 'Plain'})
+                         .headers.get('Set-Cookie', ''))
+
+
+class CachedReplicaTestCase(unittest.TestCase):
+    """Tests for the response cache in front of a lagging replica"""
+
+    def setUp(self):
+        """Set up a file database with one list, and a replica that is a snapshot of it"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, 'todo.db')
+        replica_path = os.path.join(self.tmpdir.name, 'replica.db')
+        self.flask_app = create_app({'TESTING': True, 'TODO_STORAGE': 'file', 'TODO_SQLITE_PATH': path,
+                                     'REPLICA_DATABASE_URI': 'sqlite:///' + replica_path,
+                                     'RESPONSE_CACHE_ENABLED': True})
+        self.app = self.flask_app.test_client()
+        self.replica = self.flask_app.extensions['replica']
+
+        self.list_id = self.app.post('/todos', json={'name': 'Lagging'}).get_json()['id']
+        self.app.delete_cookie(STICKY_COOKIE)
+        # The replica stops here: it never sees the writes made by the tests
+        with sqlite3.connect(path) as primary, sqlite3.connect(replica_path) as replica:
+            primary.backup(replica)
+        primary.close()
+        replica.close()
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        self.replica.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def descriptions(self, client):
+        todos = client.get(f'/api/lists/{self.list_id}/todos').get_json()['todos']
+        return [todo['description'] for todo in todos]
+
+    def test_misses_are_filled_from_primary(self):
+        """Test that a miss by a non-sticky client does not cache what the replica has yet to see"""
+        self.app.post(f'/todos/{self.list_id}', json={'description': 'Fresh', 'todolist_id': self.list_id})
+        other = self.flask_app.test_client()
+
+        self.assertEqual(self.descriptions(other), ['Fresh'])
+        # The writer is served the same entry, as a hit
+        self.assertEqual(self.descriptions(self.app), ['Fresh'])
+        metrics = self.app.get('/metrics').data.decode()
+        self.assertIn('todo_response_cache_requests_total{result="hit"} 1', metrics)
+        self.assertIn('todo_replica_requests_total{engine="primary"} 2', metrics)
+
+    def test_uncached_views_still_read_replica(self):
+        """Test that with the cache off the non-sticky reads stay on the replica"""
+        self.flask_app.config['RESPONSE_CACHE_ENABLED'] = False
+        self.app.post(f'/todos/{self.list_id}', json={'description': 'Fresh', 'todolist_id': self.list_id})
+
+        self.assertEqual(self.descriptions(self.flask_app.test_client()), [])
+        self.assertEqual(self.descriptions(self.app), ['Fresh'])
+
+
+if __name__ == '__main__':
+    unittest.main()
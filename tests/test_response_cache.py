@@ -0,0 +1,152 @@
+import unittest
+import json
+from sqlalchemy import event
+from app import create_app, db, TodoList
+from responsecache import LRUStore
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    """Tests for the versioned response cache and conditional GETs"""
+
+    def setUp(self):
+        """Set up two lists"""
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app = self.flask_app.test_client()
+
+        with self.flask_app.app_context():
+            db.create_all()
+            first = TodoList(name='First List')
+            second = TodoList(name='Second List')
+            db.session.add_all([first, second])
+            db.session.commit()
+            self.list_id = first.id
+            self.other_id = second.id
+            self.statements = []
+            event.listen(db.engine, 'before_cursor_execute', self.count_statement)
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', self.count_statement)
+            db.session.remove()
+            db.drop_all()
+
+    def count_statement(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def add_todo(self, list_id, description):
+        return self.app.post(f'/todos/{list_id}', data=json.dumps(
+            {'description': description, 'todolist_id': list_id}), content_type='application/json')
+
+    def test_repeated_page_served_from_cache(self):
+        """Test that an unchanged list page is not rendered from the database again"""
+        first = self.app.get(f'/todos/{self.list_id}')
+        self.statements.clear()
+        second = self.app.get(f'/todos/{self.list_id}')
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.headers['ETag'], first.headers['ETag'])
+        self.assertEqual(second.headers['Cache-Control'], 'no-cache')
+        self.assertEqual(self.statements, [])
+
+    def test_if_none_match_gets_304(self):
+        """Test that a revalidation with the current ETag is answered without the database"""
+        etag = self.app.get(f'/todos/{self.list_id}').headers['ETag']
+        self.statements.clear()
+
+        response = self.app.get(f'/todos/{self.list_id}', headers={'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(self.statements, [])
+
+    def test_mutation_changes_page(self):
+        """Test that a write makes the next GET render the new state"""
+        before = self.app.get(f'/todos/{self.list_id}')
+        self.add_todo(self.list_id, 'Fresh todo')
+
+        after = self.app.get(f'/todos/{self.list_id}', headers={'If-None-Match': before.headers['ETag']})
+
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after.headers['ETag'], before.headers['ETag'])
+        self.assertIn(b'Fresh todo', after.data)
+
+    def test_json_todos_depend_on_their_list_only(self):
+        """Test that the todos API of a list keeps its ETag when another list changes"""
+        url = f'/api/lists/{self.list_id}/todos'
+        etag = self.app.get(url).headers['ETag']
+
+        self.add_todo(self.other_id, 'Elsewhere')
+        self.assertEqual(self.app.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        self.add_todo(self.list_id, 'Here')
+        response = self.app.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([todo['description'] for todo in response.get_json()['todos']], ['Here'])
+
+    def test_deleted_list_invalidated(self):
+        """Test that deleting a list changes its cached todos and the list index"""
+        self.add_todo(self.list_id, 'Doomed')
+        self.assertEqual(len(self.app.get(f'/api/lists/{self.list_id}/todos').get_json()['todos']), 1)
+        self.assertEqual(len(self.app.get('/api/lists').get_json()['lists']), 2)
+
+        self.app.delete(f'/todos/{self.list_id}')
+
+        self.assertEqual(self.app.get(f'/api/lists/{self.list_id}/todos').get_json()['todos'], [])
+        self.assertEqual([l['id'] for l in self.app.get('/api/lists').get_json()['lists']], [self.other_id])
+
+    def test_starter_state_varies_page(self):
+        """Test that a client's deleted starter tasks are not served from another client's page"""
+        other = self.flask_app.test_client()
+        other.get('/todos/welcome')
+        other.delete('/todos/welcome/1')
+
+        self.assertIn(b'<span>Create a Todo</span>', self.app.get('/todos/welcome').data)
+        self.assertNotIn(b'<span>Create a Todo</span>', other.get('/todos/welcome').data)
+
+    def test_disabled(self):
+        """Test that with the cache off responses carry no ETag"""
+        self.flask_app.config['RESPONSE_CACHE_ENABLED'] = False
+        self.assertNotIn('ETag', self.app.get('/api/lists').headers)
+
+    def test_metrics_exported(self):
+        """Test that hits and misses show up on /metrics"""
+        self.app.get('/api/lists')
+        self.app.get('/api/lists')
+
+        body = self.app.get('/metrics').data.decode()
+        self.assertIn('todo_response_cache_requests_total{result="hit"} 1', body)
+        self.assertIn('todo_response_cache_bytes', body)
+
+
+class LRUStoreTestCase(unittest.TestCase):
+    """Tests for the in-process store"""
+
+    def test_evicts_least_recently_used_by_size(self):
+        """Test that entries are evicted oldest first once the byte budget is exceeded"""
+        store = LRUStore(max_bytes=10)
+        store.set('a', 'A', 4)
+        store.set('b', 'B', 4)
+        store.get('a')
+        store.set('c', 'C', 4)
+
+        self.assertEqual(store.get('a'), 'A')
+        self.assertIsNone(store.get('b'))
+        self.assertEqual(store.get('c'), 'C')
+        self.assertEqual(store.size, 8)
+
+    def test_versions_are_kept(self):
+        """Test that versions survive eviction and only move forward"""
+        store = LRUStore(max_bytes=1)
+        store.bump(['lists', 'list:1'])
+        store.bump(['lists'])
+        store.set('big', 'X', 2)
+
+        self.assertEqual(store.get_versions(['lists', 'list:1', 'list:2']), [2, 1, 0])
+        self.assertIsNone(store.get('big'))
+
+
+if __name__ == '__main__':
+    unittest.main()
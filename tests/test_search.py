@@ -0,0 +1,104 @@
+import unittest
+import json
+from app import create_app, db, Todo, TodoList
+
+
+class SearchTestCase(unittest.TestCase):
+    """Tests for the FTS5-backed /api/search endpoint"""
+
+    def setUp(self):
+        """Set up two lists of groceries and chores"""
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app = self.flask_app.test_client()
+        self.reaper = self.flask_app.extensions['reaper']
+
+        with self.flask_app.app_context():
+            db.create_all()
+            groceries = TodoList(name='Groceries')
+            chores = TodoList(name='Chores')
+            db.session.add_all([groceries, chores])
+            db.session.commit()
+            db.session.add_all([
+                Todo(description='Buy milk', todolist_id=groceries.id),
+                Todo(description='Buy cereal, eggs, butter and oat milk', todolist_id=groceries.id),
+                Todo(description='Buy bread', todolist_id=groceries.id),
+                Todo(description='Wipe up the spilt milk', todolist_id=chores.id),
+            ])
+            db.session.commit()
+            self.groceries_id = groceries.id
+            self.chores_id = chores.id
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def search(self, query):
+        response = self.app.get(f'/api/search?{query}')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)
+
+    def descriptions(self, query):
+        return [todo['description'] for todo in self.search(query)['todos']]
+
+    def test_matches_all_words(self):
+        """Test that every word has to match"""
+        self.assertEqual(self.descriptions('q=buy bread'), ['Buy bread'])
+
+    def test_prefix_query(self):
+        """Test that a trailing * matches word prefixes"""
+        self.assertEqual(len(self.descriptions('q=mil*')), 3)
+        self.assertEqual(self.descriptions('q=mil'), [])
+
+    def test_ranked_and_scoped_to_list(self):
+        """Test that results are ranked and can be limited to one list"""
+        self.assertEqual(self.descriptions(f'q=milk&list_id={self.groceries_id}'),
+                         ['Buy milk', 'Buy cereal, eggs, butter and oat milk'])
+        self.assertEqual(self.descriptions(f'q=milk&list_id={self.chores_id}'),
+                         ['Wipe up the spilt milk'])
+
+    def test_pagination(self):
+        """Test that following next_offset visits every match once"""
+        first = self.search('q=milk&limit=2')
+        self.assertEqual(len(first['todos']), 2)
+        self.assertEqual(first['next_offset'], 2)
+        second = self.search('q=milk&limit=2&offset=2')
+        self.assertEqual(len(second['todos']), 1)
+        self.assertIsNone(second['next_offset'])
+        ids = [todo['id'] for todo in first['todos'] + second['todos']]
+        self.assertEqual(len(set(ids)), 3)
+
+    def test_index_follows_updates_and_deletes(self):
+        """Test that the triggers keep the index in step with the todo table"""
+        with self.flask_app.app_context():
+            todo = Todo.query.filter_by(description='Buy bread').one()
+            todo.description = 'Buy sourdough'
+            db.session.commit()
+            Todo.query.filter_by(description='Buy milk').delete()
+            db.session.commit()
+
+        self.assertEqual(self.descriptions('q=bread'), [])
+        self.assertEqual(self.descriptions('q=sourdough'), ['Buy sourdough'])
+        self.assertEqual(len(self.descriptions('q=milk')), 2)
+
+    def test_deleted_lists_are_hidden(self):
+        """Test that todos of a tombstoned list drop out of the results"""
+        with self.flask_app.app_context():
+            self.reaper.tombstone(self.chores_id)
+            db.session.commit()
+
+        self.assertEqual(len(self.descriptions('q=milk')), 2)
+
+    def test_operators_are_literal(self):
+        """Test that FTS5 syntax in the input does not cause an error"""
+        self.assertEqual(self.descriptions('q=milk" OR (bread'), [])
+
+    def test_empty_query_rejected(self):
+        """Test that a query without any words is a 400"""
+        self.assertEqual(self.app.get('/api/search?q=*').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import http.client
+import importlib.util
+import os
+import runpy
+import signal
+import socket
+import subprocess
+import tempfile
+import time
+import unittest
+from unittest import mock
+from app import create_app, gunicorn_argv
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gunicorn.conf.py')
+
+
+def load_config(**environ):
+    """Evaluate gunicorn.conf.py under the given environment variables."""
+    with mock.patch.dict(os.environ, environ):
+        for name in ('TODO_WORKERS', 'TODO_THREADS', 'TODO_MAX_STREAMS', 'TODO_BIND', 'PORT'):
+            if name not in environ:
+                os.environ.pop(name, None)
+        return runpy.run_path(CONFIG)
+
+
+class GunicornConfigTestCase(unittest.TestCase):
+    """Tests for the production server settings"""
+
+    def test_file_storage_uses_every_cpu(self):
+        """Test that with file storage there is one worker per available CPU"""
+        config = load_config(TODO_STORAGE='file')
+
+        self.assertEqual(config['workers'], config['available_cpus']())
+        self.assertEqual(config['request_threads'], 2)
+        self.assertTrue(config['preload_app'])
+        self.assertEqual(config['worker_class'], 'gthread')
+
+    def test_memory_storage_is_one_process(self):
+        """Test that the in-memory database is not split across workers"""
+        config = load_config(TODO_STORAGE='memory')
+        self.assertEqual((config['workers'], config['request_threads']), (1, 1))
+
+    def test_streams_have_threads_of_their_own(self):
+        """Test that the stream threads come on top of the request threads, and the app is told the cap"""
+        for storage in ('memory', 'file'):
+            config = load_config(TODO_STORAGE=storage)
+            self.assertEqual(config['threads'], config['request_threads'] + 32)
+            self.assertEqual(config['raw_env'], ['TODO_MAX_STREAMS=32'])
+
+        config = load_config(TODO_STORAGE='memory', TODO_MAX_STREAMS='100')
+        self.assertEqual(config['threads'], 101)
+        with mock.patch.dict(os.environ, dict(entry.split('=') for entry in config['raw_env'])):
+            self.assertEqual(create_app({'TESTING': True}).extensions['events'].max_streams, 100)
+
+    def test_overrides(self):
+        """Test that the counts, address and recycling can be set from the environment"""
+        config = load_config(TODO_STORAGE='file', TODO_WORKERS='6', TODO_THREADS='3', TODO_MAX_STREAMS='10',
+                             PORT='8080', TODO_MAX_REQUESTS='500')
+
+        self.assertEqual((config['workers'], config['request_threads'], config['threads']), (6, 3, 13))
+        self.assertEqual(config['bind'], '0.0.0.0:8080')
+        self.assertEqual((config['max_requests'], config['max_requests_jitter']), (500, 50))
+
+    def test_cgroup_quota(self):
+        """Test that a container's CPU quota is rounded up to whole CPUs"""
+        cgroup_cpu_limit = load_config()['cgroup_cpu_limit']
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'cpu.max')
+            for content, expected in (('150000 100000\n', 2), ('50000 100000\n', 1), ('max 100000\n', None)):
+                with open(path, 'w') as f:
+                    f.write(content)
+                self.assertEqual(cgroup_cpu_limit(path), expected, content)
+            self.assertIsNone(cgroup_cpu_limit(os.path.join(tmpdir, 'missing')))
+
+
+class ServeCommandTestCase(unittest.TestCase):
+    """Tests for flask serve"""
+
+    def test_options_reach_config(self):
+        """Test that the command line options are read back by gunicorn.conf.py"""
+        with mock.patch.dict(os.environ):
+            argv = gunicorn_argv(bind='127.0.0.1:9000', workers=4, threads=8)
+            config = runpy.run_path(CONFIG)
+
+        self.assertEqual(argv[1:3], ['-m', 'gunicorn'])
+        self.assertEqual(argv[argv.index('--config') + 1], CONFIG)
+        self.assertEqual(argv[-1], 'app:app')
+        self.assertEqual((config['bind'], config['workers'], config['request_threads']), ('127.0.0.1:9000', 4, 8))
+
+    @unittest.skipIf(importlib.util.find_spec('gunicorn') is not None, 'gunicorn is installed')
+    def test_needs_gunicorn(self):
+        """Test that without gunicorn the command says what to install"""
+        result = create_app({'TESTING': True}).test_cli_runner().invoke(args=['serve'])
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('pip install gunicorn', result.output)
+
+
+@unittest.skipIf(importlib.util.find_spec('gunicorn') is None, 'gunicorn is not installed')
+class GunicornStreamsTestCase(unittest.TestCase):
+    """Tests for serving requests under gunicorn while change feed streams are open"""
+
+    def setUp(self):
+        """Start gunicorn on a free port, in memory mode with room for two streams"""
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.port = sock.getsockname()[1]
+        env = dict(os.environ, TODO_STORAGE='memory', TODO_BIND=f'127.0.0.1:{self.port}', TODO_MAX_STREAMS='2')
+        env.pop('TODO_THREADS', None)
+        with mock.patch.dict(os.environ):
+            argv = gunicorn_argv()
+        self.server = subprocess.Popen(argv, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.connections = []
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                self.request('GET', '/metrics')
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    def tearDown(self):
+        """Stop the server"""
+        for conn in self.connections:
+            conn.close()
+        self.server.terminate()
+        self.server.wait(timeout=60)
+
+    def request(self, method, url, body=None):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+        self.connections.append(conn)
+        conn.request(method, url, body=body, headers={'Content-Type': 'application/json'})
+        return conn.getresponse()
+
+    def test_open_streams_leave_request_threads_free(self):
+        """Test that more open streams than the cap neither hang the server nor each other"""
+        list_id = http_json(self.request('POST', '/todos', b'{"name": "Watched"}'))['id']
+        streams = [self.request('GET', f'/todos/{list_id}/events') for _ in range(3)]
+        for stream in streams:
+            self.assertTrue(stream.readline().startswith(b'retry:'))
+
+        # The third is over the cap and ends straight away; the first two stay open
+        stream = streams[2]
+        self.assertEqual(stream.read(), b'\n')
+        response = self.request('GET', '/api/lists')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(http_json(response)['lists'][-1]['name'], 'Watched')
+
+        # Stopping the worker gracefully ends the streams rather than waiting for them
+        self.server.send_signal(signal.SIGTERM)
+        for stream in streams[:2]:
+            self.assertEqual(stream.read(), b'\n')
+
+
+def http_json(response):
+    return create_app({'TESTING': True}).json.loads(response.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from app import create_app, db, starter_cache, StarterListState, STARTER_COOKIE
+
+
+class StarterStateTestCase(unittest.TestCase):
+    """Tests that the starter list state is stored per client in the database"""
+
+    def setUp(self):
+        """Set up stuff before each test"""
+        self.flask_app = create_app({'TESTING': True})
+        self.app = self.flask_app.test_client()
+
+        with self.flask_app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        """Clean up after each test"""
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_clients_do_not_share_state(self):
+        """Test that one client's deletions are invisible to another client"""
+        other = self.flask_app.test_client()
+        self.app.delete('/todos/welcome/1')
+        self.app.delete('/todos/welcome')
+
+        mine = self.app.get('/todos/welcome')
+        theirs = other.get('/todos/welcome')
+        self.assertIn(b'Deleted Starter List', mine.data)
+        self.assertIn(b'<li id="_1">', theirs.data)
+        self.assertIn(b'Starter Task', theirs.data)
+
+    def test_state_survives_losing_the_process_cache(self):
+        """Test that the state is read back from the database, e.g. by another worker"""
+        self.app.delete('/todos/welcome/2')
+        starter_cache.clear()
+
+        response = self.app.get('/todos/welcome')
+        self.assertNotIn(b'<li id="_2">', response.data)
+        self.assertIn(b'<li id="_1">', response.data)
+
+    def test_stale_cache_entry_is_not_trusted(self):
+        """Test that a newer version in the cookie bypasses the cached state"""
+        self.app.delete('/todos/welcome/1')
+        client_id = self.app.get_cookie(STARTER_COOKIE).value.split(':')[0]
+
+        # Another worker records a further deletion and hands out version 2
+        with self.flask_app.app_context():
+            row = db.session.get(StarterListState, client_id)
+            row.deleted_tasks = '1,3'
+            row.version = 2
+            db.session.commit()
+        self.app.set_cookie(STARTER_COOKIE, f'{client_id}:2')
+
+        response = self.app.get('/todos/welcome')
+        self.assertNotIn(b'<li id="_3">', response.data)
+        self.assertIn(b'<li id="_2">', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from sqlalchemy import create_engine, event, text
+from app import create_app, sqlite_pragma_listener
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FileStorageTestCase(unittest.TestCase):
+    """Tests for the durable file-backed SQLite storage mode"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'todo.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_pragmas_applied_on_every_connection(self):
+        """Test that each pooled connection gets WAL and the tuned pragmas"""
+        config = create_app().config
+        engine = create_engine(f'sqlite:///{self.db_path}', pool_size=2)
+        event.listen(engine, 'connect', sqlite_pragma_listener(config))
+
+        with engine.connect() as first, engine.connect() as second:
+            for conn in (first, second):
+                self.assertEqual(conn.execute(text('PRAGMA journal_mode')).scalar(), 'wal')
+                # NORMAL is 1
+                self.assertEqual(conn.execute(text('PRAGMA synchronous')).scalar(), 1)
+                self.assertEqual(conn.execute(text('PRAGMA foreign_keys')).scalar(), 1)
+                self.assertEqual(conn.execute(text('PRAGMA busy_timeout')).scalar(),
+                                 config['TODO_SQLITE_BUSY_TIMEOUT_MS'])
+                self.assertEqual(conn.execute(text('PRAGMA cache_size')).scalar(),
+                                 -config['TODO_SQLITE_CACHE_KIB'])
+        engine.dispose()
+
+    def run_app(self, script):
+        env = dict(os.environ, TODO_STORAGE='file', TODO_SQLITE_PATH=self.db_path)
+        return subprocess.run([sys.executable, '-c', script], cwd=REPO_DIR, env=env,
+                              capture_output=True, text=True, check=True).stdout
+
+    def test_data_survives_restart(self):
+        """Test that a list created by one process is visible to the next one"""
+        self.run_app(
+            "from app import app\n"
+            "app.test_client().post('/todos', json={'name': 'Durable List'})\n")
+        output = self.run_app(
+            "from app import app\n"
+            "print(app.test_client().get('/api/lists').get_json()['lists'][0]['name'])\n")
+        self.assertEqual(output.strip(), 'Durable List')
+
+
+if __name__ == '__main__':
+    unittest.main()
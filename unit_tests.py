@@ -8,37 +8,37 @@
 '''
 import unittest
 import json
-from app import app, db, Todo, TodoList
+from app import create_app, db, Todo, TodoList
 
 
 class TodoListDeletionTestCase(unittest.TestCase):
     
     def setUp(self):
         """Set up test environment before each test"""
-        self.app = app.test_client()
-        app.config['TESTING'] = True
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.flask_app = create_app({'TESTING': True,
+                                     'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app = self.flask_app.test_client()
         
-        with app.app_context():
+        with self.flask_app.app_context():
             db.create_all()
     
     def tearDown(self):
         """Clean up after each test"""
-        with app.app_context():
+        with self.flask_app.app_context():
             db.session.remove()
             db.drop_all()
     
     def test_delete_list_removes_from_database(self):
         """Test that deleting a list removes it from the database"""
         # Create a test list
-        with app.app_context():
+        with self.flask_app.app_context():
             test_list = TodoList(name='Test List to Delete')
             db.session.add(test_list)
             db.session.commit()
             list_id = test_list.id
         
         # Verify list exists before deletion
-        with app.app_context():
+        with self.flask_app.app_context():
             existing_list = db.session.get(TodoList, list_id)
             self.assertIsNotNone(existing_list)
             self.assertEqual(existing_list.name, 'Test List to Delete')
@@ -48,14 +48,14 @@ class TodoListDeletionTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         
         # Verify list is deleted and stays deleted
-        with app.app_context():
+        with self.flask_app.app_context():
             deleted_list = db.session.get(TodoList, list_id)
             self.assertIsNone(deleted_list)
     
     def test_delete_list_with_todos_removes_both(self):
         """Test that deleting a list also deletes all associated todos"""
         # Create a test list with todos
-        with app.app_context():
+        with self.flask_app.app_context():
             test_list = TodoList(name='List with Todos')
             db.session.add(test_list)
             db.session.commit()
@@ -71,7 +71,7 @@ class TodoListDeletionTestCase(unittest.TestCase):
             todo2_id = todo2.id
         
         # Verify list and todos exist before deletion
-        with app.app_context():
+        with self.flask_app.app_context():
             existing_list = db.session.get(TodoList, list_id)
             existing_todo1 = db.session.get(Todo, todo1_id)
             existing_todo2 = db.session.get(Todo, todo2_id)
@@ -84,7 +84,7 @@ class TodoListDeletionTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         
         # Verify list and all todos are deleted and stay deleted (expected behavior)
-        with app.app_context():
+        with self.flask_app.app_context():
             deleted_list = db.session.get(TodoList, list_id)
             deleted_todo1 = db.session.get(Todo, todo1_id)
             deleted_todo2 = db.session.get(Todo, todo2_id)
@@ -104,7 +104,7 @@ class TodoListDeletionTestCase(unittest.TestCase):
     def test_delete_list_returns_success_response(self):
         """Test that successful deletion returns proper JSON response"""
         # Create a test list
-        with app.app_context():
+        with self.flask_app.app_context():
             test_list = TodoList(name='List for Success Test')
             db.session.add(test_list)
             db.session.commit()
@@ -124,7 +124,7 @@ class TodoListDeletionTestCase(unittest.TestCase):
         list_ids = []
         
         # Create multiple test lists
-        with app.app_context():
+        with self.flask_app.app_context():
             for i in range(3):
                 test_list = TodoList(name=f'Test List {i+1}')
                 db.session.add(test_list)
@@ -132,7 +132,7 @@ class TodoListDeletionTestCase(unittest.TestCase):
                 list_ids.append(test_list.id)
         
         # Verify all lists exist
-        with app.app_context():
+        with self.flask_app.app_context():
             for list_id in list_ids:
                 existing_list = db.session.get(TodoList, list_id)
                 self.assertIsNotNone(existing_list)
@@ -143,7 +143,7 @@ class TodoListDeletionTestCase(unittest.TestCase):
             self.assertEqual(response.status_code, 200)
         
         # Verify all lists are deleted and stay deleted
-        with app.app_context():
+        with self.flask_app.app_context():
             for list_id in list_ids:
                 deleted_list = db.session.get(TodoList, list_id)
                 self.assertIsNone(deleted_list)
@@ -151,7 +151,7 @@ class TodoListDeletionTestCase(unittest.TestCase):
     def test_delete_list_persistence_across_operations(self):
         """Test that deleted lists remain deleted even after other database operations"""
         # Create test lists
-        with app.app_context():
+        with self.flask_app.app_context():
             list_to_delete = TodoList(name='List to Delete')
             list_to_keep = TodoList(name='List to Keep')
             db.session.add(list_to_delete)
@@ -171,7 +171,7 @@ class TodoListDeletionTestCase(unittest.TestCase):
                      content_type='application/json')
         
         # Verify deleted list is still gone and other list still exists
-        with app.app_context():
+        with self.flask_app.app_context():
             deleted_list = db.session.get(TodoList, delete_id)
             kept_list = db.session.get(TodoList, keep_id)
             self.assertIsNone(deleted_list)
@@ -181,7 +181,7 @@ class TodoListDeletionTestCase(unittest.TestCase):
     def test_delete_list_persists_after_page_refresh(self):
         """Test that deleted lists stay deleted after page refresh (simulated by GET requests)"""
         # Create multiple test lists
-        with app.app_context():
+        with self.flask_app.app_context():
             list1 = TodoList(name='Keep This List')
             list2 = TodoList(name='Delete This List')
             list3 = TodoList(name='Another Keep List')
@@ -225,7 +225,7 @@ class TodoListDeletionTestCase(unittest.TestCase):
             pass
         
         # Verify in database that the list is still deleted after all these requests
-        with app.app_context():
+        with self.flask_app.app_context():
             deleted_list = db.session.get(TodoList, delete_id)
             kept_list1 = db.session.get(TodoList, keep1_id)
             kept_list2 = db.session.get(TodoList, keep2_id)
@@ -235,7 +235,7 @@ class TodoListDeletionTestCase(unittest.TestCase):
             self.assertIsNotNone(kept_list2)  # Should still exist
             
         # Final verification: query all lists and ensure deleted one is not there
-        with app.app_context():
+        with self.flask_app.app_context():
             all_lists = TodoList.query.all()
             list_ids = [lst.id for lst in all_lists]
             